@@ -9,8 +9,10 @@
 // ========================================
 const CONFIG = {
     dataPath: './data/publications.json',
+    searchIndexPath: './data/search/',
     pdfPath: 'https://pub-c06db3ecd804497e8176675294956415.r2.dev/',
     thumbnailPath: 'https://pub-c06db3ecd804497e8176675294956415.r2.dev/thumbnails/',
+    atlasMapPath: 'https://pub-c06db3ecd804497e8176675294956415.r2.dev/thumbnails/atlas.json',
     pdfWorkerSrc: 'https://cdnjs.cloudflare.com/ajax/libs/pdf.js/3.11.174/pdf.worker.min.js'
 };
 
@@ -18,8 +20,13 @@ const CONFIG = {
 // State Management
 // ========================================
 let publications = [];
+let coverAtlas = null;
 let currentFilter = 'all';
 let searchQuery = '';
+let searchIndex = null;
+let searchMatches = null;
+let searchSequence = 0;
+const searchShards = new Map();
 let currentPDF = null;
 let pdfDoc = null;
 let currentPage = 1;
@@ -53,12 +60,16 @@ const elements = {
 // Data Loading
 // ========================================
 async function loadPublications() {
+    // The atlas map is optional; cards fall back to individual thumbnails
+    const atlasRequest = loadCoverAtlas();
     try {
         const response = await fetch(CONFIG.dataPath);
         if (!response.ok) {
             throw new Error('Failed to load publications');
         }
         publications = await response.json();
+        coverAtlas = await atlasRequest;
+        searchIndex = await loadSearchIndex();
 
         // Update stats
         elements.totalPublications.textContent = publications.length + '+';
@@ -70,6 +81,116 @@ async function loadPublications() {
     }
 }
 
+async function loadCoverAtlas() {
+    try {
+        const response = await fetch(CONFIG.atlasMapPath);
+        if (!response.ok) {
+            return null;
+        }
+        const atlas = await response.json();
+        atlas.url = `${CONFIG.thumbnailPath}${atlas.image}?v=${atlas.version}`;
+
+        // One request for every cover; cards fade their sprite in once it is decoded
+        const image = new Image();
+        image.onload = () => elements.grid.classList.add('atlas-ready');
+        image.src = atlas.url;
+        return atlas;
+    } catch (error) {
+        console.warn('Cover atlas unavailable:', error);
+        return null;
+    }
+}
+
+// ========================================
+// Search Index (built by tools/build_search_index.py)
+// ========================================
+const SEARCH_STOPWORDS = new Set(['dan', 'di', 'ke', 'dari', 'yang', 'untuk', 'dengan', 'pada', 'dalam', 'atau', 'the', 'of']);
+const ROMAN_NUMERAL = /^(l?x{0,3}|xl|xc)(ix|iv|v?i{0,3})$/;
+
+async function loadSearchIndex() {
+    try {
+        const response = await fetch(`${CONFIG.searchIndexPath}index.json`);
+        return response.ok ? await response.json() : null;
+    } catch (error) {
+        console.warn('Search index unavailable, using title search:', error);
+        return null;
+    }
+}
+
+function romanToInt(numeral) {
+    const values = { i: 1, v: 5, x: 10, l: 50 };
+    let total = 0;
+    for (let i = 0; i < numeral.length; i++) {
+        const value = values[numeral[i]];
+        total += (values[numeral[i + 1]] || 0) > value ? -value : value;
+    }
+    return total;
+}
+
+// Mirrors tokenize() in the index builder; each term lists its alternative spellings
+function normalizeQuery(query) {
+    const words = query.normalize('NFKD').replace(/[\u0300-\u036f]/g, '').toLowerCase().match(/[0-9a-z]+/g) || [];
+    return words
+        .filter(word => !SEARCH_STOPWORDS.has(word))
+        .map(word => {
+            if (/^\d+$/.test(word)) {
+                return [word.replace(/^0+(?=\d)/, '')];
+            }
+            if (word.length >= 2 && ROMAN_NUMERAL.test(word)) {
+                return [word, String(romanToInt(word))];
+            }
+            return [word];
+        });
+}
+
+function loadSearchShard(prefix) {
+    if (!searchShards.has(prefix)) {
+        const request = searchIndex.shards.includes(prefix)
+            ? fetch(`${CONFIG.searchIndexPath}shards/${prefix}.json`)
+                .then(response => (response.ok ? response.json() : {}))
+                .catch(() => ({}))
+            : Promise.resolve({});
+        searchShards.set(prefix, request);
+    }
+    return searchShards.get(prefix);
+}
+
+async function findSearchMatches(query) {
+    const terms = normalizeQuery(query);
+    if (!searchIndex || terms.length === 0) {
+        return null;
+    }
+
+    let matches = null;
+    for (const alternatives of terms) {
+        const termMatches = new Set();
+        for (const term of alternatives) {
+            const shard = await loadSearchShard(term.slice(0, searchIndex.prefix_length));
+            // Prefix match, so results update while a word is still being typed
+            for (const [token, postings] of Object.entries(shard)) {
+                const hit = term.length < searchIndex.prefix_length ? token === term : token.startsWith(term);
+                if (hit) {
+                    postings.forEach(doc => termMatches.add(searchIndex.docs[doc]));
+                }
+            }
+        }
+        matches = matches ? new Set([...matches].filter(id => termMatches.has(id))) : termMatches;
+    }
+    return matches;
+}
+
+async function updateSearch(query) {
+    const sequence = ++searchSequence;
+    const matches = await findSearchMatches(query);
+    // A slower shard fetch must not overwrite the results of a newer query
+    if (sequence !== searchSequence) {
+        return;
+    }
+    searchQuery = query;
+    searchMatches = matches;
+    renderPublications();
+}
+
 function loadDemoData() {
     publications = [
         {
@@ -95,6 +216,10 @@ function renderPublications() {
             return false;
         }
 
+        if (searchQuery && searchMatches) {
+            return searchMatches.has(pub.id);
+        }
+
         if (searchQuery) {
             const query = searchQuery.toLowerCase();
             const matchTitle = pub.title.toLowerCase().includes(query);
@@ -132,11 +257,12 @@ function createPublicationCard(pub) {
     const categoryLabel = getCategoryLabel(pub.category);
     const icon = getCategoryIcon(pub.category);
     const thumbUrl = `${CONFIG.thumbnailPath}${pub.id}.jpg`;
+    const sprite = coverAtlas && coverAtlas.entries[pub.id];
+    const placeholderStyle = pub.placeholder ? ` style="background-image: url('${pub.placeholder}')"` : '';
 
-    return `
-        <article class="publication-card" data-id="${pub.id}">
-            <div class="card-thumbnail">
-                <div class="card-placeholder" id="placeholder-${pub.id}">${icon}</div>
+    const cover = sprite ? `
+                <div class="card-sprite" role="img" aria-label="${pub.title}" style="${getSpriteStyle(sprite)}"></div>
+    ` : `
                 <img
                     class="card-thumb-img"
                     src="${thumbUrl}"
@@ -145,6 +271,13 @@ function createPublicationCard(pub) {
                     onload="this.style.opacity='1'; document.getElementById('placeholder-${pub.id}').style.display='none';"
                     onerror="this.style.display='none';"
                 >
+    `;
+
+    return `
+        <article class="publication-card" data-id="${pub.id}">
+            <div class="card-thumbnail">
+                <div class="card-placeholder${pub.placeholder ? ' has-preview' : ''}" id="placeholder-${pub.id}"${placeholderStyle}>${pub.placeholder ? '' : icon}</div>
+                ${cover}
                 <span class="card-category ${pub.category}">${categoryLabel}</span>
             </div>
             <div class="card-content">
@@ -166,6 +299,13 @@ function createPublicationCard(pub) {
     `;
 }
 
+function getSpriteStyle(sprite) {
+    const { columns, rows, url } = coverAtlas;
+    const x = columns > 1 ? (sprite.col / (columns - 1)) * 100 : 0;
+    const y = rows > 1 ? (sprite.row / (rows - 1)) * 100 : 0;
+    return `background-image: url('${url}'); background-size: ${columns * 100}% ${rows * 100}%; background-position: ${x}% ${y}%;`;
+}
+
 function getCategoryLabel(category) {
     const labels = {
         muhibbah: 'MUHIBBAH',
@@ -321,6 +461,10 @@ async function initPDFReader(pdfUrl) {
             url: pdfUrl,
             cMapUrl: 'https://cdnjs.cloudflare.com/ajax/libs/pdf.js/3.11.174/cmaps/',
             cMapPacked: true,
+            // Linearized PDFs render page 1 from range requests; fetch the rest on demand
+            disableAutoFetch: true,
+            disableStream: true,
+            rangeChunkSize: 262144,
         });
 
         pdfDoc = await loadingTask.promise;
@@ -630,8 +774,7 @@ function closeModal() {
 function initEventListeners() {
     // Search
     elements.searchInput.addEventListener('input', debounce((e) => {
-        searchQuery = e.target.value.trim();
-        renderPublications();
+        updateSearch(e.target.value.trim());
     }, 300));
 
     // Filter buttons
@@ -0,0 +1,218 @@
+"""
+The local archive: downloaded PDFs, the catalog and what is known about the
+Issuu profile.
+
+Everything here works offline and without the network stack, so commands
+that only read or export the archive start in a few milliseconds.
+IssuuDownloader builds on Archive and adds the downloading.
+
+Usage:
+  himmah list
+  himmah export
+"""
+
+import argparse
+import re
+import threading
+from pathlib import Path
+from urllib.parse import urlparse
+
+from catalog import Catalog
+from himmah.config import PDF_DIR, PROFILE_URL
+from metadata_cache import MetadataCache
+from profile_crawler import PublicationIndex, profile_username
+
+
+class Archive:
+    """PDFs, catalog, metadata cache and publication index of one output directory."""
+
+    # Issuu profile whose uploads are archived
+    PROFILE_URL = PROFILE_URL
+
+    # Known publication URLs from LPM HIMMAH profile, with curated titles; merged with the crawled index
+    LPMHIMMAH_PUBLICATIONS = [
+        {"title": "Majalah MUHIBBAH No. 01/Thn. XV/1981 – Reuni NU", "url": "https://issuu.com/lpmhimmahuii/docs/majalah_muhibbah_no._1_th._ke_xv_1981_reuni_nu"},
+        {"title": "Majalah MUHIBBAH No. 02/Thn. XV/1981 – Mahasiswa Bicara Indonesia", "url": "https://issuu.com/lpmhimmahuii/docs/majalah_muhibbah_no._2_th._ke_xv_1981"},
+        {"title": "Majalah MUHIBBAH No. 04/Thn. XVI/1982 – BBM Naik", "url": "https://issuu.com/lpmhimmahuii/docs/majalah_muhibbah_no._4_th._ke_xvi_1982_bbm_naik"},
+        {"title": "Majalah MUHIBBAH No. 07/Thn. IX/1975 - Egoisme Bicara dan Kerja", "url": "https://issuu.com/lpmhimmahuii/docs/majalah_muhibbah_no._7_th._ke_ix_1974_egoisme_bi"},
+        {"title": "Majalah MUHIBBAH No. 04/Thn. V/1971 - Pembaharuan Administrasi", "url": "https://issuu.com/lpmhimmahuii/docs/muhibbah_4_1971"},
+        {"title": "Majalah HIMMAH No. 01/Thn. XXXIV/2002 - Di Bawah Bendera Globalisasi", "url": "https://issuu.com/lpmhimmahuii/docs/majalah_himmah_edisi_01xxxiv2002_-_di_bawah_bender"},
+        {"title": "Majalah HIMMAH No. 03/Thn. XXXV/2003 - Balada Utang Kita", "url": "https://issuu.com/lpmhimmahuii/docs/majalah_himmah_edisi_03_thn._xxxv_2003_-_balada_ut"},
+        {"title": "Majalah HIMMAH No. 01/Thn. XXXVII/2004 - Air Mengalir Makin Menjauh", "url": "https://issuu.com/lpmhimmahuii/docs/majalah_himmah_edisi_01_thn._xxxvii_2004_-_air_men"},
+        {"title": "Majalah HIMMAH No. 02/Thn. XLVI/2013 - Mega Proyek Terlantar", "url": "https://issuu.com/lpmhimmahuii/docs/majalah_himmah_edisi_02_thn._xlvi_2013_-_mega_proy"},
+        {"title": "Majalah HIMMAH No. 02/Thn. XXXIV/2002 - Antara Kuasa dan Kemuliaan", "url": "https://issuu.com/lpmhimmahuii/docs/majalah_himmah_edisi_02_thn._xxxiv_2002_-_antara_k"},
+        {"title": "Majalah HIMMAH No. 02/Thn. XXXVII/2005 - Jagad Mal Jogja", "url": "https://issuu.com/lpmhimmahuii/docs/jagad_maal"},
+        {"title": "Buletin KOBARKobari Edisi PEKTA/XV/September 2014 - Imbas Regulasi Dikti", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_pekta_tahun_ke-15_september_2014_-_imbas_r"},
+        {"title": "Buletin KOBARKobari Edisi PESTA/XV/September 2014 - Berjejalan di Kampus Perjuangan", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_pesta_tahun_ke-15_september_2014_-_berjeja"},
+        {"title": "Buletin KOBARKobari Edisi 137/XII/Agustus 2009 - Pintar pun Bergulir", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_137_tahun_ke-12_agustus_2009_-_pintar_pu"},
+        {"title": "Buletin KOBARKobari Edisi 145/XIII/Oktober 2010 - Ketika Pers Mahasiswa Tidak Lagi Bebas", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_145_tahun_ke-13_oktober_2010_-_ketika_pe"},
+        {"title": "Buletin KOBARKobari Edisi 147/XIV/Januari 2011 - Terlalu Banyak Jadi Tidak Maksimal", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_146_tahun_ke-14_januari_2011_-_terlalu_b"},
+        {"title": "Buletin KOBARKobari Edisi 134/XII/Februari 2009 - PESTA yang Belum Usai", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_134_tahun_ke-12_februari_2009_-_pesta_"},
+        {"title": "Buletin KOBARKobari Edisi 153/XIV/November 2011 - Janji DPM yang Dinantikan", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_153_tahun_ke-14_november_2011_-_janji_dp"},
+        {"title": "Buletin KOBARKobari Edisi 152/XIV/Oktober 2011 - Kerjasama di Balik Atribut Pesta", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_152_tahun_ke-14_oktober_2011_-_kerjasama"},
+        {"title": "Buletin KOBARKobari Edisi 141/XIII/April 2010 - ISO: Antara Gengsi dan Prestasi", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_141_tahun_ke-13_april_2010_-_iso_antara"},
+        {"title": "Buletin KOBARKobari Edisi 148/XIV/Maret 2011 - Balada Arif Johar", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_148_tahun_ke-14_maret_2011_-_balada_arif"},
+        {"title": "Buletin KOBARKobari Edisi 135/XII/Juli 2009 - Melirik Dana Hibah Penelitian", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_135_tahun_ke-12_juli_2009_-_melirik_dana"},
+        {"title": "Buletin KOBARKobari Edisi 154/XIV/Desember 2011 - Terkatung-katungnya Penjual Kantin Psikologi", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_154_tahun_ke-14_desember_2011-_terkatung"},
+        {"title": "Buletin KOBARKobari Edisi 144/XIII/Agustus 2010 - Aksi Sosial dan Demonstrasi Mewarnai Pesta 2010", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_144_tahun_ke-13_agustus_2010_-_aksi_sosi"},
+        {"title": "Buletin KOBARKobari Edisi 149/XIV/Mei 2011 - Lunaskah Hutang Kita", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_149_tahun_ke-14_mei_2011_-_lunaskah_huta"},
+        {"title": "Buletin KOBARKobari Edisi PESTA/XV/Agustus 2012 - PESTA (Masih) Dihiasi Masalah", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_pesta_tahun_ke-15_agustus_2012_-_pesta_"},
+        {"title": "Buletin KOBARKobari Edisi 147/XIV/Februari 2011 - Menunggu Asa dari Prabuningrat", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_147_tahun_ke-14_februari_2011_-_menunggu"},
+        {"title": "Buletin KOBARKobari Edisi Khusus/XIV/Juni 2012 - Gugatan KM UII", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_khusus_tahun_ke-14_juni_2012_-_gugatan_k"},
+        {"title": "Buletin KOBARKobari Edisi 140/XIII/Januari 2010 - Pemilwa Sepi Pemilih", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_140_tahun_ke-13_januari_2010_-_pemilwa_s"},
+        {"title": "Buletin KOBARKobari Edisi PEKTA/XVI/September 2013 - Organ Ekstra dan Intra Berkolega", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_pekta_tahun_ke-16_september_2013_-_organ"},
+        {"title": "Buletin KOBARKobari Edisi PESTA/XIX/Agustus 2017 - Langkah Awal Menata Kepekaan Sosial", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_pesta_tahun_ke-19_agustus_2017_-_menata_ke"},
+        {"title": "Buletin KOBARKobari Edisi 133/XI/Desember 2008 - Jalan Terjal Menuju Kampus Riset", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_133_tahun_ke-11_desember_2008_-_jalan_te"},
+        {"title": "Buletin KOBARKobari Edisi 136/XII/Agustus 2009 - Dampak Mundurnya Pemilwa", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_136_tahun_ke-12_agustus_2009_-_dampak_mu"},
+        {"title": "Buletin KOBARKobari Edisi PESTA/XIV/Agustus 2011 - Pesta di Bulan Suci", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_pesta_tahun_ke-14_agustus_2011_-_pesta_d"},
+        {"title": "Buletin KOBARKobari Edisi PEKTA/XV/September 2012 - Baku Hantam Menyisakan Luka", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_pekta_tahun_ke-15_september_2012_-_baku_"},
+        {"title": "Buletin KOBARKobari Edisi PESTA/XVIII/Agustus 2016 - Kenaikan Biaya Kuliah 10% Dianggap Kurang", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_pesta_tahun_ke-18_agustus_2016_-_kenaikan_"},
+        {"title": "Buletin KOBARKobari Edisi 160/XIV/November 2012 - Di Balik Jadwal Kuliah Farmasi", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_160_tahun_ke-14_november_2012_-_di_balik"},
+        {"title": "Buletin KOBARKobari Edisi 157/XIV/Mei 2012 - Rapor Merah DPM U", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_157_tahun_ke-14_mei_2012_-_rapor_merah_d"},
+        {"title": "Buletin KOBARKobari Edisi 162/XV/Februari 2013 - Ambisi Jurnal Bersambut Aral", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_162_tahun_ke-15_februari_2013_-_ambisi_j"},
+        {"title": "Buletin KOBARKobari Edisi 164/XV/Mei 2013 - Bakal Caleg Berguguran di Tangan KPU", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_164_tahun_ke-15_mei_2013_-_bakal_caleg_b"},
+        {"title": "Buletin KOBARKobari Edisi 159/XIV/Oktober 2012 - Beda Janji, Beda Realisasi", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_159_tahun_ke-14_oktober_2012_-_beda_janj"},
+        {"title": "Buletin KOBARKobari Edisi 166/XV/November 2013 - FE dan FH Bakal Pindah", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_166_tahun_ke-15_november_2013_-_fe_dan_f"},
+        {"title": "Buletin KOBARKobari Edisi 163/XV/Maret 2013 - Pesantrenisasi UII", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_163_tahun_ke-15_maret_2013_-_pesantrenis"},
+        {"title": "Buletin KOBARKobari Edisi 168/XV/Januari 2014 - Silang Pendapat Informasi SPP", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_168_tahun_ke-15_januari_2014_-_silang_pe"},
+        {"title": "Buletin KOBARKobari Edisi 183/XIX/Maret 2017 - Kronik TGC-37", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_183_tahun_ke-19_maret_2017_-_kronik_tgc-37"},
+        {"title": "Buletin KOBARKobari Edisi 184/XIX/Juni 2017 - Terkekang Izin Perkuliahan", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_184_tahun_ke-19_juni_2017_-_terkekang_izin"},
+        {"title": "Buletin KOBARKobari Edisi 167/XV/Januari 2014 - Keamanan Ulil Albab Dipertanyakan", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_167_tahun_ke-15_januari_2014_-_keamanan_"},
+        {"title": "Buletin KOBARKobari Edisi 180/XVII/Mei 2016 - Peringkat Anjlok, UII Jalankan Strategi Baru", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_180_tahun_ke-15_mei_2016_-_peringkat_anjlo"},
+    ]
+
+    def __init__(self, output_dir=PDF_DIR, verbose=True):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.verbose = verbose
+        self._log_lock = threading.Lock()
+        # reader3 documents with their ETag/Last-Modified validators
+        self.metadata_cache = MetadataCache(self.output_dir / '.metadata_cache.sqlite')
+        # Documents discovered on Issuu profiles and the last crawl of each
+        self.publication_index = PublicationIndex(self.output_dir / 'publication_index.sqlite')
+        # Publication catalog behind data/publications.json
+        self.catalog = Catalog(self.output_dir / 'catalog.sqlite', self.output_dir.parent / 'data' / 'publications.json')
+        # Pages left out by --drop-blank/--drop-duplicates; opened on first use
+        self._dropped_pages = None
+
+    def log(self, message, end='\n'):
+        """Print message if verbose mode is enabled."""
+        if self.verbose:
+            with self._log_lock:
+                print(message, end=end, flush=True)
+
+    def get_publication_list(self, profile_url=None):
+        """
+        Publications of an Issuu profile (default: LPM HIMMAH) as found by the
+        last crawl, newest first. Works offline. For LPM HIMMAH the built-in
+        list is merged in: its titles replace the crawled ones, and its
+        publications the crawl did not find are kept at the end.
+        """
+        username = profile_username(profile_url or self.PROFILE_URL)
+        crawled = self.publication_index.publications(username) if self.publication_index.state(username) else []
+        if username != profile_username(self.PROFILE_URL):
+            return crawled
+        curated = {self.parse_issuu_url(pub['url'])['doc_slug']: pub for pub in self.LPMHIMMAH_PUBLICATIONS}
+        publications = []
+        for pub in crawled:
+            pub = curated.pop(self.parse_issuu_url(pub['url'])['doc_slug'], pub)
+            publications.append(pub)
+        return publications + list(curated.values())
+
+    def page_count(self, username, doc_slug):
+        """
+        Pages in the publication's PDF: the Issuu page count from the metadata
+        cache minus the pages left out by page analysis. None if unknown.
+        """
+        count = self.metadata_cache.page_count(username, doc_slug)
+        if not count:
+            return count
+        if self._dropped_pages is None:
+            db_path = self.output_dir / '.page_analysis.sqlite'
+            if not db_path.exists():
+                return count
+            from page_analysis import PageAnalysis
+            self._dropped_pages = PageAnalysis(db_path)
+        return count - self._dropped_pages.dropped_count(username, doc_slug)
+
+    def parse_issuu_url(self, publication_url):
+        """
+        Parse Issuu URL to extract username and document slug.
+        URL format: https://issuu.com/username/docs/document_slug
+        """
+        url_parts = urlparse(publication_url)
+        path_parts = url_parts.path.strip('/').split('/')
+
+        if len(path_parts) >= 3 and path_parts[1] == 'docs':
+            return {
+                'username': path_parts[0],
+                'doc_slug': path_parts[2]
+            }
+        return None
+
+    def pdf_filename(self, doc_slug):
+        """Default PDF filename for a document slug."""
+        safe_slug = re.sub(r'[<>:"/\\|?*]', '_', doc_slug)
+        return f"{safe_slug[:100]}.pdf"
+
+    def print_publication_list(self):
+        """Print the known publications; page counts come from the metadata cache, so this works offline."""
+        publications = self.get_publication_list()
+        print(f"\nKnown LPM HIMMAH Publications ({len(publications)} total):")
+        print('='*60)
+        for i, pub in enumerate(publications, 1):
+            url_info = self.parse_issuu_url(pub['url'])
+            page_count = self.page_count(url_info['username'], url_info['doc_slug'])
+            pages = f" ({page_count} pages)" if page_count else ""
+            print(f"{i:2}. {pub['title']}{pages}")
+
+    def export_for_website(self):
+        """
+        Export publication data as JSON for the website.
+        Updates the catalog from the known publications, the metadata cache and
+        the downloaded PDFs, then rewrites publications.json if anything changed.
+        """
+        publications = self.get_publication_list()
+
+        with self.catalog.transaction():
+            for pub in publications:
+                url_info = self.parse_issuu_url(pub['url'])
+                if not url_info:
+                    continue
+
+                doc_slug = url_info['doc_slug']
+                pdf_path = self.output_dir / self.pdf_filename(doc_slug)
+                fields = {
+                    'title': pub['title'],
+                    'issuu_url': pub['url'],
+                    'pages': self.page_count(url_info['username'], doc_slug),
+                }
+                if pdf_path.exists():
+                    self.catalog.record_pdf(doc_slug, pdf_path, **fields)
+                else:
+                    self.catalog.upsert(doc_slug, **fields)
+
+        output_path = self.catalog.json_path
+        if self.catalog.export_json():
+            self.log(f"Exported {len(self.catalog.all())} publications to {output_path}")
+        else:
+            self.log(f"Publications unchanged: {output_path}")
+        return output_path
+
+
+def _parser(prog, description):
+    parser = argparse.ArgumentParser(prog=prog, description=description)
+    parser.add_argument('--output', '-o', default=str(PDF_DIR), help=f'Output directory (default: {PDF_DIR})')
+    return parser
+
+
+def list_command(argv=None, prog=None):
+    args = _parser(prog, 'List known publications with their page counts').parse_args(argv)
+    Archive(args.output).print_publication_list()
+
+
+def export_command(argv=None, prog=None):
+    parser = _parser(prog, 'Update the catalog and publications.json from the publication list and the PDFs')
+    parser.add_argument('--quiet', '-q', action='store_true', help='Suppress output')
+    args = parser.parse_args(argv)
+    Archive(args.output, verbose=not args.quiet).export_for_website()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Offline throughput benchmark for the Issuu downloader.
+Starts the fake Issuu server (fake_issuu.py) in a separate process, drives
+IssuuDownloader.download_publication and download_all against it and reports
+pages/s, MB/s, CPU time and peak RSS. Results can be saved as a baseline and
+compared on later runs.
+
+Usage:
+  python benchmark.py --pages 40 --publications 6 --latency 30
+  python benchmark.py --save baseline.json
+  python benchmark.py --compare baseline.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fake_issuu import FakeIssuuConfig, FakeIssuuServer
+
+
+def serve(config, port_queue):
+    """Child process: run the fake server and report its port."""
+    server = FakeIssuuServer(('127.0.0.1', 0), config)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def measure(name, downloader, func, pages_expected):
+    """Run `func` and collect wall time, CPU time and transferred volume."""
+    bytes_before = downloader.metrics.page_bytes
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    func()
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    transferred = downloader.metrics.page_bytes - bytes_before
+    return {
+        'name': name,
+        'wall_s': round(wall, 3),
+        'cpu_s': round(cpu, 3),
+        'pages': pages_expected,
+        'pages_per_s': round(pages_expected / wall, 2) if wall else 0.0,
+        'mb_per_s': round(transferred / (1024 * 1024) / wall, 2) if wall else 0.0,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def run_benchmark(args):
+    from issuu_downloader import IssuuDownloader
+    from metrics import Metrics
+
+    config = FakeIssuuConfig(pages=args.pages, width=args.width, height=args.height,
+                             latency_ms=args.latency, error_rate=args.error_rate, max_rps=args.max_rps)
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(config, port_queue), daemon=True)
+    server.start()
+    base_url = f"http://127.0.0.1:{port_queue.get(timeout=30)}"
+
+    work_dir = Path(tempfile.mkdtemp(prefix='himmah-bench-'))
+    results = []
+    downloaders = []
+    try:
+        def make_downloader(output):
+            # A throwaway metrics file gives us byte counts without extra plumbing
+            downloader = IssuuDownloader(
+                output_dir=work_dir / output,
+                verbose=args.verbose,
+                page_workers=args.page_workers,
+                requests_per_second=args.rate,
+                max_requests_per_second=args.max_rate,
+                max_connections=args.max_connections,
+                metrics=Metrics(work_dir / f"{output}.jsonl"),
+                api_base=base_url
+            )
+            downloaders.append(downloader)
+            return downloader
+
+        single = make_downloader('single')
+        url = 'https://issuu.com/bench/docs/single_issue'
+        results.append(measure(
+            'publication (cold)', single,
+            lambda: single.download_publication(url), args.pages
+        ))
+        results.append(measure(
+            'publication (cached pages, rebuild)', single,
+            lambda: single.download_publication(url, force=True), args.pages
+        ))
+
+        publications = [
+            {'title': f'Bench issue {i}', 'url': f'https://issuu.com/bench/docs/issue_{i:03d}'}
+            for i in range(args.publications)
+        ]
+        bulk = make_downloader('bulk')
+        results.append(measure(
+            'download_all', bulk,
+            lambda: bulk.download_all(jobs=args.jobs, publications=publications),
+            args.pages * args.publications
+        ))
+    finally:
+        for downloader in downloaders:
+            downloader.metrics.close()
+        server.terminate()
+        server.join()
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        else:
+            print(f"Output kept in {work_dir}")
+
+    return {
+        'config': {
+            'pages': args.pages, 'publications': args.publications, 'width': args.width,
+            'height': args.height, 'latency_ms': args.latency, 'error_rate': args.error_rate,
+            'max_rps': args.max_rps, 'page_workers': args.page_workers, 'jobs': args.jobs,
+        },
+        'results': results,
+    }
+
+
+def print_report(report, baseline=None):
+    baseline_results = {r['name']: r for r in (baseline or {}).get('results', [])}
+    print(f"\n{'Scenario':38} {'wall s':>8} {'cpu s':>8} {'pages/s':>9} {'MB/s':>7} {'RSS MB':>8}")
+    print('-' * 82)
+    for r in report['results']:
+        print(f"{r['name']:38} {r['wall_s']:8.2f} {r['cpu_s']:8.2f} {r['pages_per_s']:9.1f} "
+              f"{r['mb_per_s']:7.2f} {r['peak_rss_mb']:8.1f}")
+        base = baseline_results.get(r['name'])
+        if base and base['wall_s']:
+            change = (r['wall_s'] - base['wall_s']) / base['wall_s'] * 100
+            print(f"{'  vs baseline':38} {change:+7.1f}% wall, "
+                  f"{r['pages_per_s'] - base['pages_per_s']:+.1f} pages/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the downloader against a local fake Issuu server')
+    parser.add_argument('--pages', type=int, default=40, help='Pages per publication (default: 40)')
+    parser.add_argument('--publications', type=int, default=6, help='Publications for download_all (default: 6)')
+    parser.add_argument('--width', type=int, default=1000, help='Page width in pixels (default: 1000)')
+    parser.add_argument('--height', type=int, default=1400, help='Page height in pixels (default: 1400)')
+    parser.add_argument('--latency', type=int, default=30, help='Server latency per request in ms (default: 30)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests failing with 503')
+    parser.add_argument('--max-rps', type=int, default=0, help='Server throttles (429) above this many requests/s')
+    parser.add_argument('--page-workers', type=int, default=4)
+    parser.add_argument('--jobs', type=int, default=2)
+    parser.add_argument('--rate', type=float, default=50.0, help='Initial client request rate per host')
+    parser.add_argument('--max-rate', type=float, default=200.0, help='Max adaptive client request rate')
+    parser.add_argument('--max-connections', type=int, default=8)
+    parser.add_argument('--save', metavar='PATH', help='Save results as JSON (e.g. a baseline)')
+    parser.add_argument('--compare', metavar='PATH', help='Compare against saved baseline JSON')
+    parser.add_argument('--keep', action='store_true', help='Keep downloaded output')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Show downloader output')
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved results to {args.save}")
+
+
+if __name__ == '__main__':
+    main()
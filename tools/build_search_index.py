@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Build the prebuilt search index for the website.
+
+Reads data/publications.json and writes a compact inverted index to
+data/search/: index.json holds the document list and shard names, and
+shards/<prefix>.json hold the postings of every token starting with that
+two-character prefix, so the site only fetches the shards a query needs.
+
+Tokens are normalized the way app.js normalizes queries (lowercase, no
+diacritics, leading zeros dropped). Roman numerals in titles are also
+indexed as numbers (XIX -> 19), and Indonesian words are stemmed: every
+surface word carries the postings of all words sharing its stem, so
+"perjuangan" finds "berjuang" without the site having to stem anything.
+The index is rebuilt only when the searchable fields of the catalog change.
+
+Usage:
+  python build_search_index.py
+  python build_search_index.py --force
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from collections import defaultdict
+from pathlib import Path
+
+from himmah.config import PUBLICATIONS_JSON as DATA_FILE, SEARCH_INDEX_DIR as INDEX_DIR
+
+# Bump when tokenization or the file format changes, to force a rebuild
+INDEX_VERSION = 1
+PREFIX_LENGTH = 2
+SEARCH_FIELDS = ('id', 'title', 'category', 'year')
+
+STOPWORDS = {
+    'dan', 'di', 'ke', 'dari', 'yang', 'untuk', 'dengan', 'pada', 'dalam', 'atau', 'the', 'of',
+}
+
+TOKEN = re.compile(r'[0-9a-z]+')
+ROMAN = re.compile(r'^(L?X{0,3}|XL|XC)(IX|IV|V?I{0,3})$')
+ROMAN_VALUES = {'I': 1, 'V': 5, 'X': 10, 'L': 50, 'C': 100}
+
+# Indonesian affixes, longest first
+PARTICLES = ('lah', 'kah', 'pun')
+POSSESSIVES = ('nya', 'ku', 'mu')
+SUFFIXES = ('kan', 'an', 'i')
+PREFIXES = ('di', 'ke', 'ter', 'ber', 'per')
+# Prefixes that can follow another one (di-per-, mem-per-, di-ke-)
+INNER_PREFIXES = ('per', 'ke')
+# ke-an and peN-an nouns take only -an
+NOUN_PREFIXES = ('ke', 'pe')
+MIN_STEM = 4
+# -lah/-kah on short words is usually part of the root (masalah, sekolah)
+MIN_PARTICLE_STEM = 5
+VOWELS = set('aeiou')
+
+
+def fold(text):
+    """Lowercase and strip diacritics."""
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+
+def roman_to_int(word):
+    """Value of an uppercase Roman numeral up to C, or None."""
+    if not word or not ROMAN.match(word):
+        return None
+    total = 0
+    for current, following in zip(word, word[1:] + ' '):
+        value = ROMAN_VALUES[current]
+        total += -value if ROMAN_VALUES.get(following, 0) > value else value
+    return total
+
+
+def _strip_suffix(word, suffixes, min_stem=MIN_STEM):
+    for suffix in suffixes:
+        if word.endswith(suffix) and len(word) - len(suffix) >= min_stem:
+            return word[:-len(suffix)]
+    return word
+
+
+def _strip_prefix(word):
+    """
+    Remove one derivational prefix, undoing nasal assimilation of meN-/peN-.
+    Returns (rest, prefix) with prefix None if nothing was removed.
+    """
+    for prefix in PREFIXES:
+        if word.startswith(prefix) and len(word) - len(prefix) >= MIN_STEM:
+            return word[len(prefix):], prefix
+    for nasal in ('me', 'pe'):
+        if not word.startswith(nasal):
+            continue
+        rest = word[2:]
+        if rest.startswith('ng') and rest[2:3] in VOWELS:
+            candidate = rest[2:]            # mengambil -> ambil
+        elif rest.startswith('ny') and rest[2:3] in VOWELS:
+            candidate = 's' + rest[2:]      # menyapu -> sapu
+        elif rest.startswith('m') and rest[1:2] in VOWELS:
+            candidate = 'p' + rest[1:]      # memukul -> pukul
+        elif rest.startswith('n') and rest[1:2] in VOWELS:
+            candidate = 't' + rest[1:]      # menulis -> tulis
+        elif rest[:2] in ('mb', 'mp') or rest[:2] in ('nd', 'nc', 'nj') or rest[:3] == 'ngg':
+            candidate = rest[1:] if rest[0] == 'm' or rest[:2] != 'ng' else rest[2:]
+        elif rest[:1] in ('l', 'r', 'w', 'y'):
+            candidate = rest                # merawat -> rawat
+        else:
+            continue
+        if len(candidate) >= MIN_STEM:
+            return candidate, nasal
+    return word, None
+
+
+def stem(word):
+    """
+    Light rule-based Indonesian stemmer (particle, possessive, suffix, prefix).
+    No dictionary, so stems are kept at least MIN_STEM letters long.
+    """
+    if not word.isalpha() or len(word) <= MIN_STEM:
+        return word
+    word = _strip_suffix(word, PARTICLES, MIN_PARTICLE_STEM)
+    word = _strip_suffix(word, POSSESSIVES)
+    surface = word
+    word, prefix = _strip_prefix(word)
+    if not prefix:
+        # Unprefixed words: -i is too often part of the root (realisasi, kobari)
+        return _strip_suffix(word, SUFFIXES[:2])
+    # A recoded nasal (pemerintah -> perintah) is already the root's first letter
+    if surface.endswith(word):
+        inner, inner_prefix = _strip_prefix(word)
+        if inner_prefix in INNER_PREFIXES:
+            word = inner
+    if prefix in NOUN_PREFIXES:
+        return _strip_suffix(word, ('an',))
+    return _strip_suffix(word, SUFFIXES)
+
+
+def normalize_token(token):
+    """Canonical form of one folded token: numbers lose leading zeros."""
+    if token.isdigit():
+        return token.lstrip('0') or '0'
+    return token
+
+
+def tokenize(text):
+    """Yield normalized tokens of `text`, adding numbers for uppercase Roman numerals."""
+    for raw in re.findall(r'[0-9A-Za-zÀ-ɏ]+', text):
+        value = roman_to_int(raw) if raw.isupper() and len(raw) >= 2 else None
+        if value:
+            yield str(value)
+        for token in TOKEN.findall(fold(raw)):
+            token = normalize_token(token)
+            if token not in STOPWORDS:
+                yield token
+
+
+def catalog_hash(publications):
+    """Hash of the fields the index is built from; other fields (pdf_file, placeholder) don't matter."""
+    searchable = [{field: pub.get(field) for field in SEARCH_FIELDS} for pub in publications]
+    payload = json.dumps([INDEX_VERSION, searchable], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def shard_key(token):
+    return token[:PREFIX_LENGTH]
+
+
+def build_index(publications):
+    """Return (docs, shards) where shards maps prefix -> {token: [doc numbers]}."""
+    docs = [pub['id'] for pub in publications]
+    postings = defaultdict(set)
+    for number, pub in enumerate(publications):
+        text = ' '.join(str(pub.get(field) or '') for field in ('title', 'category', 'year'))
+        for token in tokenize(text):
+            postings[token].add(number)
+
+    # Merge postings of words that share a stem, so any variant finds all of them
+    families = defaultdict(set)
+    for token in postings:
+        families[stem(token)].add(token)
+    merged = {}
+    for members in families.values():
+        family_docs = set().union(*(postings[token] for token in members))
+        for token in members:
+            merged[token] = sorted(family_docs)
+
+    shards = defaultdict(dict)
+    for token in sorted(merged):
+        shards[shard_key(token)][token] = merged[token]
+    return docs, dict(shards)
+
+
+def write_json(path, data):
+    tmp_path = path.with_suffix('.json.part')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'), ensure_ascii=False, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def build_search_index(data_file=DATA_FILE, index_dir=INDEX_DIR, force=False):
+    """Build the index if the catalog changed. Returns True if it was rebuilt."""
+    index_dir = Path(index_dir)
+    with open(data_file, 'r', encoding='utf-8') as f:
+        publications = json.load(f)
+
+    version = catalog_hash(publications)
+    index_path = index_dir / 'index.json'
+    if not force and index_path.exists():
+        with open(index_path, 'r', encoding='utf-8') as f:
+            if json.load(f).get('version') == version:
+                print(f"Search index up to date ({len(publications)} publications)")
+                return False
+
+    docs, shards = build_index(publications)
+    shard_dir = index_dir / 'shards'
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    for prefix, tokens in shards.items():
+        write_json(shard_dir / f"{prefix}.json", tokens)
+    # Drop shards whose prefix no longer occurs
+    for stale in shard_dir.glob('*.json'):
+        if stale.stem not in shards:
+            stale.unlink()
+
+    # index.json is written last: the site sees either the old or the new index
+    write_json(index_path, {
+        'version': version,
+        'prefix_length': PREFIX_LENGTH,
+        'docs': docs,
+        'shards': sorted(shards),
+    })
+
+    total_tokens = sum(len(tokens) for tokens in shards.values())
+    total_bytes = sum(path.stat().st_size for path in shard_dir.glob('*.json'))
+    print(f"Indexed {len(docs)} publications: {total_tokens} tokens in {len(shards)} shards "
+          f"({total_bytes / 1024:.1f} KB) -> {index_dir}")
+    return True
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description='Build the sharded search index for the website')
+    parser.add_argument('--input', '-i', default=str(DATA_FILE), help=f'Catalog JSON (default: {DATA_FILE})')
+    parser.add_argument('--output', '-o', default=str(INDEX_DIR), help=f'Index directory (default: {INDEX_DIR})')
+    parser.add_argument('--force', action='store_true', help='Rebuild even if the catalog is unchanged')
+    args = parser.parse_args(argv)
+    build_search_index(args.input, args.output, force=args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Publication catalog, the single source of data/publications.json.
+
+Publications live in SQLite keyed by doc_slug and are changed with
+incremental upserts: the downloader records page counts and PDF sizes,
+the sync scripts apply download results and generate_thumbnails adds cover
+placeholders. export_json() renders the catalog deterministically and
+rewrites publications.json (plus .gz and .br copies) atomically, and only
+when the content changed, so CDN caches stay valid between runs.
+
+If the database is missing it is seeded from the existing publications.json.
+
+Usage:
+  python catalog.py --export
+  python catalog.py --stats
+"""
+
+import argparse
+import gzip
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from himmah.config import CATALOG_DB, ISSUU_USER, PUBLICATIONS_JSON as CATALOG_JSON
+
+DEFAULT_YEAR = 2000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS publications (
+    doc_slug TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    category TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    pages INTEGER,
+    issuu_url TEXT,
+    pdf_file TEXT,
+    pdf_size INTEGER,
+    placeholder TEXT,
+    updated_at REAL NOT NULL
+);
+"""
+
+# Columns that upsert() may set, in publications.json key order (doc_slug is exported as 'id')
+FIELDS = ('title', 'category', 'year', 'pages', 'issuu_url', 'pdf_file', 'pdf_size', 'placeholder')
+# Exported only when set
+OPTIONAL_FIELDS = {'pdf_size', 'placeholder'}
+
+YEAR = re.compile(r'(?<!\d)(19\d{2}|20\d{2})(?!\d)')
+
+
+def parse_title(title):
+    """Category and year of a publication title."""
+    upper = title.upper()
+    # KOBARKobari issues sometimes mention HIMMAH in their title, so check it first
+    if 'KOBAR' in upper:
+        category = 'kobarkobari'
+    elif 'MUHIBBAH' in upper:
+        category = 'muhibbah'
+    elif 'HIMMAH' in upper:
+        category = 'himmah'
+    else:
+        category = 'other'
+    year_match = YEAR.search(title)
+    year = int(year_match.group(1)) if year_match else DEFAULT_YEAR
+    return category, year
+
+
+def _write_atomic(path, data):
+    tmp_path = path.with_name(path.name + '.part')
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class Catalog:
+    """SQLite-backed publication catalog."""
+
+    def __init__(self, db_path=CATALOG_DB, json_path=CATALOG_JSON):
+        self.db_path = Path(db_path)
+        self.json_path = Path(json_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+        if not self._execute('SELECT 1 FROM publications LIMIT 1') and self.json_path.exists():
+            self.import_json(self.json_path)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    @contextmanager
+    def transaction(self):
+        """Group many upserts into one atomic write."""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield self
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+
+    def import_json(self, json_path):
+        """Load an existing publications.json; keys match the catalog columns."""
+        with open(json_path, 'r', encoding='utf-8') as f:
+            publications = json.load(f)
+        with self.transaction():
+            for pub in publications:
+                self.upsert(pub['id'], **{field: pub.get(field) for field in FIELDS})
+        return len(publications)
+
+    def upsert(self, doc_slug, **fields):
+        """
+        Insert or update one publication. Only fields that are given and not None
+        change; category and year default to what the title implies.
+        """
+        unknown = set(fields) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown catalog fields: {', '.join(sorted(unknown))}")
+        fields = {key: value for key, value in fields.items() if value is not None}
+
+        with self._lock:
+            existing = self.get(doc_slug)
+            if existing is None:
+                title = fields.get('title') or doc_slug
+                category, year = parse_title(title)
+                row = {field: None for field in FIELDS}
+                row.update(title=title, category=category, year=year)
+            else:
+                row = {field: existing[field] for field in FIELDS}
+                if 'title' in fields and fields['title'] != existing['title']:
+                    # A corrected title re-derives category and year unless they are given too
+                    row['category'], row['year'] = parse_title(fields['title'])
+            row.update(fields)
+            if existing is not None and all(row[field] == existing[field] for field in FIELDS):
+                return False
+
+            columns = ', '.join(('doc_slug',) + FIELDS + ('updated_at',))
+            placeholders = ', '.join('?' * (len(FIELDS) + 2))
+            self._execute(
+                f'INSERT OR REPLACE INTO publications ({columns}) VALUES ({placeholders})',
+                (doc_slug, *(row[field] for field in FIELDS), time.time())
+            )
+        return True
+
+    def record_pdf(self, doc_slug, pdf_path, pages=None, **fields):
+        """Upsert the file facts of a built PDF (relative path for the site, size, page count)."""
+        pdf_path = Path(pdf_path)
+        return self.upsert(
+            doc_slug,
+            pdf_file=f"./pdfs/{pdf_path.name}",
+            pdf_size=pdf_path.stat().st_size,
+            pages=pages,
+            **fields
+        )
+
+    def remove(self, doc_slug):
+        self._execute('DELETE FROM publications WHERE doc_slug = ?', (doc_slug,))
+
+    def get(self, doc_slug):
+        """One publication as a dict, or None."""
+        rows = self._execute(
+            f'SELECT doc_slug, {", ".join(FIELDS)} FROM publications WHERE doc_slug = ?', (doc_slug,)
+        )
+        return self._as_dict(rows[0]) if rows else None
+
+    def all(self):
+        """Publications in export order: newest first, then by title."""
+        rows = self._execute(f'SELECT doc_slug, {", ".join(FIELDS)} FROM publications')
+        return sorted((self._as_dict(row) for row in rows), key=lambda p: (-p['year'], p['title'], p['id']))
+
+    @staticmethod
+    def _as_dict(row):
+        pub = {'id': row[0]}
+        pub.update(zip(FIELDS, row[1:]))
+        return pub
+
+    def render_json(self):
+        """Deterministic publications.json bytes."""
+        publications = [
+            {key: value for key, value in pub.items() if not (key in OPTIONAL_FIELDS and value is None)}
+            for pub in self.all()
+        ]
+        return json.dumps(publications, indent=4, ensure_ascii=False).encode('utf-8')
+
+    def export_json(self, json_path=None):
+        """
+        Write publications.json and precompressed .gz/.br copies if the content changed.
+        Returns True if anything was written.
+        """
+        json_path = Path(json_path) if json_path else self.json_path
+        data = self.render_json()
+        outputs = {json_path: lambda: data, json_path.with_name(json_path.name + '.gz'): lambda: gzip.compress(data, 9, mtime=0)}
+        try:
+            import brotli
+            outputs[json_path.with_name(json_path.name + '.br')] = lambda: brotli.compress(data, quality=11)
+        except ImportError:
+            pass
+
+        try:
+            unchanged = json_path.read_bytes() == data
+        except OSError:
+            unchanged = False
+        # Compressed copies are regenerated if missing, e.g. after brotli was installed
+        if unchanged and all(path.exists() for path in outputs):
+            return False
+
+        json_path.parent.mkdir(parents=True, exist_ok=True)
+        # The plain file goes last, so it never points at stale compressed copies
+        for path, render in reversed(list(outputs.items())):
+            _write_atomic(path, render())
+        return True
+
+    def stats(self):
+        rows = self._execute(
+            'SELECT category, COUNT(*), SUM(pdf_file IS NOT NULL), SUM(COALESCE(pdf_size, 0)) '
+            'FROM publications GROUP BY category ORDER BY category'
+        )
+        return [{'category': c, 'publications': n, 'pdfs': p, 'bytes': b} for c, n, p, b in rows]
+
+
+def sync_download_results(results_path, catalog=None):
+    """
+    Apply download_results.json to the catalog, keyed by doc_slug, with real
+    page counts and file sizes. Entries without username and doc_slug (older
+    results files) are taken to be LPM HIMMAH documents named after the PDF.
+    Returns the number of changed entries.
+    """
+    catalog = catalog or Catalog()
+    with open(results_path, 'r', encoding='utf-8') as f:
+        results = json.load(f)
+
+    pdf_dir = Path(results_path).parent
+    metadata = None
+    if (pdf_dir / '.metadata_cache.sqlite').exists():
+        from metadata_cache import MetadataCache
+        metadata = MetadataCache(pdf_dir / '.metadata_cache.sqlite')
+    # Pages left out by --drop-blank/--drop-duplicates are not in the PDF
+    analysis = None
+    if metadata and (pdf_dir / '.page_analysis.sqlite').exists():
+        from page_analysis import PageAnalysis
+        analysis = PageAnalysis(pdf_dir / '.page_analysis.sqlite')
+
+    changed = 0
+    with catalog.transaction():
+        for item in results.get('downloaded', []):
+            pdf_path = pdf_dir / Path(item['path']).name
+            username = item.get('username') or ISSUU_USER
+            doc_slug = item.get('doc_slug') or pdf_path.stem
+            pages = metadata.page_count(username, doc_slug) if metadata else None
+            if pages and analysis:
+                pages -= analysis.dropped_count(username, doc_slug)
+            fields = {
+                'title': item['title'],
+                'issuu_url': item.get('url') or f'https://issuu.com/{username}/docs/{doc_slug}',
+                'pages': pages,
+            }
+            if pdf_path.exists():
+                changed += catalog.record_pdf(doc_slug, pdf_path, **fields)
+            else:
+                changed += catalog.upsert(doc_slug, pdf_file=f"./pdfs/{pdf_path.name}", **fields)
+    return changed
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description='Manage the publication catalog behind data/publications.json')
+    parser.add_argument('--db', default=str(CATALOG_DB), help=f'Catalog database (default: {CATALOG_DB})')
+    parser.add_argument('--json', default=str(CATALOG_JSON), help=f'publications.json path (default: {CATALOG_JSON})')
+    parser.add_argument('--import-json', action='store_true', help='Re-import publications.json into the catalog')
+    parser.add_argument('--export', action='store_true', help='Write publications.json if the catalog changed')
+    parser.add_argument('--stats', action='store_true', help='Show catalog counts per category')
+    args = parser.parse_args(argv)
+
+    if not any([args.import_json, args.export, args.stats]):
+        parser.print_help()
+        return
+
+    catalog = Catalog(args.db, args.json)
+    if args.import_json:
+        print(f"Imported {catalog.import_json(args.json)} publications from {args.json}")
+    if args.export:
+        if catalog.export_json():
+            print(f"Wrote {args.json} (+ .gz/.br)")
+        else:
+            print(f"{args.json} is up to date")
+    if args.stats:
+        for row in catalog.stats():
+            print(f"  {row['category']:12} {row['publications']:4} publications, "
+                  f"{row['pdfs']:4} PDFs, {row['bytes'] / (1024 * 1024):8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
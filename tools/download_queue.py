@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Persistent job queue for bulk downloads.
+Keeps per-publication job state in SQLite so an interrupted `--all` run
+resumes where it stopped instead of starting over. Finished jobs expire after
+DONE_MAX_AGE, so publications that changed upstream are picked up again.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+INCOMPLETE = 'incomplete'
+FAILED = 'failed'
+
+DONE_MAX_AGE = 7 * 24 * 3600  # seconds
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    url TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    pdf_path TEXT,
+    missing_pages TEXT,
+    error TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, position);
+"""
+
+
+class DownloadQueue:
+    """SQLite-backed queue of publication download jobs."""
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(jobs)')}
+        if 'missing_pages' not in columns:
+            self._conn.execute('ALTER TABLE jobs ADD COLUMN missing_pages TEXT')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def enqueue(self, publications):
+        """Add publications that are not yet queued. Existing jobs keep their state."""
+        with self._lock:
+            self._conn.execute('BEGIN')
+            for position, pub in enumerate(publications):
+                self._conn.execute(
+                    'INSERT OR IGNORE INTO jobs (url, title, position, updated_at) VALUES (?, ?, ?, ?)',
+                    (pub['url'], pub['title'], position, time.time())
+                )
+            self._conn.execute('COMMIT')
+
+    def requeue(self, include_failed=True):
+        """
+        Put interrupted (and optionally failed or incomplete) jobs back into the queue.
+        Returns the number of requeued jobs.
+        """
+        statuses = (RUNNING, FAILED, INCOMPLETE) if include_failed else (RUNNING,)
+        placeholders = ', '.join('?' for _ in statuses)
+        with self._lock:
+            cursor = self._conn.execute(
+                f'UPDATE jobs SET status = ?, updated_at = ? WHERE status IN ({placeholders})',
+                (PENDING, time.time(), *statuses)
+            )
+            return cursor.rowcount
+
+    def expire(self, max_age=DONE_MAX_AGE):
+        """
+        Put jobs that finished more than `max_age` seconds ago back into the
+        queue, so they are checked for upstream changes. Returns the number
+        of requeued jobs.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                'UPDATE jobs SET status = ?, updated_at = ? WHERE status = ? AND updated_at < ?',
+                (PENDING, now, DONE, now - max_age)
+            )
+            return cursor.rowcount
+
+    def reset(self):
+        """Forget all job state."""
+        self._execute('DELETE FROM jobs')
+
+    def claim(self):
+        """Atomically take the next pending job. Returns a dict or None."""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            row = self._conn.execute(
+                'SELECT url, title FROM jobs WHERE status = ? ORDER BY position LIMIT 1',
+                (PENDING,)
+            ).fetchone()
+            if row:
+                self._conn.execute(
+                    'UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE url = ?',
+                    (RUNNING, time.time(), row[0])
+                )
+            self._conn.execute('COMMIT')
+        if not row:
+            return None
+        return {'url': row[0], 'title': row[1]}
+
+    def complete(self, url, pdf_path, missing_pages=None):
+        """Mark a job done, or incomplete if some pages could not be fetched."""
+        status = INCOMPLETE if missing_pages else DONE
+        self._execute(
+            'UPDATE jobs SET status = ?, pdf_path = ?, missing_pages = ?, error = NULL, updated_at = ? WHERE url = ?',
+            (status, str(pdf_path), json.dumps(missing_pages) if missing_pages else None, time.time(), url)
+        )
+
+    def fail(self, url, error=None):
+        self._execute(
+            'UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE url = ?',
+            (FAILED, error, time.time(), url)
+        )
+
+    def counts(self):
+        """Number of jobs per status."""
+        return dict(self._execute('SELECT status, COUNT(*) FROM jobs GROUP BY status'))
+
+    def results(self):
+        """Results in the `download_results.json` format."""
+        downloaded = []
+        for url, title, pdf_path, missing_pages in self._execute(
+            'SELECT url, title, pdf_path, missing_pages FROM jobs WHERE status IN (?, ?) ORDER BY position',
+            (DONE, INCOMPLETE)
+        ):
+            item = {'title': title, 'url': url, 'path': pdf_path}
+            if missing_pages:
+                item['missing_pages'] = json.loads(missing_pages)
+            downloaded.append(item)
+        failed = [
+            {'title': title, 'url': url}
+            for title, url in self._execute(
+                'SELECT title, url FROM jobs WHERE status = ? ORDER BY position', (FAILED,)
+            )
+        ]
+        return {'downloaded': downloaded, 'failed': failed}
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Issuu endpoints the downloader uses.
+Serves reader3_4.json documents and synthetic JPEG pages with configurable
+page count, page size, latency, error rate, throttling and broken page
+transfers (Range requests are honoured for resuming), so the tools can
+be benchmarked and exercised without touching issuu.com. With --documents it
+also serves a paginated profile listing (newest first) for the crawler;
+publish() adds new uploads at the top while the server runs.
+
+Usage:
+  python fake_issuu.py --port 8765 --pages 40 --latency 50 --error-rate 0.05
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from PIL import Image
+
+DOC_PATH = re.compile(r'^/(?P<username>[^/]+)/(?P<doc_slug>[^/]+)/reader3_4\.json$')
+PAGE_PATH = re.compile(r'^/pages/(?P<username>[^/]+)/(?P<doc_slug>[^/]+)/page_(?P<page>\d+)\.jpg$')
+PROFILE_PATH = re.compile(r'^/call/profile/v1/documents/(?P<username>[^/]+)$')
+
+
+def make_page_jpeg(width, height, seed, quality=85):
+    """A deterministic noisy JPEG; noise keeps the encoded size realistic for scans."""
+    rng = random.Random(seed)
+    small = (max(1, width // 4), max(1, height // 4))
+    noise = Image.frombytes('L', small, rng.randbytes(small[0] * small[1])).resize((width, height))
+    tint = Image.new('RGB', (width, height), (rng.randint(180, 255), rng.randint(180, 255), rng.randint(160, 240)))
+    img = Image.blend(tint, Image.merge('RGB', (noise, noise, noise)), 0.4)
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+class FakeIssuuConfig:
+    """Behaviour of the fake server."""
+
+    def __init__(self, pages=20, width=1000, height=1400, latency_ms=0, error_rate=0.0,
+                 max_rps=0, page_variants=4, seed=0, documents=0, truncate_rate=0.0, corrupt_rate=0.0):
+        self.pages = pages
+        self.width = width
+        self.height = height
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.max_rps = max_rps
+        self.page_variants = max(1, page_variants)
+        self.seed = seed
+        # Documents in the profile listing
+        self.documents = documents
+        # Page responses cut off mid-body (connection closed early)...
+        self.truncate_rate = truncate_rate
+        # ...or served cut short with a matching Content-Length (a broken file)
+        self.corrupt_rate = corrupt_rate
+
+
+class FakeIssuuServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config):
+        super().__init__(address, FakeIssuuHandler)
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.lock = threading.Lock()
+        self.request_times = []
+        self.stats = {'documents': 0, 'pages': 0, 'listings': 0, 'errors': 0, 'throttled': 0, 'not_modified': 0,
+                      'truncated': 0, 'corrupted': 0, 'ranges': 0}
+        # Profile listing, oldest first; served newest first
+        self.uploads = []
+        self.publish(config.documents)
+        # A few pre-encoded variants are reused for every page to keep the server cheap
+        self.page_images = [
+            make_page_jpeg(config.width, config.height, config.seed + i)
+            for i in range(config.page_variants)
+        ]
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def document(self, username, doc_slug):
+        pages = [
+            {'imageUri': f"{self.base_url}/pages/{username}/{doc_slug}/page_{i:04d}.jpg",
+             'width': self.config.width, 'height': self.config.height}
+            for i in range(1, self.config.pages + 1)
+        ]
+        return {'status': 0, 'document': {'documentId': doc_slug, 'pages': pages}}
+
+    def publish(self, count=1):
+        """Add `count` new documents to the profile listing."""
+        with self.lock:
+            for _ in range(count):
+                number = len(self.uploads) + 1
+                self.uploads.append({
+                    'doc_slug': f"edisi_{number:04d}",
+                    'title': f"Majalah HIMMAH No. {number:02d}/{1970 + number % 50}",
+                    'published': f"{1970 + number % 50}-01-01T00:00:00Z",
+                })
+
+    def listing(self, username, offset, limit):
+        with self.lock:
+            newest_first = self.uploads[::-1]
+        items = [
+            {'uri': f"{username}/docs/{doc['doc_slug']}", 'title': doc['title'], 'publishDate': doc['published']}
+            for doc in newest_first[offset:offset + limit]
+        ]
+        return {'items': items, 'hasMore': offset + limit < len(newest_first), 'totalCount': len(newest_first)}
+
+    def page_fault(self):
+        """Return None, 'truncate' or 'corrupt' for the next full page response."""
+        with self.lock:
+            roll = self.rng.random()
+            if roll < self.config.truncate_rate:
+                self.stats['truncated'] += 1
+                return 'truncate'
+            if roll < self.config.truncate_rate + self.config.corrupt_rate:
+                self.stats['corrupted'] += 1
+                return 'corrupt'
+        return None
+
+    def admit(self):
+        """Return 'ok', 'throttle' or 'error' for the next request."""
+        with self.lock:
+            now = time.monotonic()
+            if self.config.max_rps:
+                self.request_times = [t for t in self.request_times if now - t < 1.0]
+                if len(self.request_times) >= self.config.max_rps:
+                    self.stats['throttled'] += 1
+                    return 'throttle'
+                self.request_times.append(now)
+            if self.config.error_rate and self.rng.random() < self.config.error_rate:
+                self.stats['errors'] += 1
+                return 'error'
+        return 'ok'
+
+
+class FakeIssuuHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b'', content_type='application/octet-stream', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        if server.config.latency_ms:
+            time.sleep(server.config.latency_ms / 1000.0)
+
+        admission = server.admit()
+        if admission == 'throttle':
+            return self._send(429, b'slow down', 'text/plain', {'Retry-After': '1'})
+        if admission == 'error':
+            return self._send(503, b'unavailable', 'text/plain')
+
+        match = DOC_PATH.match(self.path)
+        if match:
+            body = json.dumps(server.document(match['username'], match['doc_slug'])).encode('utf-8')
+            etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+            if self.headers.get('If-None-Match') == etag:
+                with server.lock:
+                    server.stats['not_modified'] += 1
+                return self._send(304, headers={'ETag': etag})
+            with server.lock:
+                server.stats['documents'] += 1
+            return self._send(200, body, 'application/json', {'ETag': etag})
+
+        url = urlparse(self.path)
+        match = PROFILE_PATH.match(url.path)
+        if match:
+            query = {name: values[0] for name, values in parse_qs(url.query).items()}
+            listing = server.listing(match['username'], int(query.get('offset', 0)), int(query.get('limit', 25)))
+            with server.lock:
+                server.stats['listings'] += 1
+            return self._send(200, json.dumps(listing).encode('utf-8'), 'application/json')
+
+        match = PAGE_PATH.match(self.path)
+        if match:
+            page = int(match['page'])
+            body = server.page_images[page % len(server.page_images)]
+            etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+            with server.lock:
+                server.stats['pages'] += 1
+            range_match = re.match(r'bytes=(\d+)-$', self.headers.get('Range', ''))
+            if range_match and self.headers.get('If-Range', etag) == etag and int(range_match[1]) < len(body):
+                start = int(range_match[1])
+                with server.lock:
+                    server.stats['ranges'] += 1
+                return self._send(206, body[start:], 'image/jpeg', {
+                    'ETag': etag, 'Content-Range': f"bytes {start}-{len(body) - 1}/{len(body)}"})
+            fault = server.page_fault()
+            if fault == 'corrupt':
+                return self._send(200, body[:len(body) // 2], 'image/jpeg', {'ETag': etag})
+            if fault == 'truncate':
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/jpeg')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body[:len(body) // 2])
+                self.close_connection = True
+                return
+            return self._send(200, body, 'image/jpeg', {'ETag': etag, 'Accept-Ranges': 'bytes'})
+
+        return self._send(404, b'not found', 'text/plain')
+
+
+def start_server(config, host='127.0.0.1', port=0):
+    """Start a fake server on a background thread. Returns the server."""
+    server = FakeIssuuServer((host, port), config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local fake Issuu server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--pages', type=int, default=20, help='Pages per document')
+    parser.add_argument('--width', type=int, default=1000, help='Page width in pixels')
+    parser.add_argument('--height', type=int, default=1400, help='Page height in pixels')
+    parser.add_argument('--latency', type=int, default=0, help='Added latency per request in ms')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+    parser.add_argument('--max-rps', type=int, default=0, help='Requests per second before answering 429')
+    parser.add_argument('--documents', type=int, default=0, help='Documents in the profile listing')
+    parser.add_argument('--truncate-rate', type=float, default=0.0, help='Fraction of pages cut off mid-transfer')
+    parser.add_argument('--corrupt-rate', type=float, default=0.0, help='Fraction of pages served incomplete')
+    args = parser.parse_args()
+
+    config = FakeIssuuConfig(pages=args.pages, width=args.width, height=args.height,
+                             latency_ms=args.latency, error_rate=args.error_rate, max_rps=args.max_rps,
+                             documents=args.documents, truncate_rate=args.truncate_rate,
+                             corrupt_rate=args.corrupt_rate)
+    server = FakeIssuuServer((args.host, args.port), config)
+    print(f"Fake Issuu serving on {server.base_url}")
+    print(f"  Document API: {server.base_url}/<username>/<doc_slug>/reader3_4.json")
+    if args.documents:
+        print(f"  Profile listing: {server.base_url}/call/profile/v1/documents/<username>")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the S3 API subset that r2_sync.py uses.
+Keeps objects in memory and implements path-style ListObjectsV2, Put/Head/
+Get/DeleteObject, DeleteObjects and multipart uploads with S3-style ETags,
+so uploads can be exercised without touching Cloudflare R2. Signatures are
+not checked.
+
+Usage:
+  python fake_s3.py --port 9000
+  python r2_sync.py --endpoint-url http://127.0.0.1:9000 --bucket himmah-pdfs
+"""
+
+import argparse
+import hashlib
+import threading
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+S3_NS = 'http://s3.amazonaws.com/doc/2006-03-01/'
+MAX_KEYS = 1000
+
+
+class StoredObject:
+    def __init__(self, data, etag, headers):
+        self.data = data
+        self.etag = etag
+        self.content_type = headers.get('Content-Type', 'binary/octet-stream')
+        self.cache_control = headers.get('Cache-Control')
+        self.last_modified = datetime.now(timezone.utc)
+
+
+class FakeS3Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address):
+        super().__init__(address, FakeS3Handler)
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.uploads = {}
+        self.stats = {'requests': 0, 'puts': 0, 'parts': 0, 'bytes_received': 0, 'deletes': 0}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def bucket(self, name):
+        return self.buckets.setdefault(name, {})
+
+
+class FakeS3Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b'', headers=None, content_type='application/xml'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if body and self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _error(self, status, code):
+        body = f'<?xml version="1.0" encoding="UTF-8"?><Error><Code>{code}</Code></Error>'.encode('utf-8')
+        self._send(status, body)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        data = self.rfile.read(length) if length else b''
+        with self.server.lock:
+            self.server.stats['bytes_received'] += len(data)
+        return data
+
+    def _route(self):
+        """Split the path-style URL into (bucket, key, query)."""
+        url = urlparse(self.path)
+        parts = url.path.lstrip('/').split('/', 1)
+        bucket = unquote(parts[0])
+        key = unquote(parts[1]) if len(parts) > 1 else ''
+        query = {name: values[0] for name, values in parse_qs(url.query, keep_blank_values=True).items()}
+        with self.server.lock:
+            self.server.stats['requests'] += 1
+        return bucket, key, query
+
+    def do_GET(self):
+        bucket, key, query = self._route()
+        if not key:
+            return self._list(bucket, query)
+        with self.server.lock:
+            obj = self.server.bucket(bucket).get(key)
+        if obj is None:
+            return self._error(404, 'NoSuchKey')
+        self._send(200, obj.data, self._object_headers(obj), obj.content_type)
+
+    def do_HEAD(self):
+        bucket, key, _ = self._route()
+        with self.server.lock:
+            obj = self.server.bucket(bucket).get(key)
+        if obj is None:
+            return self._send(404)
+        headers = self._object_headers(obj)
+        self.send_response(200)
+        self.send_header('Content-Type', obj.content_type)
+        self.send_header('Content-Length', str(len(obj.data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def _object_headers(self, obj):
+        headers = {'ETag': f'"{obj.etag}"',
+                   'Last-Modified': obj.last_modified.strftime('%a, %d %b %Y %H:%M:%S GMT')}
+        if obj.cache_control:
+            headers['Cache-Control'] = obj.cache_control
+        return headers
+
+    def _list(self, bucket, query):
+        prefix = query.get('prefix', '')
+        start_after = query.get('continuation-token') or query.get('start-after', '')
+        max_keys = min(int(query.get('max-keys', MAX_KEYS)), MAX_KEYS)
+        with self.server.lock:
+            keys = sorted(k for k in self.server.bucket(bucket) if k.startswith(prefix) and k > start_after)
+            page = [(k, self.server.bucket(bucket)[k]) for k in keys[:max_keys]]
+        truncated = len(keys) > max_keys
+        items = ''.join(
+            f'<Contents><Key>{escape(k)}</Key><Size>{len(o.data)}</Size><ETag>"{o.etag}"</ETag>'
+            f'<LastModified>{o.last_modified.strftime("%Y-%m-%dT%H:%M:%S.000Z")}</LastModified>'
+            f'<StorageClass>STANDARD</StorageClass></Contents>'
+            for k, o in page
+        )
+        token = f'<NextContinuationToken>{escape(page[-1][0])}</NextContinuationToken>' if truncated else ''
+        body = (
+            f'<?xml version="1.0" encoding="UTF-8"?><ListBucketResult xmlns="{S3_NS}">'
+            f'<Name>{escape(bucket)}</Name><Prefix>{escape(prefix)}</Prefix><KeyCount>{len(page)}</KeyCount>'
+            f'<MaxKeys>{max_keys}</MaxKeys><IsTruncated>{"true" if truncated else "false"}</IsTruncated>'
+            f'{token}{items}</ListBucketResult>'
+        )
+        self._send(200, body.encode('utf-8'))
+
+    def do_PUT(self):
+        bucket, key, query = self._route()
+        data = self._read_body()
+        if 'uploadId' in query:
+            with self.server.lock:
+                upload = self.server.uploads.get(query['uploadId'])
+                if upload is None:
+                    return self._error(404, 'NoSuchUpload')
+                upload['parts'][int(query['partNumber'])] = data
+                self.server.stats['parts'] += 1
+            return self._send(200, headers={'ETag': f'"{hashlib.md5(data).hexdigest()}"'})
+        obj = StoredObject(data, hashlib.md5(data).hexdigest(), self.headers)
+        with self.server.lock:
+            self.server.bucket(bucket)[key] = obj
+            self.server.stats['puts'] += 1
+        self._send(200, headers={'ETag': f'"{obj.etag}"'})
+
+    def do_POST(self):
+        bucket, key, query = self._route()
+        body = self._read_body()
+        if 'uploads' in query:
+            upload_id = uuid.uuid4().hex
+            with self.server.lock:
+                self.server.uploads[upload_id] = {'bucket': bucket, 'key': key, 'parts': {}, 'headers': self.headers}
+            return self._send(200, (
+                f'<?xml version="1.0" encoding="UTF-8"?><InitiateMultipartUploadResult xmlns="{S3_NS}">'
+                f'<Bucket>{escape(bucket)}</Bucket><Key>{escape(key)}</Key><UploadId>{upload_id}</UploadId>'
+                f'</InitiateMultipartUploadResult>'
+            ).encode('utf-8'))
+        if 'uploadId' in query:
+            return self._complete_upload(bucket, key, query['uploadId'], body)
+        if 'delete' in query:
+            return self._delete_objects(bucket, body)
+        self._error(400, 'InvalidRequest')
+
+    def _complete_upload(self, bucket, key, upload_id, body):
+        numbers = [int(el.text) for el in ElementTree.fromstring(body).iter() if el.tag.endswith('PartNumber')]
+        with self.server.lock:
+            upload = self.server.uploads.pop(upload_id, None)
+            if upload is None or any(n not in upload['parts'] for n in numbers):
+                return self._error(400, 'InvalidPart')
+            parts = [upload['parts'][n] for n in numbers]
+            digests = b''.join(hashlib.md5(part).digest() for part in parts)
+            etag = f"{hashlib.md5(digests).hexdigest()}-{len(parts)}"
+            self.server.bucket(bucket)[key] = StoredObject(b''.join(parts), etag, upload['headers'])
+            self.server.stats['puts'] += 1
+        self._send(200, (
+            f'<?xml version="1.0" encoding="UTF-8"?><CompleteMultipartUploadResult xmlns="{S3_NS}">'
+            f'<Bucket>{escape(bucket)}</Bucket><Key>{escape(key)}</Key><ETag>"{etag}"</ETag>'
+            f'</CompleteMultipartUploadResult>'
+        ).encode('utf-8'))
+
+    def _delete_objects(self, bucket, body):
+        keys = [el.text for el in ElementTree.fromstring(body).iter() if el.tag.endswith('Key')]
+        with self.server.lock:
+            for key in keys:
+                self.server.bucket(bucket).pop(key, None)
+            self.server.stats['deletes'] += len(keys)
+        deleted = ''.join(f'<Deleted><Key>{escape(k)}</Key></Deleted>' for k in keys)
+        self._send(200, f'<?xml version="1.0" encoding="UTF-8"?><DeleteResult xmlns="{S3_NS}">{deleted}</DeleteResult>'.encode('utf-8'))
+
+    def do_DELETE(self):
+        bucket, key, query = self._route()
+        with self.server.lock:
+            if 'uploadId' in query:
+                self.server.uploads.pop(query['uploadId'], None)
+            else:
+                self.server.bucket(bucket).pop(key, None)
+                self.server.stats['deletes'] += 1
+        self._send(204)
+
+
+def start_server(host='127.0.0.1', port=0):
+    """Start a fake S3 server on a background thread. Returns the server."""
+    server = FakeS3Server((host, port))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local in-memory S3 stand-in')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9000)
+    args = parser.parse_args()
+
+    server = FakeS3Server((args.host, args.port))
+    print(f"Fake S3 serving on {server.base_url} (any bucket name, credentials not checked)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
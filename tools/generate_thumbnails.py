@@ -1,113 +1,299 @@
 #!/usr/bin/env python3
 """
 Generate thumbnail images from PDF files.
-Requires: pip install pdf2image Pillow
-Also requires poppler: brew install poppler (macOS)
+Requires: pip install Pillow
+
+Covers are pulled straight out of the PDF: our PDFs wrap each page as a JPEG,
+so the first page's image is decoded at reduced size (JPEG draft mode) instead
+of rasterizing the whole page. PDFs without an embedded JPEG cover fall back
+to pdf2image, which needs poppler (brew install poppler on macOS).
+Thumbnails are regenerated only when the PDF is newer than the thumbnail.
+
+Afterwards all thumbnails are packed into one sprite atlas (atlas.jpg plus an
+atlas.json offset map) and a tiny blurred placeholder per publication is
+embedded into publications.json, so the archive grid needs a single image
+request for its first paint.
 """
 
-import os
+import argparse
+import base64
+import hashlib
+import io
 import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 try:
-    from pdf2image import convert_from_path
-    from PIL import Image
+    from PIL import Image, ImageFilter
 except ImportError:
     print("Please install required packages:")
-    print("  pip install pdf2image Pillow")
-    print("  brew install poppler  # macOS")
+    print("  pip install Pillow")
     exit(1)
 
+from catalog import Catalog
+from himmah.config import PDF_DIR, PUBLICATIONS_JSON as DATA_FILE, THUMB_DIR
+from pdf_reader import PDFFormatError, PDFReader, image_file_bytes
+
 # Configuration
-PDF_DIR = Path(__file__).parent.parent / "pdfs"
-THUMB_DIR = Path(__file__).parent.parent / "thumbnails"
-DATA_FILE = Path(__file__).parent.parent / "data" / "publications.json"
 THUMB_WIDTH = 400  # pixels
 JPEG_QUALITY = 85
 
-def generate_thumbnails():
+# Sprite atlas cells match the 3:4 card thumbnails in index.css
+ATLAS_IMAGE = THUMB_DIR / "atlas.jpg"
+ATLAS_MAP = THUMB_DIR / "atlas.json"
+ATLAS_CELL = (240, 320)  # pixels
+ATLAS_QUALITY = 80
+
+# Inline low-quality placeholders
+PLACEHOLDER_WIDTH = 12  # pixels
+PLACEHOLDER_QUALITY = 40
+
+
+def extract_cover(pdf_path):
+    """
+    Return the first page as a PIL image decoded close to thumbnail size,
+    or None if the cover is not an embedded JPEG or fax image.
+    """
+    try:
+        with PDFReader(pdf_path) as reader:
+            first_page = next(reader.iter_pages(), None)
+            if first_page is None:
+                return None
+            image = reader.main_image(first_page)
+            image_bytes = image_file_bytes(*image, reader.resolve) if image else None
+            if image_bytes is None:
+                return None
+    except (PDFFormatError, OSError):
+        return None
+
+    img = Image.open(io.BytesIO(image_bytes))
+    # Let the JPEG decoder scale by 1/2, 1/4 or 1/8 while staying >= target size
+    target_height = max(1, int(THUMB_WIDTH * img.height / img.width))
+    img.draft('RGB', (THUMB_WIDTH, target_height))
+    img.load()
+    # Bilevel (CCITT) covers would only be resized with nearest neighbour
+    return img.convert('L') if img.mode == '1' else img
+
+
+def rasterize_cover(pdf_path):
+    """Fallback: rasterize page 1 with poppler."""
+    try:
+        from pdf2image import convert_from_path
+    except ImportError:
+        raise RuntimeError("cover is not an embedded JPEG; install pdf2image and poppler to rasterize it")
+
+    images = convert_from_path(pdf_path, first_page=1, last_page=1, dpi=72)
+    return images[0] if images else None
+
+
+def make_thumbnail(img):
+    """Resize a cover to THUMB_WIDTH, keeping the aspect ratio."""
+    # Calculate new height maintaining aspect ratio
+    aspect_ratio = img.height / img.width
+    new_height = int(THUMB_WIDTH * aspect_ratio)
+
+    # Integer reduce first, then a final LANCZOS pass to the exact size
+    factor = min(img.width // THUMB_WIDTH, img.height // max(1, new_height))
+    if factor >= 2:
+        img = img.reduce(factor)
+    img_resized = img.resize((THUMB_WIDTH, new_height), Image.Resampling.LANCZOS)
+
+    # Convert to RGB (in case of RGBA, grayscale or CMYK)
+    if img_resized.mode != 'RGB':
+        img_resized = img_resized.convert('RGB')
+    return img_resized
+
+
+def is_stale(pdf_path, thumb_path):
+    """A thumbnail needs (re)generation if it is missing or older than its PDF."""
+    try:
+        return thumb_path.stat().st_mtime < pdf_path.stat().st_mtime
+    except FileNotFoundError:
+        return True
+
+
+def generate_thumbnail(pdf_path, thumb_path):
+    """
+    Worker: build one thumbnail. Returns (pub_id, status, detail) where status is
+    'extracted', 'rasterized' or 'failed'.
+    """
+    pub_id = Path(pdf_path).stem
+    try:
+        img = extract_cover(pdf_path)
+        status = 'extracted'
+        if img is None:
+            img = rasterize_cover(pdf_path)
+            status = 'rasterized'
+        if img is None:
+            return pub_id, 'failed', 'no pages'
+
+        # Write atomically so an interrupted run never leaves a truncated thumbnail
+        tmp_path = Path(thumb_path).with_suffix('.jpg.part')
+        make_thumbnail(img).save(tmp_path, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+        os.replace(tmp_path, thumb_path)
+        return pub_id, status, f"{Path(thumb_path).stat().st_size / 1024:.1f} KB"
+    except Exception as e:
+        return pub_id, 'failed', str(e)
+
+
+def cover_crop(img, size):
+    """Scale and center-crop `img` to fill `size`, like CSS object-fit: cover."""
+    width, height = size
+    scale = max(width / img.width, height / img.height)
+    resized = img.resize((max(width, round(img.width * scale)), max(height, round(img.height * scale))),
+                         Image.Resampling.LANCZOS)
+    left = (resized.width - width) // 2
+    top = (resized.height - height) // 2
+    return resized.crop((left, top, left + width, top + height))
+
+
+def make_placeholder(img):
+    """A tiny blurred JPEG data URI that stands in for the cover until the atlas loads."""
+    height = max(1, round(PLACEHOLDER_WIDTH * img.height / img.width))
+    tiny = img.convert('RGB').resize((PLACEHOLDER_WIDTH, height), Image.Resampling.BOX)
+    tiny = tiny.filter(ImageFilter.GaussianBlur(0.6))
+    buffer = io.BytesIO()
+    tiny.save(buffer, 'JPEG', quality=PLACEHOLDER_QUALITY, optimize=True)
+    return 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def thumbnails_signature(thumb_paths):
+    """Fingerprint of the thumbnail set; the atlas is rebuilt only when it changes."""
+    h = hashlib.sha256()
+    for path in thumb_paths:
+        stat = path.stat()
+        h.update(f"{path.stem}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode('utf-8'))
+    return h.hexdigest()[:16]
+
+
+def build_atlas(force=False):
+    """
+    Pack every thumbnail into one sprite atlas and write placeholders into
+    publications.json. Returns True if anything was rebuilt.
+    """
+    thumb_paths = sorted(
+        path for path in THUMB_DIR.glob("*.jpg") if path != ATLAS_IMAGE
+    )
+    if not thumb_paths:
+        return False
+
+    signature = thumbnails_signature(thumb_paths)
+    if not force and ATLAS_MAP.exists() and ATLAS_IMAGE.exists():
+        with open(ATLAS_MAP, 'r', encoding='utf-8') as f:
+            if json.load(f).get('version') == signature:
+                print("Atlas up to date")
+                return False
+
+    cell_w, cell_h = ATLAS_CELL
+    columns = math.ceil(math.sqrt(len(thumb_paths)))
+    rows = math.ceil(len(thumb_paths) / columns)
+    atlas = Image.new('RGB', (columns * cell_w, rows * cell_h), (245, 240, 232))
+    entries = {}
+    placeholders = {}
+
+    for index, path in enumerate(thumb_paths):
+        col, row = index % columns, index // columns
+        with Image.open(path) as img:
+            img = img.convert('RGB')
+            atlas.paste(cover_crop(img, ATLAS_CELL), (col * cell_w, row * cell_h))
+            placeholders[path.stem] = make_placeholder(img)
+        entries[path.stem] = {'col': col, 'row': row}
+
+    tmp_path = ATLAS_IMAGE.with_suffix('.jpg.part')
+    atlas.save(tmp_path, 'JPEG', quality=ATLAS_QUALITY, optimize=True, progressive=True)
+    os.replace(tmp_path, ATLAS_IMAGE)
+
+    atlas_map = {
+        'version': signature,
+        'image': ATLAS_IMAGE.name,
+        'cell_width': cell_w,
+        'cell_height': cell_h,
+        'columns': columns,
+        'rows': rows,
+        'entries': entries,
+    }
+    with open(ATLAS_MAP, 'w', encoding='utf-8') as f:
+        json.dump(atlas_map, f, indent=2, sort_keys=True)
+
+    print(f"Atlas: {len(entries)} covers in {columns}x{rows} grid "
+          f"({ATLAS_IMAGE.stat().st_size / 1024:.1f} KB) -> {ATLAS_IMAGE}")
+    update_placeholders(placeholders)
+    return True
+
+
+def update_placeholders(placeholders):
+    """Record placeholders in the catalog and re-export publications.json if anything changed."""
+    catalog = Catalog(PDF_DIR / "catalog.sqlite", DATA_FILE)
+    changed = 0
+    with catalog.transaction():
+        for pub_id, placeholder in placeholders.items():
+            # Thumbnails of PDFs that are not in the catalog get no entry of their own
+            if catalog.get(pub_id):
+                changed += catalog.upsert(pub_id, placeholder=placeholder)
+    catalog.export_json()
+    print(f"Placeholders: updated {changed} entries in {DATA_FILE}")
+
+
+def generate_thumbnails(workers=None, force=False):
     """Generate thumbnails for all PDFs."""
 
     # Create thumbnails directory
     THUMB_DIR.mkdir(exist_ok=True)
 
-    # Load publications data
-    with open(DATA_FILE, 'r', encoding='utf-8') as f:
-        publications = json.load(f)
-
     # Get list of PDF files
-    pdf_files = list(PDF_DIR.glob("*.pdf"))
+    pdf_files = sorted(PDF_DIR.glob("*.pdf"))
     print(f"Found {len(pdf_files)} PDF files")
 
-    generated = 0
+    todo = []
     skipped = 0
+    for pdf_path in pdf_files:
+        thumb_path = THUMB_DIR / f"{pdf_path.stem}.jpg"
+        if force or is_stale(pdf_path, thumb_path):
+            todo.append((pdf_path, thumb_path))
+        else:
+            skipped += 1
+    print(f"  {skipped} thumbnails up to date, {len(todo)} to generate")
+
+    generated = 0
+    rasterized = 0
     failed = 0
 
-    for pdf_path in pdf_files:
-        pub_id = pdf_path.stem
-        thumb_path = THUMB_DIR / f"{pub_id}.jpg"
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for pub_id, status, detail in executor.map(generate_thumbnail, *zip(*todo)):
+                if status == 'failed':
+                    print(f"  [FAIL] {pub_id} ({detail})")
+                    failed += 1
+                else:
+                    print(f"  [GEN] {pub_id} OK ({detail}{', rasterized' if status == 'rasterized' else ''})")
+                    generated += 1
+                    rasterized += status == 'rasterized'
 
-        # Skip if thumbnail already exists
-        if thumb_path.exists():
-            print(f"  [SKIP] {pub_id} - thumbnail exists")
-            skipped += 1
-            continue
-
-        try:
-            print(f"  [GEN] {pub_id}...", end=" ", flush=True)
-
-            # Convert first page of PDF to image
-            images = convert_from_path(
-                pdf_path,
-                first_page=1,
-                last_page=1,
-                dpi=72  # Lower DPI for thumbnails
-            )
-
-            if images:
-                img = images[0]
-
-                # Calculate new height maintaining aspect ratio
-                aspect_ratio = img.height / img.width
-                new_height = int(THUMB_WIDTH * aspect_ratio)
-
-                # Resize image
-                img_resized = img.resize(
-                    (THUMB_WIDTH, new_height),
-                    Image.Resampling.LANCZOS
-                )
-
-                # Convert to RGB (in case of RGBA)
-                if img_resized.mode != 'RGB':
-                    img_resized = img_resized.convert('RGB')
-
-                # Save as JPEG
-                img_resized.save(thumb_path, 'JPEG', quality=JPEG_QUALITY, optimize=True)
-
-                file_size = thumb_path.stat().st_size / 1024
-                print(f"OK ({file_size:.1f} KB)")
-                generated += 1
-            else:
-                print("FAILED (no pages)")
-                failed += 1
-
-        except Exception as e:
-            print(f"FAILED ({e})")
-            failed += 1
-
-    print(f"\nDone! Generated: {generated}, Skipped: {skipped}, Failed: {failed}")
+    print(f"\nDone! Generated: {generated} ({rasterized} rasterized), Skipped: {skipped}, Failed: {failed}")
     print(f"Thumbnails saved to: {THUMB_DIR}")
 
     # List generated thumbnails
-    thumbs = list(THUMB_DIR.glob("*.jpg"))
+    thumbs = [t for t in THUMB_DIR.glob("*.jpg") if t != ATLAS_IMAGE]
     total_size = sum(t.stat().st_size for t in thumbs) / (1024 * 1024)
     print(f"Total thumbnails: {len(thumbs)} ({total_size:.2f} MB)")
 
+    build_atlas(force=force or generated > 0)
+
     print("\nNext steps:")
-    print("1. Upload thumbnails folder to R2:")
-    print("   npx wrangler r2 object put himmah-pdfs/thumbnails/ --file thumbnails/*.jpg")
-    print("   OR use Cloudflare Dashboard to upload the thumbnails folder")
+    print("1. Upload new and changed thumbnails (and the atlas) to R2:")
+    print("   python3 tools/r2_sync.py")
     print("2. The app will automatically use them!")
 
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description='Generate cover thumbnails for all PDFs')
+    parser.add_argument('--workers', '-w', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--force', action='store_true', help='Regenerate every thumbnail')
+    args = parser.parse_args(argv)
+    generate_thumbnails(workers=args.workers, force=args.force)
+
+
 if __name__ == "__main__":
-    generate_thumbnails()
+    main()
@@ -0,0 +1,9 @@
+"""
+Tools for the LPM HIMMAH digital archive.
+
+The tools are the scripts in tools/; this package adds the `himmah` command
+that runs them as subcommands (see himmah.cli) and the shared configuration
+(himmah.config).
+"""
+
+__version__ = '3.0.0'
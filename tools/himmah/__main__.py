@@ -0,0 +1,10 @@
+import sys
+from pathlib import Path
+
+if not __package__:
+    # Run as `python3 tools/himmah`: make the package and the tools importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from himmah.cli import main
+
+sys.exit(main())
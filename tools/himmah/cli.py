@@ -0,0 +1,79 @@
+"""
+The `himmah` command: every archive tool as a subcommand.
+
+Each subcommand is one of the tools/ scripts, which keep working on their
+own. A subcommand's module is imported only when it runs, so `himmah
+--help` and the light subcommands (list, export, sync) never load
+requests, Pillow, numpy or boto3. Paths come from himmah.config.
+
+Usage:
+  himmah download --url "https://issuu.com/lpmhimmahuii/docs/muhibbah_4_1971"
+  himmah download --all
+  himmah build --watch 900 --upload
+  himmah sync && himmah thumbs && himmah upload
+  himmah <command> --help
+"""
+
+import importlib
+import sys
+
+from himmah import __version__
+
+# name -> (module, function, summary); function(argv, prog) parses argv itself
+COMMANDS = {
+    'download': ('issuu_downloader', 'main', 'Download publications from Issuu and build PDFs'),
+    'build': ('pipeline', 'main', 'Rebuild only what changed: PDFs, thumbnails, catalog, index'),
+    'list': ('archive', 'list_command', 'List known publications with their page counts'),
+    'export': ('archive', 'export_command', 'Update the catalog and publications.json from the archive'),
+    'sync': ('sync_all_publications', 'main', 'Apply download results to publications.json'),
+    'verify': ('verify_pdfs', 'main', 'Check the PDFs against the catalog'),
+    'thumbs': ('generate_thumbnails', 'main', 'Generate cover thumbnails, the atlas and placeholders'),
+    'search-index': ('build_search_index', 'main', 'Build the sharded search index'),
+    'ocr': ('ocr_pages', 'main', 'OCR page images into text files (and text layers)'),
+    'linearize': ('linearize_pdfs', 'main', 'Linearize PDFs for fast first-page display'),
+    'recompress': ('recompress_pdfs', 'main', 'Re-encode PDF pages by content to save space'),
+    'pages': ('page_analysis', 'main', 'Report blank, duplicated and recurring pages'),
+    'upload': ('r2_sync', 'main', 'Upload new and changed files to R2'),
+    'catalog': ('catalog', 'main', 'Import, export or summarize the catalog'),
+}
+
+
+def usage():
+    width = max(map(len, COMMANDS))
+    lines = [
+        "usage: himmah <command> [options]",
+        "",
+        "Tools for the LPM HIMMAH digital archive.",
+        "",
+        "commands:",
+    ]
+    lines += [f"  {name:{width}}  {summary}" for name, (_, _, summary) in COMMANDS.items()]
+    lines += ["", "Run 'himmah <command> --help' for the options of a command."]
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ('-h', '--help'):
+        print(usage())
+        return 0 if argv else 2
+    if argv[0] == '--version':
+        print(f"himmah {__version__}")
+        return 0
+
+    name = argv[0]
+    if name not in COMMANDS:
+        import difflib
+        close = difflib.get_close_matches(name, COMMANDS, n=1)
+        hint = f" (did you mean '{close[0]}'?)" if close else ""
+        print(f"himmah: unknown command '{name}'{hint}", file=sys.stderr)
+        print("Run 'himmah --help' for the list of commands.", file=sys.stderr)
+        return 2
+
+    module_name, function, _ = COMMANDS[name]
+    command = getattr(importlib.import_module(module_name), function)
+    return command(argv[1:], prog=f"himmah {name}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""
+Paths and settings shared by all tools.
+
+Everything the tools produce lives under one project directory: pdfs/,
+thumbnails/, tiles/, text/ and data/. By default that is the checkout this
+package sits in; set HIMMAH_HOME to work on another one (an installed
+package without a checkout uses the current directory).
+"""
+
+import os
+from pathlib import Path
+
+
+def _base_dir():
+    if os.environ.get('HIMMAH_HOME'):
+        return Path(os.environ['HIMMAH_HOME']).expanduser().resolve()
+    checkout = Path(__file__).resolve().parent.parent.parent
+    if (checkout / 'tools' / 'himmah').is_dir():
+        return checkout
+    return Path.cwd()
+
+
+BASE_DIR = _base_dir()
+
+# Downloads and the stores kept next to them
+PDF_DIR = BASE_DIR / "pdfs"
+CATALOG_DB = PDF_DIR / "catalog.sqlite"
+DOWNLOAD_RESULTS = PDF_DIR / "download_results.json"
+
+# Files served by the site
+DATA_DIR = BASE_DIR / "data"
+PUBLICATIONS_JSON = DATA_DIR / "publications.json"
+SEARCH_INDEX_DIR = DATA_DIR / "search"
+THUMB_DIR = BASE_DIR / "thumbnails"
+TILES_DIR = BASE_DIR / "tiles"
+TEXT_DIR = BASE_DIR / "text"
+
+# Issuu profile whose uploads are archived
+ISSUU_USER = 'lpmhimmahuii'
+PROFILE_URL = f"https://issuu.com/{ISSUU_USER}"
+
+# R2 bucket behind the site's PDF and image URLs
+R2_BUCKET = 'himmah-pdfs'
@@ -12,82 +12,80 @@ License: MIT
 import os
 import sys
 import json
-import re
-import time
 import argparse
-from urllib.parse import urlparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 try:
     import requests
-    from PIL import Image
-    import img2pdf
 except ImportError as e:
     print(f"Missing dependency: {e}")
     print("Please run: pip install -r requirements.txt")
     sys.exit(1)
 
+from archive import Archive
+from download_queue import DONE_MAX_AGE, DownloadQueue
+from himmah.config import PDF_DIR
+from metrics import Metrics
+from page_cache import PageCache
+from pdf_writer import check_image_file, linearize_pdf, write_pdf
+from profile_crawler import PROFILE_API_BASE, CrawlError, ProfileCrawler, profile_username
+from transport import AdaptiveRateLimiter, Transport, TransportError
 
-class IssuuDownloader:
+
+class IssuuDownloader(Archive):
     """Download publications from Issuu and convert to PDF."""
     
-    # Known publication URLs from LPM HIMMAH profile
-    LPMHIMMAH_PUBLICATIONS = [
-        {"title": "Majalah MUHIBBAH No. 01/Thn. XV/1981 – Reuni NU", "url": "https://issuu.com/lpmhimmahuii/docs/majalah_muhibbah_no._1_th._ke_xv_1981_reuni_nu"},
-        {"title": "Majalah MUHIBBAH No. 02/Thn. XV/1981 – Mahasiswa Bicara Indonesia", "url": "https://issuu.com/lpmhimmahuii/docs/majalah_muhibbah_no._2_th._ke_xv_1981"},
-        {"title": "Majalah MUHIBBAH No. 04/Thn. XVI/1982 – BBM Naik", "url": "https://issuu.com/lpmhimmahuii/docs/majalah_muhibbah_no._4_th._ke_xvi_1982_bbm_naik"},
-        {"title": "Majalah MUHIBBAH No. 07/Thn. IX/1975 - Egoisme Bicara dan Kerja", "url": "https://issuu.com/lpmhimmahuii/docs/majalah_muhibbah_no._7_th._ke_ix_1974_egoisme_bi"},
-        {"title": "Majalah MUHIBBAH No. 04/Thn. V/1971 - Pembaharuan Administrasi", "url": "https://issuu.com/lpmhimmahuii/docs/muhibbah_4_1971"},
-        {"title": "Majalah HIMMAH No. 01/Thn. XXXIV/2002 - Di Bawah Bendera Globalisasi", "url": "https://issuu.com/lpmhimmahuii/docs/majalah_himmah_edisi_01xxxiv2002_-_di_bawah_bender"},
-        {"title": "Majalah HIMMAH No. 03/Thn. XXXV/2003 - Balada Utang Kita", "url": "https://issuu.com/lpmhimmahuii/docs/majalah_himmah_edisi_03_thn._xxxv_2003_-_balada_ut"},
-        {"title": "Majalah HIMMAH No. 01/Thn. XXXVII/2004 - Air Mengalir Makin Menjauh", "url": "https://issuu.com/lpmhimmahuii/docs/majalah_himmah_edisi_01_thn._xxxvii_2004_-_air_men"},
-        {"title": "Majalah HIMMAH No. 02/Thn. XLVI/2013 - Mega Proyek Terlantar", "url": "https://issuu.com/lpmhimmahuii/docs/majalah_himmah_edisi_02_thn._xlvi_2013_-_mega_proy"},
-        {"title": "Majalah HIMMAH No. 02/Thn. XXXIV/2002 - Antara Kuasa dan Kemuliaan", "url": "https://issuu.com/lpmhimmahuii/docs/majalah_himmah_edisi_02_thn._xxxiv_2002_-_antara_k"},
-        {"title": "Majalah HIMMAH No. 02/Thn. XXXVII/2005 - Jagad Mal Jogja", "url": "https://issuu.com/lpmhimmahuii/docs/jagad_maal"},
-        {"title": "Buletin KOBARKobari Edisi PEKTA/XV/September 2014 - Imbas Regulasi Dikti", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_pekta_tahun_ke-15_september_2014_-_imbas_r"},
-        {"title": "Buletin KOBARKobari Edisi PESTA/XV/September 2014 - Berjejalan di Kampus Perjuangan", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_pesta_tahun_ke-15_september_2014_-_berjeja"},
-        {"title": "Buletin KOBARKobari Edisi 137/XII/Agustus 2009 - Pintar pun Bergulir", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_137_tahun_ke-12_agustus_2009_-_pintar_pu"},
-        {"title": "Buletin KOBARKobari Edisi 145/XIII/Oktober 2010 - Ketika Pers Mahasiswa Tidak Lagi Bebas", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_145_tahun_ke-13_oktober_2010_-_ketika_pe"},
-        {"title": "Buletin KOBARKobari Edisi 147/XIV/Januari 2011 - Terlalu Banyak Jadi Tidak Maksimal", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_146_tahun_ke-14_januari_2011_-_terlalu_b"},
-        {"title": "Buletin KOBARKobari Edisi 134/XII/Februari 2009 - PESTA yang Belum Usai", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_134_tahun_ke-12_februari_2009_-_pesta_"},
-        {"title": "Buletin KOBARKobari Edisi 153/XIV/November 2011 - Janji DPM yang Dinantikan", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_153_tahun_ke-14_november_2011_-_janji_dp"},
-        {"title": "Buletin KOBARKobari Edisi 152/XIV/Oktober 2011 - Kerjasama di Balik Atribut Pesta", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_152_tahun_ke-14_oktober_2011_-_kerjasama"},
-        {"title": "Buletin KOBARKobari Edisi 141/XIII/April 2010 - ISO: Antara Gengsi dan Prestasi", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_141_tahun_ke-13_april_2010_-_iso_antara"},
-        {"title": "Buletin KOBARKobari Edisi 148/XIV/Maret 2011 - Balada Arif Johar", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_148_tahun_ke-14_maret_2011_-_balada_arif"},
-        {"title": "Buletin KOBARKobari Edisi 135/XII/Juli 2009 - Melirik Dana Hibah Penelitian", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_135_tahun_ke-12_juli_2009_-_melirik_dana"},
-        {"title": "Buletin KOBARKobari Edisi 154/XIV/Desember 2011 - Terkatung-katungnya Penjual Kantin Psikologi", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_154_tahun_ke-14_desember_2011-_terkatung"},
-        {"title": "Buletin KOBARKobari Edisi 144/XIII/Agustus 2010 - Aksi Sosial dan Demonstrasi Mewarnai Pesta 2010", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_144_tahun_ke-13_agustus_2010_-_aksi_sosi"},
-        {"title": "Buletin KOBARKobari Edisi 149/XIV/Mei 2011 - Lunaskah Hutang Kita", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_149_tahun_ke-14_mei_2011_-_lunaskah_huta"},
-        {"title": "Buletin KOBARKobari Edisi PESTA/XV/Agustus 2012 - PESTA (Masih) Dihiasi Masalah", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_pesta_tahun_ke-15_agustus_2012_-_pesta_"},
-        {"title": "Buletin KOBARKobari Edisi 147/XIV/Februari 2011 - Menunggu Asa dari Prabuningrat", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_147_tahun_ke-14_februari_2011_-_menunggu"},
-        {"title": "Buletin KOBARKobari Edisi Khusus/XIV/Juni 2012 - Gugatan KM UII", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_khusus_tahun_ke-14_juni_2012_-_gugatan_k"},
-        {"title": "Buletin KOBARKobari Edisi 140/XIII/Januari 2010 - Pemilwa Sepi Pemilih", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_140_tahun_ke-13_januari_2010_-_pemilwa_s"},
-        {"title": "Buletin KOBARKobari Edisi PEKTA/XVI/September 2013 - Organ Ekstra dan Intra Berkolega", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_pekta_tahun_ke-16_september_2013_-_organ"},
-        {"title": "Buletin KOBARKobari Edisi PESTA/XIX/Agustus 2017 - Langkah Awal Menata Kepekaan Sosial", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_pesta_tahun_ke-19_agustus_2017_-_menata_ke"},
-        {"title": "Buletin KOBARKobari Edisi 133/XI/Desember 2008 - Jalan Terjal Menuju Kampus Riset", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_133_tahun_ke-11_desember_2008_-_jalan_te"},
-        {"title": "Buletin KOBARKobari Edisi 136/XII/Agustus 2009 - Dampak Mundurnya Pemilwa", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_136_tahun_ke-12_agustus_2009_-_dampak_mu"},
-        {"title": "Buletin KOBARKobari Edisi PESTA/XIV/Agustus 2011 - Pesta di Bulan Suci", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_pesta_tahun_ke-14_agustus_2011_-_pesta_d"},
-        {"title": "Buletin KOBARKobari Edisi PEKTA/XV/September 2012 - Baku Hantam Menyisakan Luka", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_pekta_tahun_ke-15_september_2012_-_baku_"},
-        {"title": "Buletin KOBARKobari Edisi PESTA/XVIII/Agustus 2016 - Kenaikan Biaya Kuliah 10% Dianggap Kurang", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_pesta_tahun_ke-18_agustus_2016_-_kenaikan_"},
-        {"title": "Buletin KOBARKobari Edisi 160/XIV/November 2012 - Di Balik Jadwal Kuliah Farmasi", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_160_tahun_ke-14_november_2012_-_di_balik"},
-        {"title": "Buletin KOBARKobari Edisi 157/XIV/Mei 2012 - Rapor Merah DPM U", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_157_tahun_ke-14_mei_2012_-_rapor_merah_d"},
-        {"title": "Buletin KOBARKobari Edisi 162/XV/Februari 2013 - Ambisi Jurnal Bersambut Aral", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_162_tahun_ke-15_februari_2013_-_ambisi_j"},
-        {"title": "Buletin KOBARKobari Edisi 164/XV/Mei 2013 - Bakal Caleg Berguguran di Tangan KPU", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_164_tahun_ke-15_mei_2013_-_bakal_caleg_b"},
-        {"title": "Buletin KOBARKobari Edisi 159/XIV/Oktober 2012 - Beda Janji, Beda Realisasi", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_159_tahun_ke-14_oktober_2012_-_beda_janj"},
-        {"title": "Buletin KOBARKobari Edisi 166/XV/November 2013 - FE dan FH Bakal Pindah", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_166_tahun_ke-15_november_2013_-_fe_dan_f"},
-        {"title": "Buletin KOBARKobari Edisi 163/XV/Maret 2013 - Pesantrenisasi UII", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_163_tahun_ke-15_maret_2013_-_pesantrenis"},
-        {"title": "Buletin KOBARKobari Edisi 168/XV/Januari 2014 - Silang Pendapat Informasi SPP", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_168_tahun_ke-15_januari_2014_-_silang_pe"},
-        {"title": "Buletin KOBARKobari Edisi 183/XIX/Maret 2017 - Kronik TGC-37", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_183_tahun_ke-19_maret_2017_-_kronik_tgc-37"},
-        {"title": "Buletin KOBARKobari Edisi 184/XIX/Juni 2017 - Terkekang Izin Perkuliahan", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_184_tahun_ke-19_juni_2017_-_terkekang_izin"},
-        {"title": "Buletin KOBARKobari Edisi 167/XV/Januari 2014 - Keamanan Ulil Albab Dipertanyakan", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_167_tahun_ke-15_januari_2014_-_keamanan_"},
-        {"title": "Buletin KOBARKobari Edisi 180/XVII/Mei 2016 - Peringkat Anjlok, UII Jalankan Strategi Baru", "url": "https://issuu.com/lpmhimmahuii/docs/edisi_180_tahun_ke-15_mei_2016_-_peringkat_anjlo"},
-    ]
+    # Issuu reader3 API serving document metadata
+    READER_API_BASE = "https://reader3.isu.pub"
     
-    def __init__(self, output_dir="pdfs", verbose=True):
-        self.output_dir = Path(output_dir)
-        self.output_dir.mkdir(parents=True, exist_ok=True)
-        self.verbose = verbose
+    def __init__(self, output_dir=PDF_DIR, verbose=True, page_workers=4, requests_per_second=4.0,
+                 max_connections=8, bandwidth=0, cache_dir=None, cache_size=2 * 1024 ** 3,
+                 max_requests_per_second=16.0, retries=4, metrics=None, api_base=None, linearize=False,
+                 recompress=False, profile_api_base=None, analyze_pages=True, drop_blank=False,
+                 drop_duplicates=False):
+        super().__init__(output_dir, verbose)
+        self.api_base = (api_base or self.READER_API_BASE).rstrip('/')
+        self.profile_api_base = (profile_api_base or PROFILE_API_BASE).rstrip('/')
+        self.page_workers = max(1, page_workers)
+        self.max_connections = max(1, max_connections)
+        # Write "fast web view" PDFs that PDF.js can open from range requests
+        self.linearize = linearize
+        # Re-encode gray/black-and-white scans as gray JPEG / CCITT G4 pages
+        self.recompress = recompress
+        # Blank and repeated pages are flagged before assembly (when numpy is
+        # installed) and only left out of the PDF when asked to
+        self.drop_blank = drop_blank
+        self.drop_duplicates = drop_duplicates
+        self.page_analysis = None
+        if analyze_pages or drop_blank or drop_duplicates:
+            try:
+                from page_analysis import PageAnalysis
+                self.page_analysis = PageAnalysis(self.output_dir / '.page_analysis.sqlite')
+            except ImportError:
+                if drop_blank or drop_duplicates:
+                    raise
+        # Downloaded pages persist here across runs, stored once per content (default: <output>/.page_cache)
+        self.page_cache = PageCache(cache_dir or self.output_dir / '.page_cache', max_bytes=cache_size)
+        # Timing/throughput recorder; a disabled Metrics() is a no-op
+        self.metrics = metrics or Metrics()
+        # Page numbers that could not be fetched, per doc_slug
+        self.missing_pages = {}
         self.session = requests.Session()
+        # Retries, AIMD rate control and the global connection/bandwidth budget
+        self.transport = Transport(
+            self.session,
+            max_connections=self.max_connections,
+            rate_limiter=AdaptiveRateLimiter(
+                initial_rate=requests_per_second,
+                max_rate=max_requests_per_second
+            ),
+            bandwidth=bandwidth,
+            retries=retries,
+            on_log=self.log
+        )
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Accept': 'application/json, text/plain, */*',
@@ -95,74 +93,176 @@ class IssuuDownloader:
             'Referer': 'https://issuu.com/'
         })
     
-    def log(self, message, end='\n'):
-        """Print message if verbose mode is enabled."""
-        if self.verbose:
-            print(message, end=end, flush=True)
-    
-    def get_publication_list(self, profile_url=None):
-        """Get all publication URLs from LPM HIMMAH profile."""
-        return self.LPMHIMMAH_PUBLICATIONS
-    
-    def parse_issuu_url(self, publication_url):
+    def discover_publications(self, profile_url=None, full=False):
         """
-        Parse Issuu URL to extract username and document slug.
-        URL format: https://issuu.com/username/docs/document_slug
+        Crawl the profile listing for new uploads (incrementally unless `full`).
+        Returns the newly discovered publications as {'title', 'url'} dicts.
         """
-        url_parts = urlparse(publication_url)
-        path_parts = url_parts.path.strip('/').split('/')
-        
-        if len(path_parts) >= 3 and path_parts[1] == 'docs':
-            return {
-                'username': path_parts[0],
-                'doc_slug': path_parts[2]
-            }
-        return None
+        username = profile_username(profile_url or self.PROFILE_URL)
+        crawler = ProfileCrawler(self.transport, self.publication_index, api_base=self.profile_api_base,
+                                 concurrency=self.page_workers, log=self.log)
+        result = crawler.crawl(username, full=full)
+        return [
+            {'title': doc['title'], 'url': f"https://issuu.com/{username}/docs/{doc['doc_slug']}"}
+            for doc in result['new']
+        ]
     
     def get_reader_data(self, username, doc_slug):
         """
         Fetch document data from Issuu reader3 API.
         Returns document info including page image URLs.
         """
-        api_url = f"https://reader3.isu.pub/{username}/{doc_slug}/reader3_4.json"
+        doc_data, _ = self.fetch_reader_data(username, doc_slug)
+        return doc_data
+    
+    def fetch_reader_data(self, username, doc_slug):
+        """
+        Fetch document data, revalidating the cached copy with a conditional request.
+        Returns (document, unchanged) where `unchanged` is True if the server
+        answered 304 Not Modified. Falls back to the cached copy on errors.
+        """
+        api_url = f"{self.api_base}/{username}/{doc_slug}/reader3_4.json"
+        cached = self.metadata_cache.get(username, doc_slug)
+        headers = self.metadata_cache.conditional_headers(username, doc_slug) if cached else {}
         
         try:
             self.log(f"  Fetching: {api_url}")
-            response = self.session.get(api_url, timeout=30)
+            response = self.transport.get(api_url, ok_statuses=(200, 304), headers=headers, timeout=30)
             
+            if response.status_code == 304 and cached:
+                self.metadata_cache.touch(username, doc_slug)
+                return cached, True
             if response.status_code == 200:
                 data = response.json()
                 if data.get('status') == 0 and 'document' in data:
-                    return data['document']
+                    document = data['document']
+                    if cached is not None and cached != document:
+                        # Re-uploaded document: cached pages belong to the old version
+                        self.log("  Document changed since last run")
+                        self.page_cache.invalidate(username, doc_slug)
+                    self.metadata_cache.store(
+                        username, doc_slug, document,
+                        etag=response.headers.get('ETag'),
+                        last_modified=response.headers.get('Last-Modified')
+                    )
+                    return document, cached == document
             else:
                 self.log(f"  API returned status: {response.status_code}")
         except Exception as e:
             self.log(f"  API error: {e}")
         
-        return None
+        if cached:
+            self.log("  Using cached document data")
+        return cached, False
     
-    def download_page_image(self, image_uri, page_num, temp_dir):
-        """Download a single page image."""
+    def download_page_image(self, image_uri, page_num, username, doc_slug):
+        """
+        Download a single page image into the page cache.
+        The body is streamed to a temporary file and hashed on the way, so memory
+        stays constant per page; it must match Content-Length (truncated transfers
+        are resumed) and be a complete image before the cache accepts it.
+        """
         # Add https:// if missing
         if not image_uri.startswith('http'):
             image_uri = f"https://{image_uri}"
         
-        try:
-            response = self.session.get(image_uri, timeout=60)
-            if response.status_code == 200 and len(response.content) > 1000:
-                image_path = temp_dir / f"page_{page_num:04d}.jpg"
-                with open(image_path, 'wb') as f:
-                    f.write(response.content)
-                return image_path
-        except requests.RequestException as e:
-            self.log(f"\n  Error downloading page {page_num}: {e}")
-        
+        part_path = self.page_cache.partial_path(username, doc_slug, page_num)
+        # A page that arrives complete but broken gets one fresh attempt
+        for attempt in range(2):
+            start = time.monotonic()
+            try:
+                result = self.transport.download(image_uri, part_path, timeout=60)
+            except TransportError as e:
+                part_path.unlink(missing_ok=True)
+                self.metrics.page(doc_slug, page_num, time.monotonic() - start - e.wait_seconds, 0,
+                                  retries=e.retries, wait=e.wait_seconds, ok=False)
+                self.log(f"\n  Error downloading page {page_num}: {e}")
+                return None
+            
+            problem = f"HTTP {result['status']}" if result['status'] != 200 else check_image_file(part_path)
+            self.metrics.page(doc_slug, page_num, time.monotonic() - start - result['wait_seconds'],
+                              result['size'], retries=result['retries'],
+                              wait=result['wait_seconds'], ok=problem is None)
+            if problem is None:
+                if result['resumes']:
+                    self.log(f"\n  Page {page_num}: resumed {result['resumes']}x after truncated transfers")
+                return self.page_cache.put_file(username, doc_slug, page_num, part_path,
+                                                result['size'], result['sha256'])
+            
+            part_path.unlink(missing_ok=True)
+            self.log(f"\n  Page {page_num}: {problem}, {result['size']} bytes")
+            if result['status'] != 200:
+                break
         return None
     
-    def download_publication(self, publication_url, output_filename=None):
+    def download_pages(self, pages, username, doc_slug):
+        """
+        Download page images with a bounded worker pool.
+        Pages already in the cache are reused, only missing ones are fetched.
+        Returns (page image paths in page order, page numbers that failed).
+        """
+        results = {}
+        to_fetch = []
+        missing = []
+        
+        for i, page in enumerate(pages, 1):
+            cached = self.page_cache.get(username, doc_slug, i)
+            if cached:
+                results[i] = cached
+                continue
+            image_uri = page.get('imageUri')
+            if not image_uri:
+                self.log(f"\n  Page {i} has no image URI, skipping")
+                missing.append(i)
+                continue
+            to_fetch.append((i, image_uri))
+        
+        if results:
+            self.log(f"  {len(results)} pages already cached")
+        
+        completed = 0
+        with ThreadPoolExecutor(max_workers=self.page_workers) as executor:
+            futures = {
+                executor.submit(self.download_page_image, image_uri, i, username, doc_slug): i
+                for i, image_uri in to_fetch
+            }
+            
+            for future in as_completed(futures):
+                completed += 1
+                self.log(f"\r  Downloading page {completed}/{len(to_fetch)}...", end='')
+                image_path = future.result()
+                if image_path:
+                    results[futures[future]] = image_path
+                else:
+                    missing.append(futures[future])
+        
+        if to_fetch:
+            self.log('')  # New line
+        return [results[i] for i in sorted(results)], sorted(missing)
+    
+    def download_publication(self, publication_url, output_filename=None, force=False, title=None):
         """
         Download a complete publication and save as PDF.
+        Skips the publication if its PDF is already complete, unless `force` is set.
+        The PDF's page count and size are recorded in the catalog (with `title` if given).
         """
+        start = time.monotonic()
+        pdf_path = self._download_publication(publication_url, output_filename, force, title)
+        
+        if self.metrics.enabled:
+            url_info = self.parse_issuu_url(publication_url) or {'username': '', 'doc_slug': publication_url}
+            if not pdf_path:
+                status = 'failed'
+            elif self.missing_pages.get(url_info['doc_slug']):
+                status = 'incomplete'
+            else:
+                status = 'ok'
+            pages = self.metadata_cache.page_count(url_info['username'], url_info['doc_slug']) or 0
+            self.metrics.publication(url_info['doc_slug'], time.monotonic() - start, pages, status)
+        
+        return pdf_path
+    
+    def _download_publication(self, publication_url, output_filename, force, title=None):
         # Parse URL
         url_info = self.parse_issuu_url(publication_url)
         if not url_info:
@@ -175,71 +275,77 @@ class IssuuDownloader:
         self.log(f"\nDownloading: {doc_slug}")
         self.log(f"URL: {publication_url}")
         
-        # Fetch document data from reader API
-        doc_data = self.get_reader_data(username, doc_slug)
+        # Fetch document data from reader API (revalidated against the metadata cache)
+        with self.metrics.stage(doc_slug, 'metadata'):
+            doc_data, unchanged = self.fetch_reader_data(username, doc_slug)
         
         if not doc_data or 'pages' not in doc_data:
             self.log("  Could not fetch document data from API")
             return None
         
         pages = doc_data['pages']
-        self.log(f"  Found {len(pages)} pages")
-        
-        # Create temporary directory
-        temp_dir = self.output_dir / f"temp_{doc_slug}"
-        temp_dir.mkdir(exist_ok=True)
+        self.log(f"  Found {len(pages)} pages" + (" (unchanged)" if unchanged else ""))
         
-        # Download all pages
-        downloaded_pages = []
-        for i, page in enumerate(pages, 1):
-            image_uri = page.get('imageUri')
-            if not image_uri:
-                self.log(f"\n  Page {i} has no image URI, skipping")
-                continue
-            
-            self.log(f"\r  Downloading page {i}/{len(pages)}...", end='')
-            image_path = self.download_page_image(image_uri, i, temp_dir)
-            
-            if image_path:
-                downloaded_pages.append(image_path)
-            
-            time.sleep(0.3)  # Be polite to the server
+        pdf_path = self.output_dir / (output_filename or self.pdf_filename(doc_slug))
+        if not force and self.page_cache.is_output_complete(username, doc_slug, pdf_path, len(pages),
+                                                            self.output_options()):
+            self.log(f"  ✓ Up to date: {pdf_path}")
+        else:
+            with self.page_cache.pinned(username, doc_slug):
+                pdf_path = self._build_publication(username, doc_slug, pages, pdf_path)
+            self.page_cache.evict()
         
-        self.log('')  # New line
+        if pdf_path:
+            dropped = self.page_analysis.dropped_count(username, doc_slug) if self.page_analysis else 0
+            self.catalog.record_pdf(doc_slug, pdf_path, pages=len(pages) - dropped, title=title,
+                                    issuu_url=publication_url)
+        return pdf_path
+    
+    def _build_publication(self, username, doc_slug, pages, pdf_path):
+        """Fetch missing pages into the cache and assemble the PDF."""
+        # Download all pages concurrently; the rate limiter keeps us polite
+        with self.metrics.stage(doc_slug, 'download'):
+            downloaded_pages, missing = self.download_pages(pages, username, doc_slug)
+        if missing:
+            self.missing_pages[doc_slug] = missing
+            self.log(f"  ⚠ {len(missing)} pages failed: {', '.join(map(str, missing))}")
+        else:
+            self.missing_pages.pop(doc_slug, None)
         
         if not downloaded_pages:
             self.log("  No pages could be downloaded")
-            import shutil
-            shutil.rmtree(temp_dir, ignore_errors=True)
             return None
         
-        self.log(f"  Downloaded {len(downloaded_pages)} pages")
+        self.log(f"  Have {len(downloaded_pages)}/{len(pages)} pages")
         
-        # Create PDF
-        if not output_filename:
-            safe_slug = re.sub(r'[<>:"/\\|?*]', '_', doc_slug)
-            output_filename = f"{safe_slug[:100]}.pdf"
+        if self.page_analysis:
+            failed = set(missing)
+            numbers = [i for i in range(1, len(pages) + 1) if i not in failed]
+            with self.metrics.stage(doc_slug, 'analyze'):
+                downloaded_pages = self.analyze_pages(username, doc_slug, list(zip(numbers, downloaded_pages)))
         
-        pdf_path = self.output_dir / output_filename
+        # Create PDF
         self.log(f"  Creating PDF: {pdf_path}")
         
         try:
-            downloaded_pages.sort()
+            # Stream pages from the page store into the PDF; JPEGs are embedded without re-encoding
+            with self.metrics.stage(doc_slug, 'pdf'):
+                converted = write_pdf(downloaded_pages, pdf_path)
+            if converted:
+                self.log(f"  Converted {converted} pages that could not be embedded as-is")
+            if self.recompress:
+                from recompress_pdfs import recompress_pdf
+                with self.metrics.stage(doc_slug, 'recompress'):
+                    result = recompress_pdf(pdf_path)
+                self.log(f"  Recompressed: {result['before'] / 1024:.0f} KB -> {result['after'] / 1024:.0f} KB")
+            if self.linearize:
+                with self.metrics.stage(doc_slug, 'linearize'):
+                    linearize_pdf(pdf_path)
             
-            # Convert to RGB JPEGs for PDF
-            image_list = []
-            for img_path in downloaded_pages:
-                img = Image.open(img_path)
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                rgb_path = img_path.with_suffix('.rgb.jpg')
-                img.save(rgb_path, 'JPEG', quality=95)
-                image_list.append(str(rgb_path))
-                img.close()
-            
-            # Create PDF
-            with open(pdf_path, 'wb') as f:
-                f.write(img2pdf.convert(image_list))
+            digest = self.page_cache.page_set_digest(username, doc_slug, len(pages))
+            if digest:
+                self.page_cache.record_output(username, doc_slug, pdf_path, len(pages), digest,
+                                              self.output_options())
             
             self.log("  ✓ PDF created successfully!")
             
@@ -247,107 +353,188 @@ class IssuuDownloader:
             self.log(f"  Error creating PDF: {e}")
             pdf_path = None
         
-        # Cleanup
-        import shutil
-        shutil.rmtree(temp_dir, ignore_errors=True)
-        
         return pdf_path
     
-    def download_all(self, profile_url=None):
-        """Download all publications from LPM HIMMAH."""
-        publications = self.get_publication_list(profile_url)
+    def output_options(self):
+        """
+        Options that change which pages go into a PDF; a PDF built with other
+        options is rebuilt rather than skipped as up to date.
+        """
+        if not self.page_analysis:
+            return ''
+        return ','.join(name for name, enabled in (('drop-blank', self.drop_blank),
+                                                   ('drop-duplicates', self.drop_duplicates)) if enabled)
+    
+    def analyze_pages(self, username, doc_slug, pages):
+        """
+        Flag blank and repeated pages (see page_analysis.py) among (page number, path)
+        pairs. Returns the paths of the pages that go into the PDF.
+        """
+        from page_analysis import analyze_pages, pages_to_drop, summarize
+        
+        try:
+            results = analyze_pages(pages, workers=self.page_workers)
+        except Exception as e:
+            self.log(f"  Page analysis failed, keeping every page: {e}")
+            return [path for _, path in pages]
+        
+        drop = pages_to_drop(results, self.drop_blank, self.drop_duplicates)
+        self.page_analysis.record(username, doc_slug, results, drop)
+        found = summarize(results)
+        if found:
+            left_out = f" (left out: {', '.join(map(str, sorted(drop)))})" if drop else ""
+            self.log(f"  Pages: {found}{left_out}")
+        return [path for page, path in pages if page not in drop]
+    
+    def download_all(self, profile_url=None, jobs=2, fresh=False, force=False, publications=None):
+        """
+        Download all publications from LPM HIMMAH (or the given `publications`).
+        Runs `jobs` publications at once. Job state is kept in a SQLite queue
+        next to the PDFs, so an interrupted run resumes where it stopped.
+        """
+        if publications is None:
+            try:
+                self.discover_publications(profile_url)
+            except CrawlError as e:
+                self.log(f"Profile crawl failed, using the last known list: {e}")
+            publications = self.get_publication_list(profile_url)
         
         self.log(f"Found {len(publications)} publications")
         
-        downloaded = []
-        failed = []
+        queue = DownloadQueue(self.output_dir / 'download_queue.sqlite')
+        if fresh:
+            queue.reset()
+        queue.enqueue(publications)
+        requeued = queue.requeue()
+        if requeued:
+            self.log(f"Resuming: {requeued} interrupted or failed publications requeued")
+        # Unchanged publications cost one conditional metadata request and are not rebuilt
+        expired = queue.expire()
+        if expired:
+            self.log(f"Checking {expired} publications downloaded more than {DONE_MAX_AGE // 86400} days ago for changes")
         
-        for i, pub in enumerate(publications, 1):
-            self.log(f"\n{'='*60}")
-            self.log(f"[{i}/{len(publications)}] {pub['title']}")
-            self.log('='*60)
-            
-            pdf_path = self.download_publication(pub['url'])
-            
-            if pdf_path:
-                downloaded.append({'title': pub['title'], 'path': str(pdf_path)})
-            else:
-                failed.append(pub)
-            
-            time.sleep(2)
+        counts = queue.counts()
+        total = sum(counts.values())
+        self.log(f"Already done: {counts.get('done', 0)}, to download: {counts.get('pending', 0)}")
+        
+        results_path = self.output_dir / 'download_results.json'
+        results_lock = threading.Lock()
+        
+        def write_results():
+            # Rewrite atomically after every job so a crash never loses finished work
+            with results_lock:
+                results = queue.results()
+                for item in results['downloaded']:
+                    item.update(self.parse_issuu_url(item['url']) or {})
+                tmp_path = results_path.with_suffix('.json.tmp')
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(results, f, indent=2, ensure_ascii=False)
+                os.replace(tmp_path, results_path)
+        
+        def worker():
+            while True:
+                job = queue.claim()
+                if not job:
+                    return
+                self.log(f"\n{'='*60}")
+                self.log(f"{job['title']}")
+                self.log('='*60)
+                
+                try:
+                    pdf_path = self.download_publication(job['url'], force=force, title=job['title'])
+                except Exception as e:
+                    self.log(f"  Unexpected error: {e}")
+                    queue.fail(job['url'], str(e))
+                else:
+                    if pdf_path:
+                        url_info = self.parse_issuu_url(job['url'])
+                        missing = self.missing_pages.get(url_info['doc_slug'])
+                        queue.complete(job['url'], pdf_path, missing)
+                    else:
+                        queue.fail(job['url'], 'download failed')
+                write_results()
+        
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+                for future in [executor.submit(worker) for _ in range(max(1, jobs))]:
+                    future.result()
+        finally:
+            write_results()
+            results = queue.results()
+            queue.close()
+        
+        downloaded = results['downloaded']
+        failed = results['failed']
         
         # Summary
         self.log(f"\n{'='*60}")
         self.log("DOWNLOAD COMPLETE")
         self.log('='*60)
-        self.log(f"Successfully downloaded: {len(downloaded)}")
+        self.log(f"Successfully downloaded: {len(downloaded)}/{total}")
         self.log(f"Failed: {len(failed)}")
         
         if failed:
-            self.log("\nFailed publications:")
+            self.log("\nFailed publications (rerun --all to retry):")
             for pub in failed:
                 self.log(f"  - {pub['title']}")
         
-        # Export results
-        results_path = self.output_dir / 'download_results.json'
-        with open(results_path, 'w', encoding='utf-8') as f:
-            json.dump({'downloaded': downloaded, 'failed': failed}, f, indent=2, ensure_ascii=False)
+        incomplete = [pub for pub in downloaded if pub.get('missing_pages')]
+        if incomplete:
+            self.log("\nIncomplete publications (rerun --all to fetch missing pages):")
+            for pub in incomplete:
+                self.log(f"  - {pub['title']}: pages {', '.join(map(str, pub['missing_pages']))}")
         
         return downloaded
     
-    def export_for_website(self):
+    def export_page_tiles(self, publication_urls=None, tiles_dir=None, workers=None):
         """
-        Export publication data as JSON for the website.
-        Maps downloaded PDFs to publication metadata.
+        Export every page as size-capped progressive JPEGs in a few widths plus
+        a manifest per publication, for lazy page loading on the website.
+        Pages come from the page store; only pages that were evicted are fetched again.
         """
-        publications = []
+        from page_tiles import TILE_SIZES, export_tiles
         
-        for pub in self.LPMHIMMAH_PUBLICATIONS:
-            url_info = self.parse_issuu_url(pub['url'])
+        tiles_dir = Path(tiles_dir) if tiles_dir else self.output_dir.parent / 'tiles'
+        if publication_urls is None:
+            publication_urls = [pub['url'] for pub in self.get_publication_list()]
+        
+        exported = {}
+        for url in publication_urls:
+            url_info = self.parse_issuu_url(url)
             if not url_info:
                 continue
+            username, doc_slug = url_info['username'], url_info['doc_slug']
+            self.log(f"\nTiles: {doc_slug}")
             
-            doc_slug = url_info['doc_slug']
-            safe_slug = re.sub(r'[<>:"/\\|?*]', '_', doc_slug)
-            pdf_filename = f"{safe_slug[:100]}.pdf"
-            pdf_path = self.output_dir / pdf_filename
-            
-            # Determine category
-            title_lower = pub['title'].lower()
-            if 'muhibbah' in title_lower and 'kobarkobari' not in title_lower:
-                category = 'muhibbah'
-            elif 'himmah' in title_lower and 'kobarkobari' not in title_lower:
-                category = 'himmah'
-            elif 'kobarkobari' in title_lower or 'kobar' in title_lower:
-                category = 'kobarkobari'
-            else:
-                category = 'other'
+            # Prefer the cached document so exporting works offline
+            doc_data = self.metadata_cache.get(username, doc_slug) or self.get_reader_data(username, doc_slug)
+            pages = (doc_data or {}).get('pages')
+            if not pages:
+                self.log("  No page data, skipping")
+                continue
             
-            # Extract year from title
-            year_match = re.search(r'/(\d{4})', pub['title'])
-            year = int(year_match.group(1)) if year_match else 2000
+            with self.page_cache.pinned(username, doc_slug):
+                page_paths, missing = self.download_pages(pages, username, doc_slug)
+                if missing:
+                    self.log(f"  ⚠ Skipping: {len(missing)} pages unavailable")
+                    continue
+                manifest, rendered = export_tiles(doc_slug, page_paths, tiles_dir / doc_slug, workers=workers,
+                                                  hashes=[self.page_cache.digest(path) for path in page_paths])
             
-            publications.append({
-                'id': doc_slug,
-                'title': pub['title'],
-                'category': category,
-                'year': year,
-                'issuu_url': pub['url'],
-                'pdf_file': f"./pdfs/{pdf_filename}" if pdf_path.exists() else None
-            })
-        
-        output_path = self.output_dir.parent / 'data' / 'publications.json'
-        output_path.parent.mkdir(exist_ok=True)
-        
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(publications, f, indent=2, ensure_ascii=False)
-        
-        self.log(f"Exported {len(publications)} publications to {output_path}")
-        return output_path
+            sizes = ', '.join(
+                f"{width}px {manifest['total_bytes'][str(width)] / (1024 * 1024):.1f} MB" for width in sorted(TILE_SIZES)
+            )
+            self.log(f"  ✓ {manifest['page_count']} pages ({rendered} rendered): {sizes}")
+            exported[doc_slug] = tiles_dir / doc_slug / 'manifest.json'
+        
+        self.page_cache.evict()
+        self.log(f"\nExported tiles for {len(exported)} publications to {tiles_dir}")
+        return exported
 
 
-def main():
+def main(argv=None, prog=None):
     parser = argparse.ArgumentParser(
+        prog=prog,
         description='Download Issuu publications from LPM HIMMAH and convert to PDF',
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog="""
@@ -358,60 +545,184 @@ Examples:
   # List all known publications
   python issuu_downloader.py --list
   
+  # Look for new uploads on the Issuu profile (one request if nothing changed)
+  python issuu_downloader.py --discover
+  
   # Download ALL publications (this takes a while!)
+  # Interrupted runs resume where they stopped; use --fresh to start over
   python issuu_downloader.py --all
   
+  # Download 3 publications at once, capped at 2 MB/s overall
+  python issuu_downloader.py --all --jobs 3 --bandwidth 2048
+  
+  # Fetch 8 pages at a time, at most 6 requests/second per host
+  python issuu_downloader.py --url "..." --page-workers 8 --rate 6
+  
   # Export publication list for website
   python issuu_downloader.py --export
+  
+  # Export every page as lazy-loadable images with a manifest (into ../tiles)
+  python issuu_downloader.py --tiles
+  
+  # Record per-page/per-stage timings and print a throughput summary
+  python issuu_downloader.py --all --metrics metrics.jsonl
+  
+  # Write linearized PDFs so the website can show page 1 before the download finishes
+  python issuu_downloader.py --all --linearize
+  
+  # Store grayscale / black-and-white scans as gray JPEG / CCITT G4 pages
+  python issuu_downloader.py --all --recompress
+  
+  # Leave blank scanner pages and pages that appear twice out of the PDFs
+  python issuu_downloader.py --all --drop-blank --drop-duplicates
+  
+  # Profile CPU and memory of a single download
+  python issuu_downloader.py --url "..." --profile download.prof --tracemalloc
         """
     )
     
     parser.add_argument('--url', help='Download a single publication from this URL')
     parser.add_argument('--list', action='store_true', help='List all known publications')
+    parser.add_argument('--discover', action='store_true', help='Crawl the Issuu profile for new publications')
+    parser.add_argument('--full-crawl', action='store_true', help='With --discover: crawl the whole profile listing')
     parser.add_argument('--all', action='store_true', help='Download ALL publications')
     parser.add_argument('--export', action='store_true', help='Export publication list for website')
-    # Default output is the 'pdfs' folder in the project root (parent of tools/)
-    script_dir = Path(__file__).resolve().parent
-    default_output = script_dir.parent / 'pdfs'
-    parser.add_argument('--output', '-o', default=str(default_output), help=f'Output directory (default: {default_output})')
+    parser.add_argument('--tiles', action='store_true', help='Export per-page images and manifests for website')
+    parser.add_argument('--output', '-o', default=str(PDF_DIR), help=f'Output directory (default: {PDF_DIR})')
     parser.add_argument('--quiet', '-q', action='store_true', help='Suppress output')
+    parser.add_argument('--page-workers', type=int, default=4, help='Concurrent page downloads per publication (default: 4)')
+    parser.add_argument('--rate', type=float, default=4.0, help='Initial requests per second to each host (default: 4)')
+    parser.add_argument('--max-rate', type=float, default=16.0, help='Upper bound for the adaptive request rate (default: 16)')
+    parser.add_argument('--retries', type=int, default=4, help='Retries per request on errors, 429 and 5xx (default: 4)')
+    parser.add_argument('--jobs', '-j', type=int, default=2, help='Publications downloaded at once with --all (default: 2)')
+    parser.add_argument('--max-connections', type=int, default=8, help='Max in-flight requests across all jobs (default: 8)')
+    parser.add_argument('--bandwidth', type=float, default=0, help='Total bandwidth cap in KB/s, 0 = unlimited (default: 0)')
+    parser.add_argument('--fresh', action='store_true', help='With --all: discard the saved job queue and start over')
+    parser.add_argument('--force', action='store_true', help='Rebuild PDFs even if they are already complete')
+    parser.add_argument('--cache-dir', help='Page cache directory (default: <output>/.page_cache)')
+    parser.add_argument('--metrics', metavar='PATH', help='Record timings and throughput as JSONL and print a summary')
+    parser.add_argument('--profile', metavar='PATH', help='With --url: run under cProfile and save stats to PATH')
+    parser.add_argument('--tracemalloc', action='store_true', help='With --url: report peak memory and top allocations')
+    parser.add_argument('--cache-size', type=int, default=2048, help='Page cache size limit in MB (default: 2048)')
+    parser.add_argument('--linearize', action='store_true', help='Write linearized (fast web view) PDFs; needs pikepdf')
+    parser.add_argument('--recompress', action='store_true', help='Re-encode pages by content (see recompress_pdfs.py); needs numpy')
+    parser.add_argument('--drop-blank', action='store_true', help='Leave blank pages out of the PDF (see page_analysis.py); needs numpy')
+    parser.add_argument('--drop-duplicates', action='store_true', help='Leave pages identical to an earlier page out of the PDF')
+    parser.add_argument('--no-page-analysis', action='store_true', help='Do not look for blank and repeated pages')
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
-    if not any([args.url, args.list, args.all, args.export]):
+    if not any([args.url, args.list, args.discover, args.all, args.export, args.tiles]):
         parser.print_help()
         return
     
-    downloader = IssuuDownloader(output_dir=args.output, verbose=not args.quiet)
+    downloader = IssuuDownloader(
+        output_dir=args.output,
+        verbose=not args.quiet,
+        page_workers=args.page_workers,
+        requests_per_second=args.rate,
+        max_requests_per_second=args.max_rate,
+        retries=args.retries,
+        max_connections=args.max_connections,
+        bandwidth=int(args.bandwidth * 1024),
+        cache_dir=args.cache_dir,
+        cache_size=args.cache_size * 1024 * 1024,
+        metrics=Metrics(args.metrics) if args.metrics else None,
+        linearize=args.linearize,
+        recompress=args.recompress,
+        analyze_pages=not args.no_page_analysis,
+        drop_blank=args.drop_blank,
+        drop_duplicates=args.drop_duplicates
+    )
     
+    try:
+        run_command(args, downloader)
+    finally:
+        if downloader.metrics.enabled:
+            print(f"\n{'='*60}")
+            print("METRICS")
+            print('='*60)
+            for line in downloader.metrics.summary():
+                print(line)
+            downloader.metrics.close()
+            print(f"Events written to: {args.metrics}")
+
+
+def profile_call(func, profile_path=None, trace_memory=False):
+    """Run `func` under cProfile and/or tracemalloc and print the hot spots."""
+    if trace_memory:
+        import tracemalloc
+        tracemalloc.start(25)
+    profiler = None
+    if profile_path:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        return func()
+    finally:
+        if profiler:
+            profiler.disable()
+        if trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"\nPeak traced memory: {peak / (1024 * 1024):.1f} MB")
+            for stat in snapshot.statistics('lineno')[:10]:
+                print(f"  {stat}")
+        if profiler:
+            import pstats
+            profiler.dump_stats(profile_path)
+            print(f"\nProfile saved to: {profile_path} (top functions by cumulative time)")
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+
+
+def run_command(args, downloader):
+    """Dispatch the selected command."""
     if args.list:
-        publications = downloader.get_publication_list()
-        print(f"\nKnown LPM HIMMAH Publications ({len(publications)} total):")
-        print('='*60)
-        for i, pub in enumerate(publications, 1):
-            print(f"{i:2}. {pub['title']}")
+        downloader.print_publication_list()
+    
+    elif args.discover:
+        try:
+            new = downloader.discover_publications(full=args.full_crawl)
+        except CrawlError as e:
+            print(f"\n✗ Profile crawl failed: {e}")
+            sys.exit(1)
+        print(f"\n{len(new)} new publications")
+        for pub in new:
+            print(f"  + {pub['title']}")
     
     elif args.url:
-        pdf_path = downloader.download_publication(args.url)
+        pdf_path = profile_call(
+            lambda: downloader.download_publication(args.url, force=args.force),
+            profile_path=args.profile,
+            trace_memory=args.tracemalloc
+        )
         if pdf_path:
             print(f"\n{'='*60}")
             print(f"✓ Success! PDF saved to: {pdf_path}")
+            missing = downloader.missing_pages.get(downloader.parse_issuu_url(args.url)['doc_slug'])
+            if missing:
+                print(f"⚠ Missing pages: {', '.join(map(str, missing))}")
         else:
             print("\n✗ Failed to download publication")
             sys.exit(1)
     
     elif args.all:
-        print(f"\nThis will download {len(downloader.LPMHIMMAH_PUBLICATIONS)} publications.")
+        print(f"\nThis will download {len(downloader.get_publication_list())} publications (plus new uploads).")
         print("This may take 30-60 minutes depending on your connection.")
         confirmation = input("Continue? (y/n): ")
         if confirmation.lower() == 'y':
-            downloaded = downloader.download_all()
+            downloaded = downloader.download_all(jobs=args.jobs, fresh=args.fresh, force=args.force)
             print(f"\n✓ Downloaded {len(downloaded)} PDFs to {downloader.output_dir}")
         else:
             print("Cancelled")
     
     elif args.export:
         downloader.export_for_website()
+    
+    elif args.tiles:
+        downloader.export_page_tiles()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Rewrite existing PDFs as linearized ("fast web view") files.
+Requires: pip install pikepdf
+
+Linearized PDFs carry a first-page hint table, so the reader on the website
+(PDF.js over HTTP range requests from R2) can show the cover after fetching a
+few hundred KB instead of the whole file. Files that are already linearized
+are skipped, so the command can be re-run after every download batch.
+
+Usage:
+  python linearize_pdfs.py
+  python linearize_pdfs.py --input ../pdfs --workers 4
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from himmah.config import PDF_DIR
+from page_cache import PageCache
+from pdf_writer import is_linearized, linearize_pdf
+
+
+def linearize_one(pdf_path, force=False):
+    """Worker: returns (name, status, size_before, size_after) with status 'done', 'skipped' or an error."""
+    pdf_path = Path(pdf_path)
+    before = pdf_path.stat().st_size
+    try:
+        if not force and is_linearized(pdf_path):
+            return pdf_path.name, 'skipped', before, before
+        linearize_pdf(pdf_path)
+        return pdf_path.name, 'done', before, pdf_path.stat().st_size
+    except Exception as e:
+        return pdf_path.name, f"failed: {e}", before, before
+
+
+def linearize_all(pdf_dir=PDF_DIR, workers=None, force=False, cache_dir=None):
+    pdf_dir = Path(pdf_dir)
+    pdf_files = sorted(pdf_dir.glob("*.pdf"))
+    print(f"Found {len(pdf_files)} PDF files in {pdf_dir}")
+
+    # The downloader remembers size/mtime of each PDF it built; keep that in sync
+    cache_dir = Path(cache_dir) if cache_dir else pdf_dir / '.page_cache'
+    page_cache = PageCache(cache_dir) if (cache_dir / 'index.sqlite').exists() else None
+
+    done = skipped = failed = 0
+    bytes_before = bytes_after = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(linearize_one, pdf_files, [force] * len(pdf_files))
+        for pdf_path, (name, status, before, after) in zip(pdf_files, results):
+            if status == 'skipped':
+                skipped += 1
+                continue
+            if status != 'done':
+                print(f"  [FAIL] {name} ({status[len('failed: '):]})")
+                failed += 1
+                continue
+            done += 1
+            bytes_before += before
+            bytes_after += after
+            if page_cache:
+                page_cache.refresh_output(pdf_path)
+            print(f"  [LIN] {name} ({before / 1024:.0f} KB -> {after / 1024:.0f} KB)")
+
+    print(f"\nDone! Linearized: {done}, Already linearized: {skipped}, Failed: {failed}")
+    if done:
+        print(f"Size change: {(bytes_after - bytes_before) / (1024 * 1024):+.2f} MB")
+    return failed == 0
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description='Linearize PDFs for fast first-page display on the website')
+    parser.add_argument('--input', '-i', default=str(PDF_DIR), help=f'PDF directory (default: {PDF_DIR})')
+    parser.add_argument('--workers', '-w', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--force', action='store_true', help='Rewrite PDFs that are already linearized')
+    parser.add_argument('--cache-dir', help='Downloader page cache to keep in sync (default: <input>/.page_cache)')
+    args = parser.parse_args(argv)
+
+    try:
+        import pikepdf  # noqa: F401
+    except ImportError:
+        print("Please install required packages:")
+        print("  pip install pikepdf")
+        exit(1)
+
+    if not linearize_all(args.input, workers=args.workers, force=args.force, cache_dir=args.cache_dir):
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+On-disk cache for Issuu reader3 document metadata.
+Stores each `reader3_4.json` document with its ETag/Last-Modified so it can be
+revalidated with a conditional request, and lets `--list`/`--export` report
+page counts without touching the network.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    username TEXT NOT NULL,
+    doc_slug TEXT NOT NULL,
+    document TEXT NOT NULL,
+    page_count INTEGER NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL,
+    validated_at REAL NOT NULL,
+    PRIMARY KEY (username, doc_slug)
+);
+"""
+
+
+class MetadataCache:
+    """SQLite-backed cache of reader3 documents and their validators."""
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def get(self, username, doc_slug):
+        """Return the cached document dict, or None."""
+        rows = self._execute(
+            'SELECT document FROM documents WHERE username = ? AND doc_slug = ?',
+            (username, doc_slug)
+        )
+        return json.loads(rows[0][0]) if rows else None
+
+    def conditional_headers(self, username, doc_slug):
+        """Request headers that revalidate the cached copy, if there is one."""
+        rows = self._execute(
+            'SELECT etag, last_modified FROM documents WHERE username = ? AND doc_slug = ?',
+            (username, doc_slug)
+        )
+        headers = {}
+        if rows:
+            etag, last_modified = rows[0]
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def store(self, username, doc_slug, document, etag=None, last_modified=None):
+        now = time.time()
+        self._execute(
+            'INSERT OR REPLACE INTO documents '
+            '(username, doc_slug, document, page_count, etag, last_modified, fetched_at, validated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (username, doc_slug, json.dumps(document, ensure_ascii=False),
+             len(document.get('pages', [])), etag, last_modified, now, now)
+        )
+
+    def touch(self, username, doc_slug):
+        """Mark the cached copy as revalidated (server answered 304)."""
+        self._execute(
+            'UPDATE documents SET validated_at = ? WHERE username = ? AND doc_slug = ?',
+            (time.time(), username, doc_slug)
+        )
+
+    def validated_at(self, username, doc_slug):
+        """When the cached copy was last fetched or revalidated, or None."""
+        rows = self._execute(
+            'SELECT validated_at FROM documents WHERE username = ? AND doc_slug = ?',
+            (username, doc_slug)
+        )
+        return rows[0][0] if rows else None
+
+    def page_count(self, username, doc_slug):
+        """Cached page count, or None if the document was never fetched."""
+        rows = self._execute(
+            'SELECT page_count FROM documents WHERE username = ? AND doc_slug = ?',
+            (username, doc_slug)
+        )
+        return rows[0][0] if rows else None
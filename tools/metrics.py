@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Timing and throughput instrumentation for the download pipeline.
+Records per-page, per-stage and per-publication events as JSONL and
+summarises them at the end of a run. Disabled instances cost nothing.
+"""
+
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers (0 <= fraction <= 1)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+
+class Metrics:
+    """Thread-safe metrics recorder writing one JSON object per line."""
+
+    def __init__(self, path=None):
+        self.enabled = path is not None
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self._file = None
+        self._started = time.monotonic()
+        self.page_latencies = []
+        self.page_bytes = 0
+        self.page_failures = 0
+        self.retries = 0
+        self.wait_seconds = 0.0
+        self.stage_seconds = {}
+        self.publications = []
+        if self.enabled:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _emit(self, event):
+        event['ts'] = round(time.time(), 3)
+        self._file.write(json.dumps(event, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    @contextmanager
+    def stage(self, publication, name):
+        """Time a pipeline stage (metadata, download, pdf, ...) of one publication."""
+        if not self.enabled:
+            yield
+            return
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            seconds = time.monotonic() - start
+            with self._lock:
+                self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + seconds
+                self._emit({'type': 'stage', 'publication': publication, 'stage': name,
+                            'seconds': round(seconds, 4)})
+
+    def page(self, publication, page, seconds, num_bytes, retries=0, wait=0.0, ok=True):
+        """Record one page fetch."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if ok:
+                self.page_latencies.append(seconds)
+                self.page_bytes += num_bytes
+            else:
+                self.page_failures += 1
+            self.retries += retries
+            self.wait_seconds += wait
+            self._emit({'type': 'page', 'publication': publication, 'page': page,
+                        'seconds': round(seconds, 4), 'bytes': num_bytes, 'retries': retries,
+                        'wait': round(wait, 4), 'ok': ok})
+
+    def publication(self, publication, seconds, pages, status):
+        """Record the outcome of one publication."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.publications.append((seconds, publication, pages, status))
+            self._emit({'type': 'publication', 'publication': publication,
+                        'seconds': round(seconds, 4), 'pages': pages, 'status': status})
+
+    def summary(self, slowest=5):
+        """End-of-run summary as a list of lines."""
+        elapsed = time.monotonic() - self._started
+        megabytes = self.page_bytes / (1024 * 1024)
+        lines = [
+            f"Publications: {len(self.publications)} in {elapsed:.1f}s",
+            f"Pages: {len(self.page_latencies)} ok, {self.page_failures} failed, {self.retries} retries",
+            f"Page latency: p50 {percentile(self.page_latencies, 0.5) * 1000:.0f} ms, "
+            f"p95 {percentile(self.page_latencies, 0.95) * 1000:.0f} ms",
+            f"Transferred: {megabytes:.1f} MB ({megabytes / elapsed if elapsed else 0:.2f} MB/s)",
+            f"Rate-limit/backoff waits: {self.wait_seconds:.1f}s (summed over workers)",
+        ]
+        if self.stage_seconds:
+            stages = ', '.join(f"{name} {seconds:.1f}s" for name, seconds in sorted(self.stage_seconds.items()))
+            lines.append(f"Stage totals: {stages}")
+        if self.publications:
+            lines.append("Slowest publications:")
+            for seconds, publication, pages, status in sorted(self.publications, reverse=True)[:slowest]:
+                lines.append(f"  {seconds:7.1f}s  {pages:3} pages  {status:10}  {publication}")
+        return lines
+
+    def close(self):
+        if self._file:
+            with self._lock:
+                self._emit({'type': 'summary', 'lines': self.summary()})
+                self._file.close()
+                self._file = None
@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+OCR full-text extraction for the downloaded PDFs.
+Requires: pip install pytesseract, plus the Tesseract binary with Indonesian
+language data (brew install tesseract tesseract-lang on macOS,
+apt install tesseract-ocr tesseract-ocr-ind on Debian/Ubuntu).
+
+Page images are read straight out of each PDF (pdf_reader) and OCR'd across a
+process pool. Results are cached in SQLite by the SHA-256 of the page image,
+so a re-run (or a run resumed after Ctrl+C) only processes new or changed
+pages. Each publication's text is written to text/<id>.txt.gz with one form
+feed between pages. With --text-layer the recognised words are also embedded
+into the PDF as invisible text, which makes it searchable and selectable.
+
+Usage:
+  python ocr_pages.py
+  python ocr_pages.py --workers 4 --text-layer
+  python ocr_pages.py ../pdfs/edisi_183_tahun_ke-19_maret_2017_-_kronik_tgc-37.pdf
+"""
+
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import time
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+from himmah.config import PDF_DIR, TEXT_DIR
+from page_cache import PageCache
+from pdf_reader import PDFFormatError, PDFReader, image_file_bytes
+from pdf_writer import is_linearized
+
+DEFAULT_LANG = 'ind'
+DEFAULT_PSM = 3  # fully automatic page segmentation
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    sha256 TEXT NOT NULL,
+    config TEXT NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    text BLOB NOT NULL,
+    words BLOB NOT NULL,
+    engine TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (sha256, config)
+);
+"""
+
+
+class OCRCache:
+    """OCR results keyed by page image hash and OCR settings; text and word boxes are zlib-compressed."""
+
+    def __init__(self, db_path):
+        self._conn = sqlite3.connect(str(db_path), isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def get(self, sha256, config):
+        row = self._conn.execute(
+            'SELECT width, height, text, words FROM pages WHERE sha256 = ? AND config = ?',
+            (sha256, config)
+        ).fetchone()
+        if not row:
+            return None
+        width, height, text, words = row
+        return {
+            'width': width,
+            'height': height,
+            'text': zlib.decompress(text).decode('utf-8'),
+            'words': json.loads(zlib.decompress(words)),
+        }
+
+    def put(self, sha256, config, result):
+        # Every page is committed on its own, so an interrupted run loses at most the pages in flight
+        self._conn.execute(
+            'INSERT OR REPLACE INTO pages (sha256, config, width, height, text, words, engine, seconds, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (sha256, config, result['width'], result['height'],
+             zlib.compress(result['text'].encode('utf-8')),
+             zlib.compress(json.dumps(result['words'], separators=(',', ':')).encode('utf-8')),
+             result['engine'], result['seconds'], time.time())
+        )
+
+
+# Tesseract version of this worker process, resolved once by init_worker
+_engine = None
+
+
+def tesseract_version():
+    """Version of the installed Tesseract binary (runs `tesseract --version`)."""
+    import pytesseract
+    return str(pytesseract.get_tesseract_version())
+
+
+def init_worker(nice):
+    """Keep each Tesseract single-threaded so --workers is the real CPU bound."""
+    global _engine
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+    if nice:
+        os.nice(nice)
+    _engine = tesseract_version()
+
+
+def ocr_image(image_bytes, lang, psm):
+    """
+    Worker: OCR one page image. Returns text plus word boxes
+    ([left, top, width, height, word] in image pixels) for the text layer.
+    """
+    import pytesseract
+    from PIL import Image
+
+    start = time.monotonic()
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        img = img.convert('L')
+        data = pytesseract.image_to_data(img, lang=lang, config=f'--psm {psm}',
+                                         output_type=pytesseract.Output.DICT)
+        width, height = img.size
+
+    words = []
+    lines = {}
+    for i, word in enumerate(data['text']):
+        word = word.strip()
+        if not word or float(data['conf'][i]) < 0:
+            continue
+        words.append([data['left'][i], data['top'][i], data['width'][i], data['height'][i], word])
+        key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        lines.setdefault(key, []).append(word)
+
+    # Lines joined by newlines, paragraphs separated by a blank line
+    paragraphs = {}
+    for (block, par, _), line_words in sorted(lines.items()):
+        paragraphs.setdefault((block, par), []).append(' '.join(line_words))
+    text = '\n\n'.join('\n'.join(par_lines) for par_lines in paragraphs.values())
+
+    return {
+        'width': width,
+        'height': height,
+        'text': text,
+        'words': words,
+        'engine': _engine or tesseract_version(),
+        'seconds': time.monotonic() - start,
+    }
+
+
+def page_images(pdf_path):
+    """Yield (page number, image bytes) for the main image of every page."""
+    with PDFReader(pdf_path) as reader:
+        for page_num, page in enumerate(reader.iter_pages(), 1):
+            image = reader.main_image(page)
+            if image is None:
+                yield page_num, None
+                continue
+            image_bytes = image_file_bytes(*image, reader.resolve)
+            if image_bytes is None:
+                raise PDFFormatError(f"page {page_num} is not an embedded JPEG or fax image")
+            yield page_num, image_bytes
+
+
+def write_text(text_path, pages):
+    """Write page texts gzip-compressed (deterministic bytes); returns True if the file changed."""
+    content = '\f'.join(pages).encode('utf-8')
+    try:
+        with gzip.open(text_path, 'rb') as f:
+            if f.read() == content:
+                return False
+    except (OSError, EOFError):
+        pass
+    tmp_path = text_path.with_suffix('.gz.part')
+    with open(tmp_path, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as f:
+        f.write(content)
+    os.replace(tmp_path, text_path)
+    return True
+
+
+def _pdf_string(text):
+    """Encode a word as a PDF literal string in WinAnsi (Helvetica's encoding)."""
+    data = text.encode('cp1252', errors='replace')
+    return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def text_layer_stream(result, page_width, page_height, x0=0.0, y0=0.0):
+    """
+    Content stream drawing the OCR words invisibly (render mode 3) over the page
+    image, for a page whose mediabox starts at (x0, y0).
+    """
+    sx = page_width / result['width']
+    sy = page_height / result['height']
+    ops = [b'q BT 3 Tr']
+    for left, top, width, height, word in result['words']:
+        size = max(1.0, height * sy)
+        # Helvetica averages about half an em per glyph; stretch the word to its box
+        natural = 0.5 * size * len(word)
+        scale = 100.0 * width * sx / natural if natural else 100.0
+        x = x0 + left * sx
+        y = y0 + page_height - (top + height) * sy
+        ops.append(f'/OCR {size:.2f} Tf {scale:.1f} Tz 1 0 0 1 {x:.2f} {y:.2f} Tm '.encode('ascii')
+                   + _pdf_string(word) + b' Tj')
+    ops.append(b'ET Q')
+    return b'\n'.join(ops)
+
+
+def _remove_text_layer(page):
+    """Take a text layer added by embed_text_layer off a page."""
+    import pikepdf
+
+    contents = page.obj.get('/Contents')
+    if isinstance(contents, pikepdf.Array):
+        kept = [stream for stream in contents if not _is_text_layer(stream)]
+        if len(kept) != len(contents):
+            page.obj.Contents = pikepdf.Array(kept)
+    fonts = page.Resources.get('/Font')
+    if fonts is not None and '/OCR' in fonts:
+        del fonts['/OCR']
+
+
+def _is_text_layer(stream):
+    # Layers written before the marker existed are recognised by their opening operators
+    return '/HimmahOCR' in stream or stream.read_bytes().startswith(b'q BT 3 Tr\n/OCR ')
+
+
+def embed_text_layer(pdf_path, results, config):
+    """
+    Add invisible OCR text to every page of `pdf_path` (needs pikepdf).
+    A text layer from other OCR settings (`config`) is replaced. Returns False
+    if the PDF already carries the text layer of these settings.
+    """
+    import pikepdf
+
+    pdf_path = Path(pdf_path)
+    linearized = is_linearized(pdf_path)
+    tmp_path = pdf_path.with_suffix('.pdf.ocr')
+    try:
+        with pikepdf.open(pdf_path) as pdf:
+            if '/HimmahOCR' in pdf.docinfo:
+                if str(pdf.docinfo['/HimmahOCR']) == config:
+                    return False
+                for page in pdf.pages:
+                    _remove_text_layer(page)
+            font = pdf.make_indirect(pikepdf.Dictionary(
+                Type=pikepdf.Name.Font, Subtype=pikepdf.Name.Type1,
+                BaseFont=pikepdf.Name.Helvetica, Encoding=pikepdf.Name.WinAnsiEncoding
+            ))
+            for page, result in zip(pdf.pages, results):
+                if not result or not result['words']:
+                    continue
+                x0, y0, x1, y1 = (float(v) for v in page.mediabox)
+                stream = text_layer_stream(result, x1 - x0, y1 - y0, x0, y0)
+                if '/Font' not in page.Resources:
+                    page.Resources.Font = pikepdf.Dictionary()
+                page.Resources.Font.OCR = font
+                layer = pikepdf.Stream(pdf, stream)
+                layer.HimmahOCR = True
+                page.contents_add(layer, prepend=False)
+            pdf.docinfo['/HimmahOCR'] = config
+            # Classic xref tables keep the file readable by pdf_reader
+            pdf.save(tmp_path, linearize=linearized, object_stream_mode=pikepdf.ObjectStreamMode.disable)
+        os.replace(tmp_path, pdf_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return True
+
+
+def ocr_publication(pdf_path, cache, executor, config, lang, psm, window):
+    """OCR every page of one PDF, reusing cached pages. Returns (results per page, pages OCR'd now)."""
+    results = {}
+    todo = []
+    for page_num, image_bytes in page_images(pdf_path):
+        if image_bytes is None:
+            results[page_num] = None
+            continue
+        sha256 = hashlib.sha256(image_bytes).hexdigest()
+        cached = cache.get(sha256, config)
+        if cached:
+            results[page_num] = cached
+        else:
+            todo.append((page_num, sha256, image_bytes))
+
+    # Bounded number of pages in flight keeps memory flat on long publications
+    pending = {}
+    queue = iter(todo)
+    while True:
+        while len(pending) < window:
+            item = next(queue, None)
+            if item is None:
+                break
+            page_num, sha256, image_bytes = item
+            pending[executor.submit(ocr_image, image_bytes, lang, psm)] = (page_num, sha256)
+        if not pending:
+            break
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            page_num, sha256 = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception:
+                # Pages finished so far stay cached; the rest of this publication is abandoned
+                for other in pending:
+                    other.cancel()
+                raise
+            cache.put(sha256, config, result)
+            results[page_num] = result
+            print(f"\r  OCR page {page_num} ({result['seconds']:.1f}s, {len(result['words'])} words)   ", end='')
+    if todo:
+        print()
+    return [results[page_num] for page_num in sorted(results)], len(todo)
+
+
+def run_ocr(pdf_files, text_dir=TEXT_DIR, cache_path=None, workers=None, lang=DEFAULT_LANG,
+            psm=DEFAULT_PSM, text_layer=False, nice=0):
+    import pytesseract
+
+    text_dir = Path(text_dir)
+    text_dir.mkdir(parents=True, exist_ok=True)
+    pdf_files = [Path(p) for p in pdf_files]
+    if not pdf_files:
+        print("No PDF files found")
+        return True
+    pdf_dir = pdf_files[0].parent
+    cache = OCRCache(cache_path or pdf_dir / '.ocr_cache.sqlite')
+    page_cache = PageCache(pdf_dir / '.page_cache') if (pdf_dir / '.page_cache' / 'index.sqlite').exists() else None
+    # The engine version is part of the key, so upgrading Tesseract redoes the OCR
+    config = f"tesseract {tesseract_version()} lang={lang} psm={psm}"
+    workers = workers or os.cpu_count() or 1
+
+    totals = {'publications': 0, 'pages': 0, 'ocr': 0, 'written': 0, 'layers': 0, 'failed': 0}
+    start = time.monotonic()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(nice,)) as executor:
+            for pdf_path in pdf_files:
+                print(f"{pdf_path.name}")
+                try:
+                    results, processed = ocr_publication(pdf_path, cache, executor, config, lang, psm,
+                                                         window=workers * 2)
+                except (PDFFormatError, OSError, pytesseract.TesseractError) as e:
+                    print(f"  [FAIL] {e}")
+                    totals['failed'] += 1
+                    continue
+
+                totals['publications'] += 1
+                totals['pages'] += len(results)
+                totals['ocr'] += processed
+                text_path = text_dir / f"{pdf_path.stem}.txt.gz"
+                if write_text(text_path, [r['text'] if r else '' for r in results]):
+                    totals['written'] += 1
+                status = f"  {len(results)} pages, {processed} OCR'd, {len(results) - processed} cached"
+
+                if text_layer:
+                    if embed_text_layer(pdf_path, results, config):
+                        totals['layers'] += 1
+                        status += ", text layer added"
+                        if page_cache:
+                            page_cache.refresh_output(pdf_path)
+                    else:
+                        status += ", text layer present"
+                print(status)
+    except KeyboardInterrupt:
+        print("\nInterrupted; finished pages are cached and will be skipped next time")
+        raise
+    finally:
+        cache.close()
+
+    elapsed = time.monotonic() - start
+    print(f"\nDone in {elapsed:.0f}s! Publications: {totals['publications']}, pages: {totals['pages']} "
+          f"({totals['ocr']} OCR'd), text files updated: {totals['written']}, "
+          f"text layers added: {totals['layers']}, failed: {totals['failed']}")
+    print(f"Text saved to: {text_dir}")
+    return totals['failed'] == 0
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description='OCR page images of the downloaded PDFs into compressed text files',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # OCR everything in ../pdfs with all CPU cores
+  python ocr_pages.py
+
+  # Two cores at low priority, and make the PDFs searchable
+  python ocr_pages.py --workers 2 --nice 10 --text-layer
+        """
+    )
+    parser.add_argument('pdfs', nargs='*', help=f'PDF files (default: all in {PDF_DIR})')
+    parser.add_argument('--output', '-o', default=str(TEXT_DIR), help=f'Text directory (default: {TEXT_DIR})')
+    parser.add_argument('--workers', '-w', type=int, default=None, help='Parallel OCR processes (default: CPU count)')
+    parser.add_argument('--lang', default=DEFAULT_LANG, help=f'Tesseract language(s), e.g. ind+eng (default: {DEFAULT_LANG})')
+    parser.add_argument('--psm', type=int, default=DEFAULT_PSM, help=f'Tesseract page segmentation mode (default: {DEFAULT_PSM})')
+    parser.add_argument('--text-layer', action='store_true', help='Embed invisible OCR text into the PDFs (needs pikepdf)')
+    parser.add_argument('--cache', help='OCR cache database (default: <pdf dir>/.ocr_cache.sqlite)')
+    parser.add_argument('--nice', type=int, default=0, help='Lower the priority of OCR workers by this much')
+    args = parser.parse_args(argv)
+
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+    except ImportError:
+        print("Please install required packages:")
+        print("  pip install pytesseract")
+        exit(1)
+    except pytesseract.TesseractNotFoundError:
+        print("Tesseract is not installed:")
+        print("  brew install tesseract tesseract-lang    (macOS)")
+        print("  apt install tesseract-ocr tesseract-ocr-ind    (Debian/Ubuntu)")
+        exit(1)
+    if args.text_layer:
+        try:
+            import pikepdf  # noqa: F401
+        except ImportError:
+            print("Please install required packages:")
+            print("  pip install pikepdf")
+            exit(1)
+
+    pdf_files = [Path(p) for p in args.pdfs] or sorted(PDF_DIR.glob("*.pdf"))
+    if not run_ocr(pdf_files, text_dir=args.output, cache_path=args.cache, workers=args.workers,
+                   lang=args.lang, psm=args.psm, text_layer=args.text_layer, nice=args.nice):
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Find blank, duplicated and recurring pages in the downloaded publications.
+Requires: pip install numpy Pillow
+
+Scans often carry blank scanner pages, spreads uploaded twice and promo
+pages inserted into many issues. The downloader runs this analysis on the
+page images before it assembles a PDF (when numpy is installed), so it has
+to be cheap: each page is decoded at a quarter of its size (JPEG DCT
+scaling) and everything after that is vectorized NumPy.
+
+  blank      almost no ink inside the margins, relative to the paper color
+  duplicate  same bytes as an earlier page of the issue
+  similar    looks like an earlier page of the issue (rescans, re-encodes)
+  recurring  looks like a page of RECURRING_MIN other publications (promos)
+
+"Looks like" compares perceptual signatures: a 32x32 thumbnail with its
+coarse layout filtered out, so that two text pages share little more than
+their columns. Signatures are compared by correlation (one matrix product
+for a whole issue) and survive re-encoding, rescaling and small shifts.
+Results are kept per page in pdfs/.page_analysis.sqlite. The downloader only
+drops pages when asked to (--drop-blank, --drop-duplicates); similar and
+recurring pages are reported, never dropped.
+
+Run on its own, this analyzes the pages of PDFs built before the analysis
+existed and prints (or writes) the report.
+
+Usage:
+  python page_analysis.py
+  python page_analysis.py --report pages.json
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+from himmah.config import CATALOG_DB, ISSUU_USER, PDF_DIR, PUBLICATIONS_JSON
+
+# Pages are decoded at (at least) this fraction of their size
+DECODE_SCALE = 4
+# Scanner edges and binding shadows are ignored: this fraction of each side
+MARGIN = 0.05
+# Brightness percentile taken as the paper color
+PAPER_PERCENTILE = 95
+# Pixels this much darker than the paper are ink...
+INK_DELTA = 48
+# ...and a page with less than this fraction of ink pixels is blank
+BLANK_INK = 0.0005
+# Signature thumbnail size and the blur radius of the layout it leaves out
+SIGNATURE_SIZE = 32
+LAYOUT_RADIUS = 2
+# Pages whose signatures correlate at least this much look the same
+SIMILAR = 0.8
+# A page is recurring if this many other publications have a page like it
+RECURRING_MIN = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    username TEXT NOT NULL,
+    doc_slug TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    signature BLOB NOT NULL,
+    ink REAL NOT NULL,
+    blank INTEGER NOT NULL,
+    duplicate_of INTEGER,
+    identical INTEGER NOT NULL DEFAULT 0,
+    similarity REAL,
+    dropped INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (username, doc_slug, page)
+);
+"""
+
+
+def analyze_image(data):
+    """Statistics of one page image: sha256, perceptual signature (bytes), ink fraction and blank flag."""
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft('L', (max(1, img.width // DECODE_SCALE), max(1, img.height // DECODE_SCALE)))
+        gray = img.convert('L')
+
+    luma = np.asarray(gray, dtype=np.int16)
+    h, w = luma.shape
+    dy, dx = int(h * MARGIN), int(w * MARGIN)
+    inner = luma[dy:h - dy or None, dx:w - dx or None]
+    paper = np.percentile(inner, PAPER_PERCENTILE)
+    ink = float((inner < paper - INK_DELTA).mean())
+
+    # Thumbnail minus its blurred self: word and picture positions without the page layout
+    small = gray.resize((SIGNATURE_SIZE, SIGNATURE_SIZE), Image.BOX)
+    detail = (np.asarray(small, dtype=np.float32)
+              - np.asarray(small.filter(ImageFilter.GaussianBlur(LAYOUT_RADIUS)), dtype=np.float32))
+    detail -= detail.mean()
+    scale = np.abs(detail).max()
+    signature = np.round(detail * (127 / scale)) if scale else detail
+    return {
+        'sha256': hashlib.sha256(data).hexdigest(),
+        'signature': signature.astype(np.int8).tobytes(),
+        'ink': round(ink, 6),
+        'blank': ink < BLANK_INK,
+    }
+
+
+def signature_matrix(signatures):
+    """Unit-length float rows of the given signatures, so that a product of two is their correlation."""
+    matrix = np.array([np.frombuffer(s, dtype=np.int8) for s in signatures], dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1)
+
+
+def find_duplicates(results):
+    """
+    Mark pages that repeat an earlier page of the same issue: set
+    'duplicate_of' (page number), 'identical' (same bytes) and 'similarity'.
+    Blank pages are left out; they all look alike.
+    """
+    candidates = [r for r in results if not r['blank']]
+    for r in results:
+        r.update(duplicate_of=None, identical=False, similarity=None)
+    if len(candidates) < 2:
+        return results
+    matrix = signature_matrix([r['signature'] for r in candidates])
+    similarity = matrix @ matrix.T
+    first = {}
+    for j, r in enumerate(candidates):
+        if r['sha256'] in first:
+            r.update(duplicate_of=first[r['sha256']], identical=True, similarity=1.0)
+        elif j and similarity[j, :j].max() >= SIMILAR:
+            i = int(similarity[j, :j].argmax())
+            r.update(duplicate_of=candidates[i]['page'], similarity=round(float(similarity[j, i]), 3))
+        first.setdefault(r['sha256'], r['page'])
+    return results
+
+
+def analyze_pages(pages, workers=4):
+    """
+    Analyze page images given as (page number, path) pairs.
+    Returns one result dict per page, in order, with duplicates marked.
+    """
+    def analyze(item):
+        page, path = item
+        return dict(analyze_image(Path(path).read_bytes()), page=page)
+
+    # Decoding releases the GIL, so threads are enough
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        results = list(executor.map(analyze, pages))
+    return find_duplicates(results)
+
+
+def pages_to_drop(results, drop_blank=False, drop_duplicates=False):
+    """Page numbers to leave out of the PDF; never all of them."""
+    drop = {
+        r['page'] for r in results
+        if (drop_blank and r['blank']) or (drop_duplicates and r['identical'])
+    }
+    return drop if len(drop) < len(results) else set()
+
+
+def summarize(results):
+    """One line such as '2 blank, 1 duplicate, 1 similar' (empty if nothing was found)."""
+    counts = [
+        (sum(r['blank'] for r in results), 'blank'),
+        (sum(r['identical'] for r in results), 'duplicate'),
+        (sum(r['duplicate_of'] is not None and not r['identical'] for r in results), 'similar'),
+    ]
+    return ', '.join(f"{count} {label}" for count, label in counts if count)
+
+
+class PageAnalysis:
+    """SQLite store of per-page analysis results."""
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def record(self, username, doc_slug, results, dropped=()):
+        """Replace the results of a publication."""
+        with self._lock:
+            self._conn.execute('BEGIN')
+            self._conn.execute('DELETE FROM pages WHERE username = ? AND doc_slug = ?', (username, doc_slug))
+            self._conn.executemany(
+                'INSERT INTO pages (username, doc_slug, page, sha256, signature, ink, blank, '
+                'duplicate_of, identical, similarity, dropped) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(username, doc_slug, r['page'], r['sha256'], r['signature'], r['ink'], int(r['blank']),
+                  r['duplicate_of'], int(r['identical']), r['similarity'], int(r['page'] in dropped))
+                 for r in results]
+            )
+            self._conn.execute('COMMIT')
+
+    def publications(self):
+        """(username, doc_slug) pairs that have been analyzed."""
+        return set(self._execute('SELECT DISTINCT username, doc_slug FROM pages'))
+
+    def dropped_count(self, username, doc_slug):
+        """Pages left out of the publication's PDF."""
+        return self._execute(
+            'SELECT COUNT(*) FROM pages WHERE username = ? AND doc_slug = ? AND dropped = 1',
+            (username, doc_slug)
+        )[0][0]
+
+    def report(self, recurring_min=RECURRING_MIN):
+        """
+        Per-publication findings: blank, duplicate, similar, recurring and
+        dropped pages. Recurring pages are found by comparing the non-blank
+        pages of each publication with all others, one matrix product per
+        publication, which is fine at the size of this archive.
+        """
+        rows = self._execute(
+            'SELECT username, doc_slug, page, signature, blank, duplicate_of, identical, similarity, dropped '
+            'FROM pages ORDER BY username, doc_slug, page'
+        )
+        publications = {}
+        for username, doc_slug, page, _, blank, duplicate_of, identical, similarity, dropped in rows:
+            pub = publications.setdefault((username, doc_slug), {
+                'username': username, 'id': doc_slug, 'pages': 0,
+                'blank': [], 'duplicates': [], 'similar': [], 'recurring': [], 'dropped': [],
+            })
+            pub['pages'] += 1
+            if blank:
+                pub['blank'].append(page)
+            if identical:
+                pub['duplicates'].append({'page': page, 'of': duplicate_of})
+            elif duplicate_of is not None:
+                pub['similar'].append({'page': page, 'of': duplicate_of, 'similarity': similarity})
+            if dropped:
+                pub['dropped'].append(page)
+
+        content = [row for row in rows if not row[4]]
+        if not content:
+            return list(publications.values())
+        matrix = signature_matrix([row[3] for row in content])
+        owners = {}
+        owner_of = np.array([owners.setdefault((row[0], row[1]), len(owners)) for row in content])
+        for key, owner in owners.items():
+            mine = np.flatnonzero(owner_of == owner)
+            alike = (matrix[mine] @ matrix.T) >= SIMILAR
+            for index, row_alike in zip(mine, alike):
+                others = len(set(owner_of[row_alike].tolist()) - {owner})
+                if others >= recurring_min:
+                    publications[key]['recurring'].append({'page': content[index][2], 'publications': others})
+        return list(publications.values())
+
+
+def analyze_pdf(pdf_path):
+    """Worker: analyze the main image of every page of a PDF. Returns the results."""
+    from pdf_reader import PDFReader, image_file_bytes
+
+    results = []
+    with PDFReader(pdf_path) as reader:
+        for number, page in enumerate(reader.iter_pages(), 1):
+            ref = reader.main_image_ref(page)
+            if ref is None:
+                continue
+            dictionary, data = reader.stream(ref)
+            image_bytes = image_file_bytes(dictionary, data, reader.resolve)
+            if image_bytes is not None:
+                results.append(dict(analyze_image(image_bytes), page=number))
+    return find_duplicates(results)
+
+
+def analyze_archive(pdf_dir=PDF_DIR, catalog=None, store=None, workers=None, force=False, log=print):
+    """Analyze the PDFs of the catalog that have no results yet (all with `force`)."""
+    from catalog import Catalog
+
+    catalog = catalog or Catalog(CATALOG_DB, PUBLICATIONS_JSON)
+    pdf_dir = Path(pdf_dir)
+    store = store or PageAnalysis(pdf_dir / '.page_analysis.sqlite')
+    done = set() if force else store.publications()
+
+    targets = []
+    for pub in catalog.all():
+        parts = (pub['issuu_url'] or '').split('issuu.com/', 1)
+        username = parts[1].split('/')[0] if len(parts) == 2 and parts[1] else ISSUU_USER
+        pdf_path = pdf_dir / Path(pub['pdf_file'] or '').name
+        if pub['pdf_file'] and pdf_path.exists() and (username, pub['id']) not in done:
+            targets.append((username, pub['id'], pdf_path))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [(username, doc_slug, executor.submit(analyze_pdf, path)) for username, doc_slug, path in targets]
+        for username, doc_slug, future in futures:
+            try:
+                results = future.result()
+            except Exception as e:
+                log(f"  ✗ {doc_slug}: {e}")
+                continue
+            store.record(username, doc_slug, results)
+            log(f"  {doc_slug}: {len(results)} pages" + (f", {summarize(results)}" if summarize(results) else ""))
+    return store
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description='Find blank, duplicated and recurring (promo) pages',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Analyze PDFs built before page analysis existed and print the findings
+  python page_analysis.py
+
+  # Write the per-publication report as JSON
+  python page_analysis.py --report pages.json
+
+  # Leave blank pages and repeated pages out of new PDFs
+  python issuu_downloader.py --all --drop-blank --drop-duplicates
+        """
+    )
+    parser.add_argument('--input', '-i', default=str(PDF_DIR), help=f'PDF directory (default: {PDF_DIR})')
+    parser.add_argument('--db', default=str(CATALOG_DB), help=f'Catalog database (default: {CATALOG_DB})')
+    parser.add_argument('--workers', '-w', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--force', action='store_true', help='Analyze PDFs again even if they have results')
+    parser.add_argument('--report', metavar='PATH', help='Write the per-publication report as JSON')
+    args = parser.parse_args(argv)
+
+    from catalog import Catalog
+    store = analyze_archive(args.input, Catalog(args.db, PUBLICATIONS_JSON), workers=args.workers, force=args.force)
+    report = store.report()
+
+    flagged = [pub for pub in report
+               if pub['blank'] or pub['duplicates'] or pub['similar'] or pub['recurring']]
+    for pub in flagged:
+        print(f"\n{pub['id']} ({pub['pages']} pages)")
+        if pub['blank']:
+            print(f"  blank:     {', '.join(map(str, pub['blank']))}")
+        for label, key in (('duplicate', 'duplicates'), ('similar', 'similar')):
+            for item in pub[key]:
+                print(f"  {label + ':':<10} {item['page']} (of page {item['of']})")
+        for item in pub['recurring']:
+            print(f"  recurring: {item['page']} (in {item['publications']} other publications)")
+        if pub['dropped']:
+            print(f"  dropped:   {', '.join(map(str, pub['dropped']))}")
+
+    print(f"\n{len(report)} publications analyzed, {len(flagged)} with flagged pages")
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Report written to: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
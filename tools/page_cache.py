@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Persistent, content-addressed page image store.
+Every page image is stored once as a blob named by its SHA-256 and sharded
+by the first two hex digits (blobs/ab/ab12...), however many publications
+reference it: covers, mastheads and reprinted pages are kept and written
+once. Pages (username, doc_slug, page) reference blobs, and each blob counts
+its references; blobs nobody references any more are deleted by gc(). Blobs
+are verified by SHA-256 on every read, and the least-recently-used ones are
+evicted once the store grows past its size limit. Also remembers which page
+set each PDF was built from, so complete publications can be skipped on re-runs.
+
+Downloads, PDF assembly and tile export all read the blob files directly.
+Caches in the old one-file-per-page layout are moved into the store on open.
+"""
+
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    refs INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS blobs_lru ON blobs (last_access);
+CREATE TABLE IF NOT EXISTS page_refs (
+    username TEXT NOT NULL,
+    doc_slug TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    PRIMARY KEY (username, doc_slug, page)
+);
+CREATE INDEX IF NOT EXISTS page_refs_blob ON page_refs (sha256);
+CREATE TABLE IF NOT EXISTS outputs (
+    username TEXT NOT NULL,
+    doc_slug TEXT NOT NULL,
+    pdf_path TEXT NOT NULL,
+    pdf_size INTEGER NOT NULL,
+    pdf_mtime REAL NOT NULL,
+    page_count INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    options TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (username, doc_slug)
+);
+"""
+
+
+def sha256_file(path, chunk_size=1024 * 1024):
+    """SHA-256 hex digest of a file, read in chunks."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class PageCache:
+    """Size-bounded, content-addressed and content-verified store of page images."""
+
+    def __init__(self, cache_dir, max_bytes=2 * 1024 ** 3):
+        self.cache_dir = Path(cache_dir)
+        self.blobs_dir = self.cache_dir / 'blobs'
+        self.partial_dir = self.cache_dir / 'partial'
+        self.blobs_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pinned = {}
+        self._conn = sqlite3.connect(
+            str(self.cache_dir / 'index.sqlite'), check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(outputs)')}
+        if 'options' not in columns:
+            self._conn.execute("ALTER TABLE outputs ADD COLUMN options TEXT NOT NULL DEFAULT ''")
+        self._migrate()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _migrate(self):
+        """Move pages of the old per-publication layout (pages/<user>/<slug>/page_0001.jpg) into blobs."""
+        if not self._execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'pages'"):
+            return
+        for username, doc_slug, page, size, digest, last_access in self._execute(
+            'SELECT username, doc_slug, page, size, sha256, last_access FROM pages'
+        ):
+            old_path = self.cache_dir / 'pages' / username / doc_slug / f"page_{page:04d}.jpg"
+            try:
+                if old_path.stat().st_size != size:
+                    continue
+            except OSError:
+                continue
+            with self._lock:
+                self._adopt(old_path, digest, size)
+                self._reference(username, doc_slug, page, digest, size, last_access)
+        self._execute('DROP TABLE pages')
+        shutil.rmtree(self.cache_dir / 'pages', ignore_errors=True)
+
+    def blob_path(self, digest):
+        return self.blobs_dir / digest[:2] / digest
+
+    @staticmethod
+    def digest(path):
+        """SHA-256 of a page file returned by get() or put_file(), which is its name."""
+        return Path(path).name
+
+    def get(self, username, doc_slug, page):
+        """Return the path of a cached page, or None if missing or corrupt."""
+        rows = self._execute(
+            'SELECT b.sha256, b.size FROM page_refs r JOIN blobs b ON b.sha256 = r.sha256 '
+            'WHERE r.username = ? AND r.doc_slug = ? AND r.page = ?',
+            (username, doc_slug, page)
+        )
+        if not rows:
+            return None
+        digest, size = rows[0]
+        path = self.blob_path(digest)
+        try:
+            valid = path.stat().st_size == size and sha256_file(path) == digest
+        except OSError:
+            valid = False
+        if not valid:
+            # A damaged blob is wrong for every page that references it
+            self._drop_blob(digest)
+            return None
+        self._execute('UPDATE blobs SET last_access = ? WHERE sha256 = ?', (time.time(), digest))
+        return path
+
+    def partial_path(self, username, doc_slug, page):
+        """Temporary file a page is streamed into before put_file() adopts it."""
+        path = self.partial_dir / username / doc_slug / f"page_{page:04d}.part"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def put(self, username, doc_slug, page, data):
+        """Store page bytes atomically and return the cached path."""
+        tmp_path = self.partial_path(username, doc_slug, page)
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        return self.put_file(username, doc_slug, page, tmp_path, len(data), hashlib.sha256(data).hexdigest())
+
+    def put_file(self, username, doc_slug, page, tmp_path, size, digest):
+        """
+        Adopt a completely written page file (size and SHA-256 already known,
+        e.g. hashed while streaming) and return the path of its blob. If the
+        store already has these bytes, the file is dropped instead of written again.
+        """
+        # Under the lock so gc() never sees a blob file before its row
+        with self._lock:
+            self._adopt(tmp_path, digest, size)
+            self._reference(username, doc_slug, page, digest, size, time.time())
+        return self.blob_path(digest)
+
+    def _adopt(self, tmp_path, digest, size):
+        """Move a file into the blob store unless the blob exists. Call with the lock held."""
+        path = self.blob_path(digest)
+        try:
+            exists = path.stat().st_size == size
+        except OSError:
+            exists = False
+        if exists:
+            Path(tmp_path).unlink(missing_ok=True)
+        else:
+            path.parent.mkdir(exist_ok=True)
+            os.replace(tmp_path, path)
+
+    def _reference(self, username, doc_slug, page, digest, size, last_access):
+        """Point a page at a blob, moving its reference from the previous one. Call with the lock held."""
+        self._conn.execute('BEGIN')
+        row = self._conn.execute(
+            'SELECT sha256 FROM page_refs WHERE username = ? AND doc_slug = ? AND page = ?',
+            (username, doc_slug, page)
+        ).fetchone()
+        self._conn.execute(
+            'INSERT OR IGNORE INTO blobs (sha256, size, refs, last_access) VALUES (?, ?, 0, ?)',
+            (digest, size, last_access)
+        )
+        self._conn.execute('UPDATE blobs SET size = ?, last_access = ? WHERE sha256 = ?', (size, last_access, digest))
+        if not row or row[0] != digest:
+            if row:
+                self._conn.execute('UPDATE blobs SET refs = refs - 1 WHERE sha256 = ?', row)
+            self._conn.execute('UPDATE blobs SET refs = refs + 1 WHERE sha256 = ?', (digest,))
+            self._conn.execute(
+                'INSERT OR REPLACE INTO page_refs (username, doc_slug, page, sha256) VALUES (?, ?, ?, ?)',
+                (username, doc_slug, page, digest)
+            )
+        self._conn.execute('COMMIT')
+
+    def discard(self, username, doc_slug, page):
+        """Forget a page. Its blob stays (other pages may share it) until gc() finds it unreferenced."""
+        with self._lock:
+            self._conn.execute('BEGIN')
+            row = self._conn.execute(
+                'SELECT sha256 FROM page_refs WHERE username = ? AND doc_slug = ? AND page = ?',
+                (username, doc_slug, page)
+            ).fetchone()
+            if row:
+                self._conn.execute(
+                    'DELETE FROM page_refs WHERE username = ? AND doc_slug = ? AND page = ?',
+                    (username, doc_slug, page)
+                )
+                self._conn.execute('UPDATE blobs SET refs = refs - 1 WHERE sha256 = ?', row)
+            self._conn.execute('COMMIT')
+
+    def _drop_blob(self, digest):
+        """Delete a blob and every page reference to it."""
+        with self._lock:
+            self._conn.execute('BEGIN')
+            self._conn.execute('DELETE FROM page_refs WHERE sha256 = ?', (digest,))
+            self._conn.execute('DELETE FROM blobs WHERE sha256 = ?', (digest,))
+            self._conn.execute('COMMIT')
+            self.blob_path(digest).unlink(missing_ok=True)
+
+    def invalidate(self, username, doc_slug):
+        """Drop every page reference and the output record of a publication."""
+        for (page,) in self._execute(
+            'SELECT page FROM page_refs WHERE username = ? AND doc_slug = ?', (username, doc_slug)
+        ):
+            self.discard(username, doc_slug, page)
+        self._execute('DELETE FROM outputs WHERE username = ? AND doc_slug = ?', (username, doc_slug))
+
+    @contextmanager
+    def pinned(self, username, doc_slug):
+        """Protect a publication's pages from eviction while it is being processed."""
+        key = (username, doc_slug)
+        with self._lock:
+            self._pinned[key] = self._pinned.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pinned[key] -= 1
+                if not self._pinned[key]:
+                    del self._pinned[key]
+
+    def total_bytes(self):
+        return self._execute('SELECT COALESCE(SUM(size), 0) FROM blobs')[0][0]
+
+    def gc(self):
+        """
+        Delete blobs that no page references, and blob files the index does not
+        know (left behind by a crash). Returns bytes freed.
+        """
+        freed = 0
+        with self._lock:
+            for digest, size in self._conn.execute('SELECT sha256, size FROM blobs WHERE refs <= 0').fetchall():
+                self._conn.execute('DELETE FROM blobs WHERE sha256 = ?', (digest,))
+                self.blob_path(digest).unlink(missing_ok=True)
+                freed += size
+            known = {row[0] for row in self._conn.execute('SELECT sha256 FROM blobs')}
+            for shard in self.blobs_dir.iterdir():
+                for path in shard.iterdir():
+                    if path.name not in known:
+                        freed += path.stat().st_size
+                        path.unlink()
+        return freed
+
+    def evict(self):
+        """
+        Collect garbage, then delete least-recently-used blobs (and the pages
+        referencing them) until the store fits; blobs of pinned publications stay.
+        Returns bytes freed.
+        """
+        freed = self.gc()
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return freed
+        target = total - self.max_bytes
+        evicted = 0
+        for digest, size in self._execute('SELECT sha256, size FROM blobs ORDER BY last_access'):
+            if evicted >= target:
+                break
+            owners = self._execute('SELECT DISTINCT username, doc_slug FROM page_refs WHERE sha256 = ?', (digest,))
+            with self._lock:
+                if any(tuple(owner) in self._pinned for owner in owners):
+                    continue
+            self._drop_blob(digest)
+            evicted += size
+        return freed + evicted
+
+    def page_set_digest(self, username, doc_slug, page_count):
+        """
+        Digest over the hashes of pages 1..page_count.
+        Returns None unless every page is cached.
+        """
+        rows = self._execute(
+            'SELECT page, sha256 FROM page_refs WHERE username = ? AND doc_slug = ? AND page <= ? ORDER BY page',
+            (username, doc_slug, page_count)
+        )
+        if [page for page, _ in rows] != list(range(1, page_count + 1)):
+            return None
+        h = hashlib.sha256()
+        for _, digest in rows:
+            h.update(digest.encode('ascii'))
+        return h.hexdigest()
+
+    def record_output(self, username, doc_slug, pdf_path, page_count, digest, options=''):
+        """
+        Remember that `pdf_path` was built from the current page set, with the
+        build `options` that change which pages it contains.
+        """
+        stat = Path(pdf_path).stat()
+        self._execute(
+            'INSERT OR REPLACE INTO outputs (username, doc_slug, pdf_path, pdf_size, pdf_mtime, page_count, digest, options) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (username, doc_slug, str(pdf_path), stat.st_size, stat.st_mtime, page_count, digest, options)
+        )
+
+    def refresh_output(self, pdf_path):
+        """
+        Re-record size and mtime of `pdf_path` after it was rewritten without
+        changing its pages (e.g. linearized), so it is not rebuilt needlessly.
+        """
+        stat = Path(pdf_path).stat()
+        self._execute(
+            'UPDATE outputs SET pdf_size = ?, pdf_mtime = ? WHERE pdf_path = ?',
+            (stat.st_size, stat.st_mtime, str(pdf_path))
+        )
+
+    def is_output_complete(self, username, doc_slug, pdf_path, page_count, options=''):
+        """
+        True if `pdf_path` is unchanged since it was built with the same `options`
+        from all `page_count` pages and those pages are still the ones in the cache.
+        """
+        rows = self._execute(
+            'SELECT pdf_path, pdf_size, pdf_mtime, page_count, digest, options FROM outputs '
+            'WHERE username = ? AND doc_slug = ?',
+            (username, doc_slug)
+        )
+        if not rows:
+            return False
+        recorded_path, size, mtime, recorded_count, digest, recorded_options = rows[0]
+        try:
+            stat = Path(pdf_path).stat()
+        except OSError:
+            return False
+        if (recorded_path, size, mtime, recorded_count, recorded_options) != (
+                str(pdf_path), stat.st_size, stat.st_mtime, page_count, options):
+            return False
+        # Pages may have been evicted since; the PDF is still complete if it matched when built
+        current = self.page_set_digest(username, doc_slug, page_count)
+        return current is None or current == digest
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Per-page image export for lazy loading on the website.
+Writes every page of a publication as progressive JPEGs in a few widths,
+each kept under a byte budget, plus a manifest.json with page dimensions,
+byte sizes and hashes. Pages whose source image is unchanged since the last
+export are not re-encoded.
+"""
+
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+
+from page_cache import sha256_file
+
+# Tile width (pixels) -> byte budget per tile
+TILE_SIZES = {
+    640: 150 * 1024,
+    1280: 450 * 1024,
+}
+START_QUALITY = 82
+MIN_QUALITY = 50
+QUALITY_STEP = 8
+MANIFEST_VERSION = 1
+
+
+def encode_tile(img, max_bytes):
+    """Encode a progressive JPEG, lowering quality until it fits `max_bytes`."""
+    quality = START_QUALITY
+    while True:
+        buffer = io.BytesIO()
+        img.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+        if buffer.tell() <= max_bytes or quality <= MIN_QUALITY:
+            return buffer.getvalue(), quality
+        quality = max(MIN_QUALITY, quality - QUALITY_STEP)
+
+
+def render_page(source_path, source_sha256, page_num, out_dir):
+    """
+    Worker: write all tile widths of one page. Returns the page's manifest entry.
+    Tiles are never upscaled; a page narrower than a tile width is stored at its own width.
+    """
+    out_dir = Path(out_dir)
+    with Image.open(source_path) as img:
+        source_size = img.size
+        # Decode at the largest size we need; JPEG draft mode scales by 1/2..1/8
+        largest = min(max(TILE_SIZES), img.width)
+        img.draft('RGB', (largest, max(1, round(largest * img.height / img.width))))
+        img = img.convert('RGB')
+
+        tiles = {}
+        for width, max_bytes in sorted(TILE_SIZES.items(), reverse=True):
+            tile_width = min(width, source_size[0])
+            tile_height = max(1, round(tile_width * source_size[1] / source_size[0]))
+            resized = img
+            factor = min(img.width // tile_width, img.height // tile_height)
+            if factor >= 2:
+                resized = resized.reduce(factor)
+            if resized.size != (tile_width, tile_height):
+                resized = resized.resize((tile_width, tile_height), Image.Resampling.LANCZOS)
+            data, quality = encode_tile(resized, max_bytes)
+
+            relative = f"{width}/{page_num:04d}.jpg"
+            path = out_dir / relative
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix('.jpg.part')
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+            tiles[str(width)] = {
+                'file': relative,
+                'width': tile_width,
+                'height': tile_height,
+                'bytes': len(data),
+                'quality': quality,
+                'sha256': sha256_file(path),
+            }
+
+    return {
+        'page': page_num,
+        'width': source_size[0],
+        'height': source_size[1],
+        'source_sha256': source_sha256,
+        'tiles': tiles,
+    }
+
+
+def load_manifest(out_dir):
+    try:
+        with open(Path(out_dir) / 'manifest.json', 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != MANIFEST_VERSION or sorted(manifest.get('widths', [])) != sorted(TILE_SIZES):
+        return None
+    return manifest
+
+
+def is_current(entry, source_sha256, out_dir):
+    """True if a manifest entry was rendered from this source and its tiles are intact."""
+    if not entry or entry.get('source_sha256') != source_sha256:
+        return False
+    for tile in entry['tiles'].values():
+        try:
+            if (out_dir / tile['file']).stat().st_size != tile['bytes']:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def export_tiles(doc_slug, page_paths, out_dir, workers=None, hashes=None):
+    """
+    Export `page_paths` (page 1 first) as tiles into `out_dir` and write the manifest.
+    `hashes` are the SHA-256 digests of the pages if already known (the page
+    store names its files by them); otherwise the pages are hashed.
+    Returns (manifest, number of pages rendered).
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    previous = load_manifest(out_dir)
+    previous_pages = {entry['page']: entry for entry in previous['pages']} if previous else {}
+
+    entries = {}
+    todo = []
+    for page_num, source_path in enumerate(page_paths, 1):
+        source_sha256 = hashes[page_num - 1] if hashes else sha256_file(source_path)
+        entry = previous_pages.get(page_num)
+        if is_current(entry, source_sha256, out_dir):
+            entries[page_num] = entry
+        else:
+            todo.append((str(source_path), source_sha256, page_num, str(out_dir)))
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for entry in executor.map(render_page, *zip(*todo)):
+                entries[entry['page']] = entry
+
+    # Tiles of pages that no longer exist would otherwise linger
+    for page_num in set(previous_pages) - set(entries):
+        for tile in previous_pages[page_num]['tiles'].values():
+            (out_dir / tile['file']).unlink(missing_ok=True)
+
+    pages = [entries[page_num] for page_num in sorted(entries)]
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'id': doc_slug,
+        'page_count': len(pages),
+        'widths': sorted(TILE_SIZES),
+        'total_bytes': {
+            str(width): sum(page['tiles'][str(width)]['bytes'] for page in pages)
+            for width in sorted(TILE_SIZES)
+        },
+        'pages': pages,
+    }
+    if manifest != previous:
+        tmp_path = out_dir / 'manifest.json.part'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, out_dir / 'manifest.json')
+    return manifest, len(todo)
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Minimal memory-mapped PDF reader.
+Reads the trailer and cross-reference table and resolves only the objects
+that are asked for, which is enough to count pages and pull embedded page
+images (JPEG or CCITT fax) out of the image-only PDFs this project produces.
+Files that use cross-reference streams or object streams raise
+PDFFormatError so callers can fall back to a full PDF library.
+"""
+
+import mmap
+import re
+import struct
+from pathlib import Path
+
+
+class PDFFormatError(Exception):
+    """The file is not a PDF this reader can handle."""
+
+
+class Ref:
+    """Indirect object reference."""
+
+    __slots__ = ('num', 'gen')
+
+    def __init__(self, num, gen):
+        self.num = num
+        self.gen = gen
+
+    def __repr__(self):
+        return f"Ref({self.num}, {self.gen})"
+
+
+class Name(str):
+    """PDF name object (stored without the leading slash)."""
+
+
+WHITESPACE = b' \t\r\n\f\x00'
+DELIMITERS = b'()<>[]{}/%'
+NUMBER = re.compile(rb'[+-]?(\d+\.?\d*|\.\d+)')
+REF_TAIL = re.compile(rb'\s+(\d+)\s+R')
+
+
+class _Parser:
+    """Recursive-descent parser for PDF objects inside a buffer."""
+
+    def __init__(self, data, pos=0):
+        self.data = data
+        self.pos = pos
+
+    def skip_space(self):
+        data = self.data
+        while self.pos < len(data):
+            ch = data[self.pos]
+            if ch in WHITESPACE:
+                self.pos += 1
+            elif ch == 0x25:  # % comment runs to end of line
+                while self.pos < len(data) and data[self.pos] not in b'\r\n':
+                    self.pos += 1
+            else:
+                break
+
+    def token(self):
+        """Read a bare keyword token (e.g. obj, stream, true)."""
+        self.skip_space()
+        start = self.pos
+        data = self.data
+        while self.pos < len(data) and data[self.pos] not in WHITESPACE and data[self.pos] not in DELIMITERS:
+            self.pos += 1
+        return bytes(data[start:self.pos])
+
+    def parse(self):
+        self.skip_space()
+        data = self.data
+        ch = data[self.pos:self.pos + 1]
+        if ch == b'/':
+            self.pos += 1
+            return Name(self.token().decode('latin-1'))
+        if ch == b'<' and data[self.pos + 1:self.pos + 2] == b'<':
+            self.pos += 2
+            result = {}
+            while True:
+                self.skip_space()
+                if data[self.pos:self.pos + 2] == b'>>':
+                    self.pos += 2
+                    return result
+                key = self.parse()
+                result[str(key)] = self.parse()
+        if ch == b'[':
+            self.pos += 1
+            items = []
+            while True:
+                self.skip_space()
+                if data[self.pos:self.pos + 1] == b']':
+                    self.pos += 1
+                    return items
+                items.append(self.parse())
+        if ch == b'(':
+            return self._literal_string()
+        if ch == b'<':
+            end = data.find(b'>', self.pos)
+            hex_digits = re.sub(rb'\s', b'', bytes(data[self.pos + 1:end]))
+            self.pos = end + 1
+            if len(hex_digits) % 2:
+                hex_digits += b'0'
+            return bytes.fromhex(hex_digits.decode('ascii'))
+        match = NUMBER.match(data, self.pos)
+        if match:
+            self.pos = match.end()
+            text = match.group(0)
+            if b'.' in text:
+                return float(text)
+            value = int(text)
+            # "n g R" is a reference
+            ref = REF_TAIL.match(data, self.pos)
+            if ref and value >= 0:
+                self.pos = ref.end()
+                return Ref(value, int(ref.group(1)))
+            return value
+        word = self.token()
+        if word == b'true':
+            return True
+        if word == b'false':
+            return False
+        if word == b'null':
+            return None
+        raise PDFFormatError(f"Unexpected token {word!r} at offset {self.pos}")
+
+    def _literal_string(self):
+        data = self.data
+        depth = 0
+        out = bytearray()
+        self.pos += 1
+        while self.pos < len(data):
+            ch = data[self.pos]
+            self.pos += 1
+            if ch == 0x5C:  # backslash
+                out.append(data[self.pos])
+                self.pos += 1
+            elif ch == 0x28:
+                depth += 1
+                out.append(ch)
+            elif ch == 0x29:
+                if depth == 0:
+                    return bytes(out)
+                depth -= 1
+                out.append(ch)
+            else:
+                out.append(ch)
+        raise PDFFormatError("Unterminated string")
+
+
+class PDFReader:
+    """
+    Lazily resolves objects of a PDF through its cross-reference table.
+    Use as a context manager to release the memory map.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, 'rb')
+        try:
+            self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise PDFFormatError("Empty file")
+        self.offsets = {}
+        self.trailer = {}
+        self._cache = {}
+        try:
+            self._read_xref()
+        except (ValueError, IndexError) as e:
+            self.close()
+            raise PDFFormatError(f"Malformed cross-reference table: {e}")
+        except PDFFormatError:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        self.data.close()
+        self._file.close()
+
+    def _read_xref(self):
+        data = self.data
+        if data[:5] != b'%PDF-':
+            raise PDFFormatError("Missing %PDF header")
+        tail_start = max(0, len(data) - 2048)
+        startxref = data.rfind(b'startxref', tail_start)
+        if startxref < 0:
+            raise PDFFormatError("Missing startxref")
+        offset = int(_Parser(data, startxref + len(b'startxref')).token())
+        seen = set()
+        while offset is not None and offset not in seen:
+            seen.add(offset)
+            if data[offset:offset + 4] != b'xref':
+                raise PDFFormatError("Cross-reference streams are not supported")
+            parser = _Parser(data, offset + 4)
+            while True:
+                parser.skip_space()
+                if data[parser.pos:parser.pos + 7] == b'trailer':
+                    parser.pos += 7
+                    break
+                first, count = int(parser.token()), int(parser.token())
+                for num in range(first, first + count):
+                    entry_offset, _, kind = parser.token(), parser.token(), parser.token()
+                    if kind == b'n' and num not in self.offsets:
+                        self.offsets[num] = int(entry_offset)
+            trailer = parser.parse()
+            for key, value in trailer.items():
+                self.trailer.setdefault(key, value)
+            offset = trailer.get('Prev')
+
+    def _object_start(self, num):
+        offset = self.offsets.get(num)
+        if offset is None:
+            raise PDFFormatError(f"Object {num} not in xref")
+        parser = _Parser(self.data, offset)
+        if parser.token() != str(num).encode('ascii'):
+            raise PDFFormatError(f"Bad xref offset for object {num}")
+        parser.token()  # generation
+        if parser.token() != b'obj':
+            raise PDFFormatError(f"Object {num} has no 'obj' keyword")
+        return parser
+
+    def resolve(self, value):
+        """Follow references until a direct object is reached."""
+        while isinstance(value, Ref):
+            if value.num not in self._cache:
+                self._cache[value.num] = self._object_start(value.num).parse()
+            value = self._cache[value.num]
+        return value
+
+    def stream(self, ref):
+        """Return (dictionary, raw stream bytes) for a stream object reference."""
+        dictionary, start, end = self.stream_bounds(ref)
+        return dictionary, self.data[start:end]
+
+    def stream_bounds(self, ref):
+        """Return (dictionary, start, end) of a stream's raw data in the file, without copying it."""
+        parser = self._object_start(ref.num)
+        dictionary = parser.parse()
+        if parser.token() != b'stream':
+            raise PDFFormatError(f"Object {ref.num} is not a stream")
+        start = parser.pos
+        if self.data[start:start + 2] == b'\r\n':
+            start += 2
+        elif self.data[start:start + 1] in (b'\n', b'\r'):
+            start += 1
+        length = self.resolve(dictionary.get('Length'))
+        if not isinstance(length, int) or start + length > len(self.data):
+            raise PDFFormatError(f"Bad stream length in object {ref.num}")
+        return dictionary, start, start + length
+
+    @property
+    def root(self):
+        return self.resolve(self.trailer.get('Root'))
+
+    def page_count(self):
+        """Page count as declared by the root page tree."""
+        pages = self.resolve(self.root.get('Pages'))
+        return int(self.resolve(pages.get('Count', 0)))
+
+    def iter_pages(self):
+        """Yield page dictionaries in order, with inherited Resources filled in."""
+        def walk(node, inherited):
+            node = self.resolve(node)
+            resources = node.get('Resources', inherited)
+            if node.get('Type') == 'Pages' or 'Kids' in node:
+                for kid in self.resolve(node.get('Kids', [])):
+                    yield from walk(kid, resources)
+            else:
+                page = dict(node)
+                page['Resources'] = resources
+                yield page
+        yield from walk(self.root.get('Pages'), None)
+
+    def page_images(self, page):
+        """Return image XObject references of a page as (ref, dictionary) pairs."""
+        resources = self.resolve(page.get('Resources')) or {}
+        xobjects = self.resolve(resources.get('XObject')) or {}
+        images = []
+        for ref in xobjects.values():
+            if not isinstance(ref, Ref):
+                continue
+            # Only the dictionary is needed; the image data stays in the file
+            dictionary = self.stream_bounds(ref)[0]
+            if dictionary.get('Subtype') == 'Image':
+                images.append((ref, dictionary))
+        return images
+
+    def main_image_ref(self, page):
+        """Reference of the largest image on a page, or None."""
+        images = self.page_images(page)
+        if not images:
+            return None
+        ref, _ = max(
+            images,
+            key=lambda item: self.resolve(item[1].get('Width', 0)) * self.resolve(item[1].get('Height', 0))
+        )
+        return ref
+
+    def main_image(self, page):
+        """
+        The largest image on a page as (dictionary, raw bytes), or None.
+        For DCTDecode images the raw bytes are a complete JPEG file.
+        """
+        ref = self.main_image_ref(page)
+        return self.stream(ref) if ref is not None else None
+
+
+def image_filters(dictionary):
+    """List of filter names applied to a stream."""
+    filters = dictionary.get('Filter')
+    if filters is None:
+        return []
+    if isinstance(filters, list):
+        return [str(f) for f in filters]
+    return [str(filters)]
+
+
+def image_file_bytes(dictionary, data, resolve=lambda value: value):
+    """
+    The raw stream of a page image as a file Pillow can open, or None.
+    DCTDecode data already is a JPEG file; CCITT fax data gets a minimal
+    TIFF header, since Pillow has no decoder for bare fax streams.
+    """
+    filters = image_filters(dictionary)
+    if filters == ['DCTDecode']:
+        return bytes(data)
+    if filters != ['CCITTFaxDecode']:
+        return None
+    params = resolve(dictionary.get('DecodeParms')) or {}
+    if isinstance(params, list):
+        params = resolve(params[0]) or {}
+    k = resolve(params.get('K', 0))
+    if k > 0:
+        return None  # mixed 1-D/2-D Group 3 is not produced by this project
+    width = resolve(params.get('Columns', 1728))
+    height = resolve(params.get('Rows', 0)) or resolve(dictionary.get('Height'))
+    # Fax data has white runs decoding to white unless BlackIs1 inverts it
+    photometric = 1 if resolve(params.get('BlackIs1', False)) else 0
+    entries = [
+        (256, 4, width), (257, 4, height), (258, 3, 1),
+        (259, 3, 4 if k < 0 else 3), (262, 3, photometric), (273, 4, 0),
+        (277, 3, 1), (278, 4, height), (279, 4, len(data)),
+    ]
+    data_offset = 8 + 2 + len(entries) * 12 + 4
+    header = b'II*\x00' + struct.pack('<IH', 8, len(entries))
+    for tag, kind, value in entries:
+        value = data_offset if tag == 273 else value
+        packed = struct.pack('<HH', value, 0) if kind == 3 else struct.pack('<I', value)
+        header += struct.pack('<HHI', tag, kind, 1) + packed
+    return header + b'\x00\x00\x00\x00' + bytes(data)
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Streaming image-to-PDF writer.
+Embeds JPEG pages byte-for-byte (DCTDecode) and writes each PDF object to
+disk as soon as it is produced, so memory use does not grow with page count.
+Only pages that cannot be embedded directly are converted with Pillow.
+Bilevel pages can also be stored as CCITT Group 4 (CCITTFaxDecode) data.
+Optionally rewrites finished PDFs linearized ("fast web view") with pikepdf.
+"""
+
+import io
+import os
+import shutil
+import struct
+from pathlib import Path
+
+# Same fallback resolution img2pdf uses, so page sizes stay unchanged
+DEFAULT_DPI = 96.0
+
+# Start-of-frame markers for 8-bit sequential (baseline/extended) and progressive JPEGs
+EMBEDDABLE_SOF = {0xC0, 0xC1, 0xC2}
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+COLOR_SPACES = {1: '/DeviceGray', 3: '/DeviceRGB'}
+
+
+def read_jpeg_info(path):
+    """
+    Read the JPEG header (of a file, or of bytes) without decoding the image.
+    Returns a dict with width, height, components, precision, sof and dpi,
+    or None if the file is not a JPEG.
+    """
+    info = {'dpi': None}
+    with (io.BytesIO(path) if isinstance(path, bytes) else open(path, 'rb')) as f:
+        if f.read(2) != b'\xff\xd8':
+            return None
+        while True:
+            byte = f.read(1)
+            if not byte:
+                return None
+            if byte != b'\xff':
+                continue
+            marker = f.read(1)
+            while marker == b'\xff':
+                marker = f.read(1)
+            if not marker:
+                return None
+            marker = marker[0]
+            if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+                continue
+            if marker in (0xD9, 0xDA):
+                return None
+            length_bytes = f.read(2)
+            if len(length_bytes) < 2:
+                return None
+            segment = f.read(struct.unpack('>H', length_bytes)[0] - 2)
+            if marker == 0xE0 and segment[:5] == b'JFIF\x00' and len(segment) >= 12:
+                units, x_density, y_density = struct.unpack('>BHH', segment[7:12])
+                if units == 1 and x_density and y_density:
+                    info['dpi'] = (float(x_density), float(y_density))
+                elif units == 2 and x_density and y_density:
+                    info['dpi'] = (x_density * 2.54, y_density * 2.54)
+            elif marker in SOF_MARKERS:
+                precision, height, width, components = struct.unpack('>BHHB', segment[:6])
+                info.update(sof=marker, precision=precision, width=width,
+                            height=height, components=components)
+                return info
+
+
+def check_image_file(path):
+    """
+    Structural check of a downloaded page image: None if it looks complete,
+    otherwise the reason. JPEGs need SOI, a parseable frame header and an EOI
+    marker at the end (trailing padding is tolerated); other formats are left
+    to Pillow's verify().
+    """
+    with open(path, 'rb') as f:
+        head = f.read(2)
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - 64))
+        tail = f.read().rstrip(b'\x00\r\n ')
+    if head == b'\xff\xd8':
+        info = read_jpeg_info(path)
+        if info is None or not info.get('width') or not info.get('height'):
+            return "JPEG header is incomplete"
+        if not tail.endswith(b'\xff\xd9'):
+            return "JPEG is truncated (no EOI marker)"
+        return None
+
+    from PIL import Image
+    try:
+        with Image.open(path) as img:
+            img.verify()
+    except Exception as e:
+        return f"not a valid image ({e})"
+    return None
+
+
+def is_embeddable(info):
+    """True if the JPEG can go into the PDF as-is."""
+    return (
+        info is not None
+        and info['sof'] in EMBEDDABLE_SOF
+        and info['precision'] == 8
+        and info['components'] in COLOR_SPACES
+        and info['width'] > 0 and info['height'] > 0
+    )
+
+
+def convert_to_jpeg(image_path, output_path, quality=95):
+    """Re-encode an image as a baseline RGB or grayscale JPEG (to a path or a file object)."""
+    from PIL import Image
+
+    with Image.open(image_path) as img:
+        mode = 'L' if img.mode in ('1', 'L', 'LA', 'I', 'I;16', 'F') else 'RGB'
+        converted = img.convert(mode)
+        dpi = img.info.get('dpi')
+        save_kwargs = {'quality': quality}
+        if dpi:
+            save_kwargs['dpi'] = dpi
+        converted.save(output_path, 'JPEG', **save_kwargs)
+    return output_path
+
+
+def encode_ccitt_g4(ink):
+    """
+    Encode a 2-D boolean array (True = ink) as raw CCITT Group 4 data.
+    Pillow (built with libtiff) writes a single-strip G4 TIFF; its strip is
+    exactly the stream /CCITTFaxDecode expects with K -1 and BlackIs1 false.
+    """
+    from PIL import Image
+
+    img = Image.fromarray(ink)
+    buffer = io.BytesIO()
+    img.save(buffer, 'TIFF', compression='group4', tiffinfo={278: img.height})
+    data = buffer.getvalue()
+    with Image.open(io.BytesIO(data)) as tiff:
+        offsets, counts = tiff.tag_v2[273], tiff.tag_v2[279]
+    if len(offsets) != 1:
+        raise ValueError("expected a single-strip G4 TIFF")
+    return data[offsets[0]:offsets[0] + counts[0]]
+
+
+def _pdf_string(value):
+    escaped = str(value).replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return f"({escaped.encode('ascii', 'replace').decode('ascii')})"
+
+
+class StreamingPDFWriter:
+    """
+    Writes a PDF with one full-page image per page, object by object.
+    Use as a context manager; the file is moved into place only on success.
+    `info` entries (name -> text) go into the document information dictionary.
+    """
+
+    def __init__(self, pdf_path, info=None):
+        self.pdf_path = Path(pdf_path)
+        self.info = info or {}
+        self.tmp_path = self.pdf_path.with_suffix('.pdf.part')
+        self._file = open(self.tmp_path, 'wb')
+        self._offsets = {}
+        self._page_ids = []
+        # 1 = catalog, 2 = page tree; both written last
+        self._next_id = 3
+        self._file.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def _allocate(self):
+        obj_id = self._next_id
+        self._next_id += 1
+        return obj_id
+
+    def _begin_object(self, obj_id):
+        self._offsets[obj_id] = self._file.tell()
+        self._file.write(f'{obj_id} 0 obj\n'.encode('ascii'))
+
+    def _write_object(self, obj_id, body):
+        self._begin_object(obj_id)
+        self._file.write(body.encode('ascii') + b'\nendobj\n')
+
+    def _write_stream(self, obj_id, dictionary, source, length):
+        """Write a stream object, copying `source` (bytes or file path) straight to disk."""
+        self._begin_object(obj_id)
+        self._file.write(f'<< {dictionary} /Length {length} >>\nstream\n'.encode('ascii'))
+        if isinstance(source, bytes):
+            self._file.write(source)
+        else:
+            with open(source, 'rb') as f:
+                shutil.copyfileobj(f, self._file, 1024 * 1024)
+        self._file.write(b'\nendstream\nendobj\n')
+
+    def add_jpeg_page(self, jpeg_path, info=None, dpi=None):
+        """
+        Add a page showing an embeddable JPEG (file path or bytes) at its native
+        resolution, or at `dpi` (x, y) if given.
+        """
+        info = info or read_jpeg_info(jpeg_path)
+        if not is_embeddable(info):
+            raise ValueError(f"{'JPEG data' if isinstance(jpeg_path, bytes) else jpeg_path} cannot be embedded without conversion")
+
+        length = len(jpeg_path) if isinstance(jpeg_path, bytes) else os.path.getsize(jpeg_path)
+        self._add_image_page(
+            f'/ColorSpace {COLOR_SPACES[info["components"]]} /BitsPerComponent 8 /Filter /DCTDecode',
+            jpeg_path, length, info['width'], info['height'], dpi or info['dpi']
+        )
+
+    def add_ccitt_page(self, data, width, height, dpi=None):
+        """Add a page showing a bilevel image from raw CCITT G4 data (see encode_ccitt_g4)."""
+        self._add_image_page(
+            f'/ColorSpace /DeviceGray /BitsPerComponent 1 /Filter /CCITTFaxDecode '
+            f'/DecodeParms << /K -1 /Columns {width} /Rows {height} >>',
+            data, len(data), width, height, dpi
+        )
+
+    def _add_image_page(self, image_entries, source, length, width, height, dpi):
+        dpi_x, dpi_y = dpi or (DEFAULT_DPI, DEFAULT_DPI)
+        page_w = width * 72.0 / dpi_x
+        page_h = height * 72.0 / dpi_y
+
+        image_id, content_id, page_id = self._allocate(), self._allocate(), self._allocate()
+
+        self._write_stream(
+            image_id,
+            f'/Type /XObject /Subtype /Image /Width {width} /Height {height} {image_entries}',
+            source,
+            length
+        )
+        content = f'q\n{page_w:.4f} 0 0 {page_h:.4f} 0 0 cm\n/Im0 Do\nQ'.encode('ascii')
+        self._write_stream(content_id, '', content, len(content))
+        self._write_object(
+            page_id,
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page_w:.4f} {page_h:.4f}] '
+            f'/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>'
+        )
+        self._page_ids.append(page_id)
+
+    def close(self):
+        """Write the page tree, catalog, xref and trailer, then move the file into place."""
+        kids = ' '.join(f'{page_id} 0 R' for page_id in self._page_ids)
+        self._write_object(2, f'<< /Type /Pages /Kids [{kids}] /Count {len(self._page_ids)} >>')
+        self._write_object(1, '<< /Type /Catalog /Pages 2 0 R >>')
+        info_ref = ''
+        if self.info:
+            info_id = self._allocate()
+            entries = ' '.join(f'/{name} {_pdf_string(value)}' for name, value in self.info.items())
+            self._write_object(info_id, f'<< {entries} >>')
+            info_ref = f' /Info {info_id} 0 R'
+
+        xref_offset = self._file.tell()
+        size = self._next_id
+        lines = [f'xref\n0 {size}\n', '0000000000 65535 f \n']
+        lines.extend(f'{self._offsets[obj_id]:010d} 00000 n \n' for obj_id in range(1, size))
+        self._file.write(''.join(lines).encode('ascii'))
+        self._file.write(
+            f'trailer\n<< /Size {size} /Root 1 0 R{info_ref} >>\nstartxref\n{xref_offset}\n%%EOF\n'.encode('ascii')
+        )
+        self._file.close()
+        os.replace(self.tmp_path, self.pdf_path)
+
+    def abort(self):
+        self._file.close()
+        self.tmp_path.unlink(missing_ok=True)
+
+
+def write_pdf(image_paths, pdf_path):
+    """
+    Assemble `image_paths` (in order) into a PDF at `pdf_path`.
+    JPEGs are embedded unchanged, straight from their files; anything else is
+    converted in memory one page at a time. Returns the number of pages that
+    needed conversion.
+    """
+    converted = 0
+    with StreamingPDFWriter(pdf_path) as writer:
+        for image_path in image_paths:
+            info = read_jpeg_info(image_path)
+            if not is_embeddable(info):
+                buffer = io.BytesIO()
+                convert_to_jpeg(image_path, buffer)
+                writer.add_jpeg_page(buffer.getvalue())
+                converted += 1
+            else:
+                writer.add_jpeg_page(image_path, info)
+    return converted
+
+
+def is_linearized(pdf_path):
+    """True if the PDF starts with a linearization parameter dictionary."""
+    with open(pdf_path, 'rb') as f:
+        return b'/Linearized' in f.read(1024)
+
+
+def linearize_pdf(pdf_path):
+    """
+    Rewrite `pdf_path` in place as a linearized PDF with first-page hint tables,
+    so viewers such as PDF.js can render page 1 from a few range requests.
+    Requires pikepdf (pip install pikepdf).
+    """
+    try:
+        import pikepdf
+    except ImportError:
+        raise RuntimeError("linearizing needs pikepdf: pip install pikepdf")
+
+    pdf_path = Path(pdf_path)
+    tmp_path = pdf_path.with_suffix('.pdf.lin')
+    try:
+        with pikepdf.open(pdf_path) as pdf:
+            # Keep classic xref tables so pdf_reader can still open the result
+            pdf.save(tmp_path, linearize=True, object_stream_mode=pikepdf.ObjectStreamMode.disable)
+        os.replace(tmp_path, pdf_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+"""
+Make-like build of the archive that only re-runs stages whose inputs changed.
+
+Every publication is a chain of stages
+
+    metadata -> pdf -> thumbnail
+
+and the archive-wide stages after them depend on all publications:
+
+    export (publications.json) -> atlas (+ placeholders) -> search index [-> verify, upload]
+
+Each stage records a hash of its inputs in pdfs/pipeline.sqlite (the reader3
+document and build options for a PDF, the PDF's content for its thumbnail,
+all thumbnails for the atlas, ...) and is skipped while that hash is
+unchanged and its outputs exist. Files changed by other tools, such as PDFs
+shrunk by recompress_pdfs.py, are new inputs for the stages after them.
+File hashes are memoised by size and mtime, so checking an up-to-date
+archive reads no file twice. Publications are built in parallel (--jobs).
+
+reader3 metadata is revalidated with a conditional request once it is older
+than --refresh hours. Each run starts with an incremental crawl of the
+profile (one request when nothing is new), so with --watch a new issue is
+downloaded, thumbnailed and exported within one cycle.
+
+Usage:
+  python pipeline.py
+  python pipeline.py --dry-run
+  python pipeline.py --watch 900 --upload
+"""
+
+import argparse
+import hashlib
+import json
+import signal
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from himmah.config import PDF_DIR, R2_BUCKET, SEARCH_INDEX_DIR, THUMB_DIR
+from page_cache import sha256_file
+
+DEFAULT_REFRESH = 24  # hours between revalidations of a document's metadata
+
+# Target of the archive-wide stages
+ARCHIVE = '*'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stages (
+    target TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    input_hash TEXT NOT NULL,
+    outputs TEXT NOT NULL,
+    status TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    finished_at REAL NOT NULL,
+    PRIMARY KEY (target, stage)
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+"""
+
+
+class StageError(Exception):
+    """A stage could not produce its outputs."""
+
+
+def hash_value(value):
+    """Stable hash of a JSON-serializable value."""
+    return hashlib.sha256(json.dumps(value, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class BuildState:
+    """SQLite record of finished stages and of file content hashes."""
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def file_hash(self, path):
+        """SHA-256 of a file, re-read only when its size or mtime changed; None if it is missing."""
+        path = Path(path)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        rows = self._execute('SELECT size, mtime_ns, sha256 FROM files WHERE path = ?', (str(path),))
+        if rows and rows[0][0] == stat.st_size and rows[0][1] == stat.st_mtime_ns:
+            return rows[0][2]
+        digest = sha256_file(path)
+        self._execute(
+            'INSERT OR REPLACE INTO files (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)',
+            (str(path), stat.st_size, stat.st_mtime_ns, digest)
+        )
+        return digest
+
+    def get(self, target, stage):
+        """The last finished run of a stage as {'input_hash', 'status'}, or None."""
+        rows = self._execute(
+            'SELECT input_hash, status FROM stages WHERE target = ? AND stage = ?', (target, stage)
+        )
+        return {'input_hash': rows[0][0], 'status': rows[0][1]} if rows else None
+
+    def record(self, target, stage, input_hash, outputs, status, seconds):
+        hashes = {str(path): self.file_hash(path) for path in outputs}
+        self._execute(
+            'INSERT OR REPLACE INTO stages (target, stage, input_hash, outputs, status, seconds, finished_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (target, stage, input_hash, json.dumps(hashes, sort_keys=True), status, seconds, time.time())
+        )
+
+
+class Pipeline:
+    """Builds publications and the archive-wide files through an IssuuDownloader."""
+
+    def __init__(self, downloader, state, jobs=2, refresh=DEFAULT_REFRESH * 3600, discover=True,
+                 upload=None, dry_run=False, force=False):
+        self.downloader = downloader
+        self.state = state
+        self.jobs = max(1, jobs)
+        self.refresh = refresh
+        self.discover = discover
+        # {'bucket', 'endpoint_url', 'jobs'} to sync with R2 at the end, or None
+        self.upload = upload
+        self.dry_run = dry_run
+        self.force = force
+        self.thumb_dir = THUMB_DIR
+        self.index_dir = SEARCH_INDEX_DIR
+        self._log_lock = threading.Lock()
+        self._summary = None
+
+    def log(self, message):
+        with self._log_lock:
+            print(message, flush=True)
+
+    def _note(self, key, label=None):
+        with self._log_lock:
+            if label is None:
+                self._summary[key] += 1
+            else:
+                self._summary[key].append(label)
+
+    def stage(self, target, name, inputs, outputs, action, upstream_changed=False):
+        """
+        Run `action(reason)` unless the stage already finished with the same
+        inputs and its outputs exist. The action returns 'incomplete' to have
+        the stage retried next run, and raises StageError on failure.
+        Returns True if the stage ran (with dry_run: would run).
+        """
+        input_hash = hash_value(inputs)
+        record = self.state.get(target, name)
+        if record is None:
+            reason = 'new'
+        elif self.force:
+            reason = 'forced'
+        elif record['input_hash'] != input_hash:
+            reason = 'changed'
+        elif record['status'] != 'ok':
+            reason = record['status']
+        elif not all(Path(path).exists() for path in outputs):
+            reason = 'output missing'
+        elif self.dry_run and upstream_changed:
+            reason = 'upstream'
+        else:
+            self._note('fresh')
+            return False
+
+        label = name if target == ARCHIVE else f"{name} {target}"
+        if self.dry_run:
+            self.log(f"  [PLAN] {label} ({reason})")
+            self._note('ran', label)
+            return True
+
+        start = time.monotonic()
+        try:
+            status = 'incomplete' if action(reason) == 'incomplete' else 'ok'
+        except Exception as e:
+            self.log(f"  [FAIL] {label}: {e}")
+            self._note('failed', label)
+            raise StageError(str(e)) from e
+        seconds = time.monotonic() - start
+        self.state.record(target, name, input_hash, outputs, status, seconds)
+        self.log(f"  [{name.upper()}] {'' if target == ARCHIVE else target + ' '}({reason}, {seconds:.1f}s)"
+                 + ('' if status == 'ok' else f" {status}"))
+        self._note('ran', label)
+        return True
+
+    def metadata(self, username, doc_slug):
+        """The reader3 document, revalidated when the cached copy is older than `refresh`."""
+        cache = self.downloader.metadata_cache
+        document = cache.get(username, doc_slug)
+        validated_at = cache.validated_at(username, doc_slug) or 0
+        if document is None or self.force or time.time() - validated_at > self.refresh:
+            if self.dry_run:
+                self.log(f"  [PLAN] metadata {doc_slug} ({'new' if document is None else 'revalidate'})")
+                return document or {}
+            document, _ = self.downloader.fetch_reader_data(username, doc_slug)
+        if not document or 'pages' not in document:
+            self._note('failed', f"metadata {doc_slug}")
+            raise StageError(f"{doc_slug}: no reader3 metadata")
+        return document
+
+    def build_pdf(self, pub, doc_slug, force):
+        pdf_path = self.downloader.download_publication(pub['url'], force=force, title=pub['title'])
+        if not pdf_path:
+            raise StageError("download failed")
+        missing = self.downloader.missing_pages.get(doc_slug)
+        if missing:
+            self.log(f"  ⚠ {doc_slug}: {len(missing)} pages missing, retried next run")
+            return 'incomplete'
+
+    def build_thumbnail(self, pdf_path, thumb_path):
+        from generate_thumbnails import generate_thumbnail
+
+        thumb_path.parent.mkdir(parents=True, exist_ok=True)
+        _, status, detail = generate_thumbnail(pdf_path, thumb_path)
+        if status == 'failed':
+            raise StageError(detail)
+
+    def build_publication(self, pub):
+        """
+        Run the stages of one publication. Returns a dict with its doc_slug,
+        PDF path, whether anything changed and whether all stages succeeded.
+        """
+        result = {'doc_slug': None, 'pdf': None, 'changed': False, 'ok': False}
+        url_info = self.downloader.parse_issuu_url(pub['url'])
+        if not url_info:
+            return result
+        username, doc_slug = url_info['username'], url_info['doc_slug']
+        pdf_path = self.downloader.output_dir / self.downloader.pdf_filename(doc_slug)
+        thumb_path = self.thumb_dir / f"{pdf_path.stem}.jpg"
+        result.update(doc_slug=doc_slug, pdf=pdf_path)
+        try:
+            document = self.metadata(username, doc_slug)
+            changed = self.stage(
+                doc_slug, 'pdf',
+                {
+                    'document': hash_value(document),
+                    'linearize': self.downloader.linearize,
+                    'recompress': self.downloader.recompress,
+                    'drop_blank': self.downloader.drop_blank,
+                    'drop_duplicates': self.downloader.drop_duplicates,
+                },
+                [pdf_path],
+                # A changed document or build option needs a rebuild, not just the missing pages
+                lambda reason: self.build_pdf(pub, doc_slug, force=reason in ('changed', 'forced')),
+            )
+            changed |= self.stage(
+                doc_slug, 'thumbnail',
+                {'pdf': self.state.file_hash(pdf_path)},
+                [thumb_path],
+                lambda reason: self.build_thumbnail(pdf_path, thumb_path),
+                upstream_changed=changed,
+            )
+        except StageError:
+            return result
+        result.update(changed=changed, ok=True)
+        return result
+
+    def build_archive(self, publications, results, upstream_changed):
+        """The archive-wide stages: publications.json, atlas and placeholders, search index, upload."""
+        from build_search_index import build_search_index
+        from generate_thumbnails import ATLAS_IMAGE, ATLAS_MAP, build_atlas
+
+        catalog = self.downloader.catalog
+        cache = self.downloader.metadata_cache
+        built = [result for result in results if result['doc_slug']]
+
+        changed = self.stage(
+            ARCHIVE, 'export',
+            {
+                'publications': [[pub['title'], pub['url']] for pub in publications],
+                'pdfs': {result['doc_slug']: self.state.file_hash(result['pdf']) for result in built},
+                'pages': {
+                    result['doc_slug']: cache.page_count(self.downloader.parse_issuu_url(pub['url'])['username'],
+                                                         result['doc_slug'])
+                    for pub, result in zip(publications, results) if result['doc_slug']
+                },
+            },
+            [catalog.json_path],
+            lambda reason: self.downloader.export_for_website(),
+            upstream_changed=upstream_changed,
+        )
+
+        thumbnails = {
+            path.stem: self.state.file_hash(path)
+            for path in sorted(self.thumb_dir.glob('*.jpg')) if path != ATLAS_IMAGE
+        }
+        if thumbnails:
+            changed |= self.stage(
+                ARCHIVE, 'atlas',
+                # Placeholders go to catalog entries, so new entries need them too
+                {'thumbnails': thumbnails, 'catalog': sorted(pub['id'] for pub in catalog.all())},
+                [ATLAS_IMAGE, ATLAS_MAP],
+                lambda reason: build_atlas(force=True),
+                upstream_changed=upstream_changed or changed,
+            )
+
+        changed |= self.stage(
+            ARCHIVE, 'search-index',
+            {'publications': self.state.file_hash(catalog.json_path)},
+            [self.index_dir / 'index.json'],
+            lambda reason: build_search_index(catalog.json_path, self.index_dir, force=self.force),
+            upstream_changed=upstream_changed or changed,
+        )
+
+        if self.upload:
+            from r2_sync import local_files
+
+            files = {key: self.state.file_hash(path) for key, path in local_files().items()}
+            self.stage(
+                ARCHIVE, 'upload',
+                {'bucket': self.upload['bucket'], 'files': files},
+                [],
+                lambda reason: self.run_upload(),
+                upstream_changed=upstream_changed or changed,
+            )
+
+    def run_upload(self):
+        from r2_sync import make_client, sync
+        from verify_pdfs import verify_all
+
+        # Never publish a broken PDF: the integrity check gates every upload
+        report = verify_all(self.downloader.output_dir, self.downloader.catalog)
+        if report['refetch']:
+            broken = ', '.join(item['id'] for item in report['refetch'])
+            raise StageError(f"verification failed, not uploading: {broken}")
+
+        client = make_client(self.upload.get('endpoint_url'))
+        if not sync(client, self.upload['bucket'], jobs=self.upload.get('jobs', 4)):
+            raise StageError("some uploads failed")
+
+    def run(self):
+        """
+        One build of everything that is out of date. Returns a summary dict with
+        the stages that ran, how many were up to date, the failed ones and the duration.
+        """
+        from profile_crawler import CrawlError
+
+        start = time.monotonic()
+        self._summary = {'ran': [], 'fresh': 0, 'failed': []}
+        if self.discover and not self.dry_run:
+            try:
+                new = self.downloader.discover_publications()
+                if new:
+                    self.log(f"  {len(new)} new publications on the profile")
+            except CrawlError as e:
+                self.log(f"  Profile crawl failed, using the last known list: {e}")
+        publications = self.downloader.get_publication_list()
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            results = list(executor.map(self.build_publication, publications))
+        try:
+            self.build_archive(publications, results, upstream_changed=any(r['changed'] for r in results))
+        except StageError:
+            pass
+        self.downloader.page_cache.evict()
+
+        summary = dict(self._summary, seconds=time.monotonic() - start, publications=len(publications))
+        verb = 'would run' if self.dry_run else 'ran'
+        self.log(f"Build {'planned' if self.dry_run else 'finished'} in {summary['seconds']:.1f}s: "
+                 f"{len(summary['ran'])} stages {verb}, {summary['fresh']} up to date, "
+                 f"{len(summary['failed'])} failed")
+        for label in summary['failed']:
+            self.log(f"  ✗ {label}")
+        return summary
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description='Rebuild only the stale parts of the archive: PDFs, thumbnails, catalog and search index',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Show which stages are out of date, without building anything
+  python pipeline.py --dry-run
+
+  # Bring the archive up to date, 4 publications at a time
+  python pipeline.py --jobs 4
+
+  # Keep syncing: look for new issues every 15 minutes and upload changes to R2
+  python pipeline.py --watch 900 --upload
+        """
+    )
+    parser.add_argument('--jobs', '-j', type=int, default=2, help='Publications built at once (default: 2)')
+    parser.add_argument('--page-workers', type=int, default=4, help='Concurrent page downloads per publication (default: 4)')
+    parser.add_argument('--refresh', type=float, default=DEFAULT_REFRESH,
+                        help=f'Revalidate reader3 metadata older than this many hours (default: {DEFAULT_REFRESH})')
+    parser.add_argument('--no-discover', action='store_true', help='Do not crawl the Issuu profile for new uploads')
+    parser.add_argument('--linearize', action='store_true', help='Build linearized PDFs; needs pikepdf')
+    parser.add_argument('--recompress', action='store_true', help='Re-encode pages by content; needs numpy')
+    parser.add_argument('--drop-blank', action='store_true', help='Leave blank pages out of the PDFs; needs numpy')
+    parser.add_argument('--drop-duplicates', action='store_true', help='Leave pages identical to an earlier page out')
+    parser.add_argument('--upload', action='store_true', help='Finish with an R2 sync (see r2_sync.py); needs boto3')
+    parser.add_argument('--bucket', default=R2_BUCKET, help=f'R2 bucket for --upload (default: {R2_BUCKET})')
+    parser.add_argument('--endpoint-url', help='S3 endpoint for --upload (default: R2 endpoint of R2_ACCOUNT_ID)')
+    parser.add_argument('--watch', type=float, metavar='SECONDS', help='Repeat the build every SECONDS until stopped')
+    parser.add_argument('--dry-run', '-n', action='store_true', help='Only show the stages that would run')
+    parser.add_argument('--force', action='store_true', help='Run every stage, even if it is up to date')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Show the downloader output')
+    args = parser.parse_args(argv)
+
+    from issuu_downloader import IssuuDownloader
+
+    downloader = IssuuDownloader(
+        output_dir=PDF_DIR,
+        verbose=args.verbose,
+        page_workers=args.page_workers,
+        linearize=args.linearize,
+        recompress=args.recompress,
+        drop_blank=args.drop_blank,
+        drop_duplicates=args.drop_duplicates,
+    )
+    pipeline = Pipeline(
+        downloader,
+        BuildState(PDF_DIR / 'pipeline.sqlite'),
+        jobs=args.jobs,
+        refresh=args.refresh * 3600,
+        discover=not args.no_discover,
+        upload={'bucket': args.bucket, 'endpoint_url': args.endpoint_url} if args.upload else None,
+        dry_run=args.dry_run,
+        force=args.force,
+    )
+
+    if not args.watch:
+        summary = pipeline.run()
+        sys.exit(1 if summary['failed'] else 0)
+
+    # Finish the current build on SIGTERM, then stop
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    try:
+        while not stop.is_set():
+            pipeline.run()
+            pipeline.force = False
+            stop.wait(args.watch)
+    except KeyboardInterrupt:
+        print("\nStopped")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Incremental crawler for the publication listing of an Issuu profile.
+
+The profile page loads its documents newest first from a paginated JSON
+listing (offset/limit). A full crawl fetches every listing page, the first
+one alone and the rest concurrently. An incremental crawl stops at the first
+document it already knows, so a nightly run with nothing new costs a single
+request. Discovered documents and the crawl state of each profile are kept
+in SQLite; a full crawl is forced when none has completed yet or the last
+one is older than FULL_CRAWL_INTERVAL, to pick up back-dated uploads.
+"""
+
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlencode, urlparse
+
+# Listing endpoint used by issuu.com profile pages
+PROFILE_API_BASE = "https://issuu.com"
+PROFILE_API_PATH = "/call/profile/v1/documents/{username}"
+PAGE_SIZE = 25
+FULL_CRAWL_INTERVAL = 30 * 24 * 3600  # seconds
+# Safety stop for listings that never report their end
+MAX_PAGES = 400
+
+DOC_URI = re.compile(r'(?:^|/)(?P<username>[^/]+)/docs/(?P<doc_slug>[^/?#]+)')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    username TEXT NOT NULL,
+    doc_slug TEXT NOT NULL,
+    title TEXT NOT NULL,
+    published TEXT,
+    first_seen REAL NOT NULL,
+    position INTEGER NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (username, doc_slug)
+);
+CREATE TABLE IF NOT EXISTS profiles (
+    username TEXT PRIMARY KEY,
+    last_crawl REAL,
+    last_full_crawl REAL,
+    last_mode TEXT,
+    last_requests INTEGER,
+    last_new INTEGER,
+    reported_total INTEGER
+);
+"""
+
+
+class CrawlError(Exception):
+    """A listing page could not be fetched or parsed."""
+
+
+def profile_username(profile_url):
+    """Username of an Issuu profile URL (or a bare username)."""
+    path = urlparse(profile_url).path if '://' in profile_url else profile_url
+    return path.strip('/').split('/')[0]
+
+
+def parse_item(item):
+    """A listing item as {'doc_slug', 'title', 'published'}, or None if it is not a document."""
+    uri = item.get('uri') or item.get('documentUri') or item.get('url') or ''
+    match = DOC_URI.search(uri)
+    doc_slug = match['doc_slug'] if match else item.get('slug') or item.get('name')
+    if not doc_slug:
+        return None
+    return {
+        'doc_slug': doc_slug,
+        'title': (item.get('title') or doc_slug).strip(),
+        'published': item.get('publishDate') or item.get('publishedAt'),
+    }
+
+
+class PublicationIndex:
+    """SQLite record of discovered documents and the crawl state of each profile."""
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def known_slugs(self, username):
+        return {row[0] for row in self._execute('SELECT doc_slug FROM documents WHERE username = ?', (username,))}
+
+    def state(self, username):
+        """Crawl state of a profile as a dict, or None if it was never crawled."""
+        rows = self._execute(
+            'SELECT last_crawl, last_full_crawl, last_mode, last_requests, last_new, reported_total '
+            'FROM profiles WHERE username = ?', (username,)
+        )
+        if not rows:
+            return None
+        keys = ('last_crawl', 'last_full_crawl', 'last_mode', 'last_requests', 'last_new', 'reported_total')
+        return dict(zip(keys, rows[0]))
+
+    def record_crawl(self, username, documents, mode, requests, reported_total=None):
+        """
+        Store the documents of one crawl (in listing order, newest first) and the
+        profile's crawl state. Returns the documents that were not known before.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                known = {row[0] for row in self._conn.execute(
+                    'SELECT doc_slug FROM documents WHERE username = ?', (username,))}
+                new = [doc for doc in documents if doc['doc_slug'] not in known]
+                for position, doc in enumerate(documents):
+                    # first_seen and position only change for new documents, which keeps the order stable
+                    self._conn.execute(
+                        'INSERT INTO documents (username, doc_slug, title, published, first_seen, position, last_seen) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?) '
+                        'ON CONFLICT (username, doc_slug) DO UPDATE SET '
+                        'title = excluded.title, published = COALESCE(excluded.published, published), '
+                        'last_seen = excluded.last_seen',
+                        (username, doc['doc_slug'], doc['title'], doc['published'], now, position, now)
+                    )
+                self._conn.execute(
+                    'INSERT INTO profiles (username, last_crawl, last_full_crawl, last_mode, last_requests, last_new, '
+                    'reported_total) VALUES (?, ?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT (username) DO UPDATE SET last_crawl = excluded.last_crawl, '
+                    'last_full_crawl = COALESCE(excluded.last_full_crawl, last_full_crawl), '
+                    'last_mode = excluded.last_mode, last_requests = excluded.last_requests, '
+                    'last_new = excluded.last_new, '
+                    'reported_total = COALESCE(excluded.reported_total, reported_total)',
+                    (username, now, now if mode == 'full' else None, mode, requests, len(new), reported_total)
+                )
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+        return new
+
+    def publications(self, username):
+        """Discovered documents of a profile, newest first, as {'title', 'url'} dicts."""
+        rows = self._execute(
+            'SELECT doc_slug, title FROM documents WHERE username = ? '
+            'ORDER BY first_seen DESC, position ASC', (username,)
+        )
+        return [{'title': title, 'url': f"https://issuu.com/{username}/docs/{doc_slug}"} for doc_slug, title in rows]
+
+
+class ProfileCrawler:
+    """Crawls profile listings through a Transport (rate limiting, retries)."""
+
+    def __init__(self, transport, index, api_base=PROFILE_API_BASE, page_size=PAGE_SIZE,
+                 concurrency=4, log=None):
+        self.transport = transport
+        self.index = index
+        self.api_base = api_base.rstrip('/')
+        self.page_size = page_size
+        self.concurrency = max(1, concurrency)
+        self.log = log or (lambda message: None)
+
+    def listing_url(self, username, page):
+        query = urlencode({'offset': page * self.page_size, 'limit': self.page_size})
+        return f"{self.api_base}{PROFILE_API_PATH.format(username=username)}?{query}"
+
+    def fetch_page(self, username, page):
+        """Return (documents, has_more, reported_total) of one listing page."""
+        url = self.listing_url(username, page)
+        try:
+            response = self.transport.get(url, timeout=30)
+            if response.status_code != 200:
+                raise CrawlError(f"{url}: HTTP {response.status_code}")
+            data = response.json()
+        except CrawlError:
+            raise
+        except Exception as e:
+            raise CrawlError(f"{url}: {e}")
+
+        items = data.get('items') or data.get('documents') or []
+        documents = [doc for doc in (parse_item(item) for item in items) if doc]
+        total = data.get('totalCount', data.get('count'))
+        has_more = data.get('hasMore')
+        if has_more is None:
+            has_more = len(items) >= self.page_size
+        return documents, bool(has_more) and bool(items), total
+
+    def _fetch_many(self, username, pages):
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(pages))) as executor:
+            return list(executor.map(lambda page: self.fetch_page(username, page), pages))
+
+    def crawl(self, username, full=False):
+        """
+        Discover new documents of `username`. Incremental unless `full` is set or a
+        full crawl is due. Returns a summary dict with the new documents, in listing order.
+        """
+        state = self.index.state(username)
+        if not state or not state['last_full_crawl'] or time.time() - state['last_full_crawl'] > FULL_CRAWL_INTERVAL:
+            full = True
+        known = set() if full else self.index.known_slugs(username)
+
+        documents, has_more, total = self.fetch_page(username, 0)
+        requests = 1
+        next_page = 1
+        stop = not has_more or (not full and any(doc['doc_slug'] in known for doc in documents))
+
+        if full and has_more and total:
+            # The listing told us its size: fetch all remaining pages at once
+            last_page = min(MAX_PAGES, -(-int(total) // self.page_size))
+            pages = list(range(1, last_page))
+            for page_documents, _, _ in self._fetch_many(username, pages) if pages else []:
+                documents.extend(page_documents)
+            requests += len(pages)
+            stop = True
+
+        while not stop and next_page < MAX_PAGES:
+            # Incremental runs usually stop on the first page; when they don't, the
+            # reported total tells how many pages the new uploads span
+            width = self.concurrency
+            if not full and total:
+                pages_needed = -(-(int(total) - len(known) + 1) // self.page_size)
+                width = max(1, min(width, pages_needed - next_page))
+            pages = list(range(next_page, min(MAX_PAGES, next_page + width)))
+            for page_documents, page_has_more, _ in self._fetch_many(username, pages):
+                documents.extend(page_documents)
+                if not page_has_more or (not full and any(doc['doc_slug'] in known for doc in page_documents)):
+                    stop = True
+                    break
+            requests += len(pages)
+            next_page = pages[-1] + 1
+
+        # Drop duplicates (listings can shift while they are paged) and, on
+        # incremental runs, everything from the first known document on
+        seen = set()
+        listed = []
+        for doc in documents:
+            if doc['doc_slug'] in known:
+                break
+            if doc['doc_slug'] not in seen:
+                seen.add(doc['doc_slug'])
+                listed.append(doc)
+
+        mode = 'full' if full else 'incremental'
+        new = self.index.record_crawl(username, listed, mode, requests, total)
+        self.log(f"  {mode.capitalize()} crawl of {username}: {requests} requests, "
+                 f"{len(listed)} listed, {len(new)} new")
+        return {'mode': mode, 'requests': requests, 'listed': len(listed), 'new': new}
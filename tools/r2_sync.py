@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Upload PDFs, thumbnails and page tiles to Cloudflare R2, sending only what changed.
+Requires: pip install boto3
+
+The bucket listing is compared with the local files by size and ETag. Plain
+uploads have the MD5 as ETag, and multipart uploads have the MD5 of the part
+MD5s with a "-<parts>" suffix; both are recomputed locally with the same part
+size used for uploading. Only new or changed files are sent, several at a
+time, and large files go up as concurrent multipart uploads. Every object
+gets a proper Content-Type and a long-lived Cache-Control header.
+
+Credentials come from R2_ACCESS_KEY_ID / R2_SECRET_ACCESS_KEY (or the usual
+AWS_* variables). The endpoint is https://<R2_ACCOUNT_ID>.r2.cloudflarestorage.com
+unless --endpoint-url is given; point it at fake_s3.py to try things locally.
+
+Usage:
+  python r2_sync.py --dry-run
+  python r2_sync.py --jobs 8
+  python r2_sync.py --endpoint-url http://127.0.0.1:9000
+"""
+
+import argparse
+import fnmatch
+import hashlib
+import mimetypes
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from himmah.config import PDF_DIR, R2_BUCKET as DEFAULT_BUCKET, THUMB_DIR, TILES_DIR
+
+# (local directory, file patterns, key prefix); keys match the URLs app.js builds
+SOURCES = [
+    (PDF_DIR, ('*.pdf',), ''),
+    (THUMB_DIR, ('*.jpg', '*.json'), 'thumbnails/'),
+    (TILES_DIR, ('*.jpg', '*.json'), 'tiles/'),
+]
+
+# First matching key pattern wins
+CACHE_CONTROL = [
+    ('thumbnails/atlas.json', 'public, max-age=300'),       # points at the current atlas version
+    ('tiles/*/manifest.json', 'public, max-age=3600'),
+    ('thumbnails/atlas.jpg', 'public, max-age=31536000, immutable'),  # requested with ?v=<version>
+    ('*', 'public, max-age=2592000'),
+]
+CONTENT_TYPES = {'.pdf': 'application/pdf', '.jpg': 'image/jpeg', '.json': 'application/json'}
+
+MULTIPART_THRESHOLD = 16 * 1024 * 1024
+PART_SIZE = 8 * 1024 * 1024
+
+
+def cache_control(key):
+    for pattern, value in CACHE_CONTROL:
+        if fnmatch.fnmatch(key, pattern):
+            return value
+    return None
+
+
+def content_type(path):
+    return CONTENT_TYPES.get(path.suffix.lower()) or mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+
+
+def local_etag(path, size):
+    """The ETag S3/R2 reports for this file when uploaded with our multipart settings."""
+    part_digests = []
+    whole = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(PART_SIZE), b''):
+            if size < MULTIPART_THRESHOLD:
+                whole.update(chunk)
+            else:
+                part_digests.append(hashlib.md5(chunk).digest())
+    if size < MULTIPART_THRESHOLD:
+        return whole.hexdigest()
+    return f"{hashlib.md5(b''.join(part_digests)).hexdigest()}-{len(part_digests)}"
+
+
+def local_files(sources=SOURCES):
+    """Map of object key -> local path for everything that should be in the bucket."""
+    files = {}
+    for directory, patterns, prefix in sources:
+        if not directory.is_dir():
+            continue
+        for path in sorted(directory.rglob('*')):
+            if not path.is_file() or path.name.startswith('.'):
+                continue
+            if not any(fnmatch.fnmatch(path.name, pattern) for pattern in patterns):
+                continue
+            files[prefix + path.relative_to(directory).as_posix()] = path
+    return files
+
+
+def make_client(endpoint_url=None, account_id=None):
+    import boto3
+    from botocore.config import Config
+
+    if not endpoint_url:
+        account_id = account_id or os.environ.get('R2_ACCOUNT_ID')
+        if not account_id:
+            raise SystemExit("Set R2_ACCOUNT_ID (or pass --endpoint-url)")
+        endpoint_url = f"https://{account_id}.r2.cloudflarestorage.com"
+    return boto3.client(
+        's3',
+        endpoint_url=endpoint_url,
+        aws_access_key_id=os.environ.get('R2_ACCESS_KEY_ID') or os.environ.get('AWS_ACCESS_KEY_ID'),
+        aws_secret_access_key=os.environ.get('R2_SECRET_ACCESS_KEY') or os.environ.get('AWS_SECRET_ACCESS_KEY'),
+        region_name='auto',
+        config=Config(
+            max_pool_connections=32,
+            retries={'max_attempts': 5, 'mode': 'adaptive'},
+            s3={'addressing_style': 'path'},
+            # R2 does not accept the newer default CRC checksums on every operation
+            request_checksum_calculation='when_required',
+            response_checksum_validation='when_required',
+        ),
+    )
+
+
+def remote_objects(client, bucket, prefixes):
+    """Map of key -> (size, etag) for the managed prefixes of the bucket."""
+    objects = {}
+    paginator = client.get_paginator('list_objects_v2')
+    # The root prefix ('' for PDFs) covers everything, so list once in that case
+    for prefix in ([''] if '' in prefixes else prefixes):
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for item in page.get('Contents', []):
+                objects[item['Key']] = (item['Size'], item['ETag'].strip('"'))
+    return objects
+
+
+def plan(files, remote, hash_workers=4):
+    """
+    Return (uploads, unchanged) where uploads lists (key, path, reason).
+    Files are only hashed when their size matches the remote object.
+    """
+    uploads = []
+    unchanged = []
+    to_hash = []
+    for key, path in files.items():
+        size = path.stat().st_size
+        if key not in remote:
+            uploads.append((key, path, 'new'))
+        elif remote[key][0] != size:
+            uploads.append((key, path, 'size'))
+        else:
+            to_hash.append((key, path, size))
+
+    with ThreadPoolExecutor(max_workers=hash_workers) as executor:
+        etags = executor.map(lambda item: local_etag(item[1], item[2]), to_hash)
+        for (key, path, _), etag in zip(to_hash, etags):
+            if etag == remote[key][1]:
+                unchanged.append(key)
+            else:
+                uploads.append((key, path, 'content'))
+    return sorted(uploads), unchanged
+
+
+def upload(client, bucket, key, path, transfer_config):
+    client.upload_file(
+        str(path), bucket, key,
+        ExtraArgs={'ContentType': content_type(path), 'CacheControl': cache_control(key)},
+        Config=transfer_config,
+    )
+    return path.stat().st_size
+
+
+def sync(client, bucket, sources=SOURCES, jobs=4, part_jobs=4, dry_run=False, delete=False):
+    """Upload new and changed files; with `delete`, remove objects that no longer exist locally."""
+    from boto3.s3.transfer import TransferConfig
+
+    files = local_files(sources)
+    prefixes = sorted({prefix for directory, _, prefix in sources if directory.is_dir()})
+    remote = remote_objects(client, bucket, prefixes)
+    print(f"Local files: {len(files)}, objects in {bucket}: {len(remote)}")
+
+    uploads, unchanged = plan(files, remote)
+    # Only objects under our own prefixes are candidates, and '' only for top-level files
+    stale = sorted(
+        key for key in remote
+        if key not in files and any(key.startswith(p) and (p or '/' not in key) for p in prefixes)
+    )
+    total_bytes = sum(path.stat().st_size for _, path, _ in uploads)
+    print(f"  {len(unchanged)} unchanged, {len(uploads)} to upload ({total_bytes / (1024 * 1024):.1f} MB)"
+          + (f", {len(stale)} to delete" if delete else f", {len(stale)} remote-only"))
+
+    if dry_run:
+        for key, _, reason in uploads:
+            print(f"  [{reason.upper():7}] {key}")
+        for key in stale if delete else []:
+            print(f"  [DELETE ] {key}")
+        return True
+
+    transfer_config = TransferConfig(
+        multipart_threshold=MULTIPART_THRESHOLD,
+        multipart_chunksize=PART_SIZE,
+        max_concurrency=part_jobs,
+    )
+    start = time.monotonic()
+    sent = 0
+    failed = 0
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {
+            executor.submit(upload, client, bucket, key, path, transfer_config): (key, reason)
+            for key, path, reason in uploads
+        }
+        for future in as_completed(futures):
+            key, reason = futures[future]
+            try:
+                size = future.result()
+            except Exception as e:
+                print(f"  [FAIL] {key}: {e}")
+                failed += 1
+                continue
+            sent += size
+            print(f"  [{reason.upper():7}] {key} ({size / 1024:.0f} KB)")
+
+    if delete and stale:
+        for i in range(0, len(stale), 1000):
+            batch = stale[i:i + 1000]
+            client.delete_objects(Bucket=bucket, Delete={'Objects': [{'Key': k} for k in batch], 'Quiet': True})
+        print(f"  Deleted {len(stale)} objects")
+
+    elapsed = time.monotonic() - start
+    print(f"\nDone! Uploaded {len(uploads) - failed} files, {sent / (1024 * 1024):.1f} MB in {elapsed:.1f}s"
+          f" ({sent / (1024 * 1024) / elapsed if elapsed else 0:.1f} MB/s), failed: {failed}")
+    return failed == 0
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description='Upload new and changed PDFs, thumbnails and tiles to R2',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Show what would be uploaded
+  python r2_sync.py --dry-run
+
+  # Upload 8 files at a time and remove objects whose local file is gone
+  python r2_sync.py --jobs 8 --delete
+
+  # Against a local stand-in (python fake_s3.py --port 9000)
+  python r2_sync.py --endpoint-url http://127.0.0.1:9000
+        """
+    )
+    parser.add_argument('--bucket', default=DEFAULT_BUCKET, help=f'Bucket name (default: {DEFAULT_BUCKET})')
+    parser.add_argument('--endpoint-url', help='S3 endpoint (default: R2 endpoint of R2_ACCOUNT_ID)')
+    parser.add_argument('--jobs', '-j', type=int, default=4, help='Files uploaded at once (default: 4)')
+    parser.add_argument('--part-jobs', type=int, default=4, help='Concurrent parts per multipart upload (default: 4)')
+    parser.add_argument('--dry-run', '-n', action='store_true', help='Only show what would change')
+    parser.add_argument('--delete', action='store_true', help='Delete bucket objects that no longer exist locally')
+    args = parser.parse_args(argv)
+
+    try:
+        import boto3  # noqa: F401
+    except ImportError:
+        print("Please install required packages:")
+        print("  pip install boto3")
+        exit(1)
+
+    client = make_client(args.endpoint_url)
+    ok = sync(client, args.bucket, jobs=args.jobs, part_jobs=args.part_jobs, dry_run=args.dry_run, delete=args.delete)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Shrink scanned PDFs by re-encoding every page for what it actually shows.
+Requires: pip install numpy Pillow (pikepdf for linearized input)
+
+Issuu serves every page as an RGB JPEG, also the many 1970s-2000s scans
+that are really grayscale or black-and-white. Each page is classified from
+vectorized NumPy statistics:
+
+  color    chroma remains after removing the paper tint -> RGB JPEG
+  gray     no real color                                -> single-channel JPEG
+  bilevel  gray with almost no midtones (text, line art) -> CCITT Group 4
+
+The JPEG quality is picked per page by bisection: the lowest quality up to
+--max-quality whose luminance SSIM against the original reaches --ssim.
+A page keeps its original bytes unless the new encoding is at least
+MIN_SAVING smaller. Rewritten PDFs carry a /HimmahRecompress entry with the
+settings, so re-runs skip them, and linearized input is linearized again.
+
+PDFs with an OCR text layer are skipped; recompress before ocr_pages.py.
+
+Usage:
+  python recompress_pdfs.py
+  python recompress_pdfs.py --ssim 0.97 --max-quality 80 --report savings.json
+"""
+
+import argparse
+import io
+import json
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from himmah.config import PDF_DIR
+from pdf_reader import PDFFormatError, PDFReader, image_filters
+from pdf_writer import StreamingPDFWriter, encode_ccitt_g4, is_linearized, linearize_pdf
+
+DEFAULT_SSIM = 0.95
+DEFAULT_MAX_QUALITY = 85
+MIN_QUALITY = 40
+# Keep the original page unless re-encoding saves at least this fraction
+MIN_SAVING = 0.05
+
+# Classification samples at most this many pixels along the long side
+SAMPLE_SIZE = 512
+# Brightness percentile taken as the paper color
+PAPER_PERCENTILE = 95
+# Pixels whose chroma (after removing the paper tint) exceeds this are colored...
+COLOR_CHROMA = 24
+# ...and a page with more than this fraction of colored pixels is a color page
+COLOR_FRACTION = 0.005
+# A gray page is bilevel if midtones are at most this fraction of its non-paper
+# pixels (text has them only at stroke edges) and of the whole page (no photos)
+MIDTONES = (48, 208)
+BILEVEL_EDGE_RATIO = 0.45
+BILEVEL_MIDTONES = 0.12
+# Thresholding small type makes it ragged; narrower pages stay gray JPEGs
+BILEVEL_MIN_WIDTH = 1200
+
+MARKER = 'HimmahRecompress'
+
+
+def classify(img):
+    """'color', 'gray' or 'bilevel' for a decoded page image."""
+    # Nearest-neighbour sampling: averaging would blur text edges into midtones
+    scale = min(1.0, SAMPLE_SIZE / max(img.size))
+    sample = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.NEAREST)
+    if sample.mode not in ('L', '1'):
+        rgb = np.asarray(sample.convert('RGB'), dtype=np.float32)
+        # Yellowed paper or a scanner cast scales every pixel alike; white-balance
+        # each channel on the paper so that tint is not mistaken for color
+        paper = np.maximum(np.percentile(rgb.reshape(-1, 3), PAPER_PERCENTILE, axis=0), 1.0)
+        rgb = rgb * (paper.mean() / paper)
+        luma = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+        colored = np.abs(rgb - luma[..., None]).max(axis=2) > COLOR_CHROMA
+        if colored.mean() > COLOR_FRACTION:
+            return 'color'
+    else:
+        luma = np.asarray(sample.convert('L'), dtype=np.float32)
+
+    midtones = ((luma > MIDTONES[0]) & (luma < MIDTONES[1])).mean()
+    ink = (luma <= MIDTONES[0]).mean()
+    if (img.width >= BILEVEL_MIN_WIDTH and midtones < BILEVEL_MIDTONES
+            and midtones <= BILEVEL_EDGE_RATIO * (midtones + ink)):
+        return 'bilevel'
+    return 'gray'
+
+
+def otsu_threshold(gray):
+    """Otsu's threshold of a uint8 array."""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256)
+    weight = np.cumsum(hist)
+    mean = np.cumsum(hist * levels)
+    total, total_mean = weight[-1], mean[-1]
+    background = total - weight
+    with np.errstate(divide='ignore', invalid='ignore'):
+        between = (total_mean * weight - mean * total) ** 2 / (weight * background)
+    return int(np.nanargmax(between[:-1]))
+
+
+def ssim(a, b, block=8):
+    """Mean SSIM of two equally sized grayscale arrays over non-overlapping blocks."""
+    h, w = a.shape[0] // block * block, a.shape[1] // block * block
+    shape = (h // block, block, w // block, block)
+    a = a[:h, :w].astype(np.float32).reshape(shape)
+    b = b[:h, :w].astype(np.float32).reshape(shape)
+    mu_a, mu_b = a.mean(axis=(1, 3)), b.mean(axis=(1, 3))
+    var_a, var_b = a.var(axis=(1, 3)), b.var(axis=(1, 3))
+    cov = ((a - mu_a[:, None, :, None]) * (b - mu_b[:, None, :, None])).mean(axis=(1, 3))
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    index = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / ((mu_a ** 2 + mu_b ** 2 + c1) * (var_a + var_b + c2))
+    return float(index.mean())
+
+
+def encode_jpeg(img, quality):
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def encode_to_target(img, reference, ssim_target, max_quality):
+    """
+    Smallest JPEG of `img` whose luminance SSIM against `reference` reaches
+    `ssim_target`, or None if even `max_quality` does not.
+    """
+    def attempt(quality):
+        data = encode_jpeg(img, quality)
+        with Image.open(io.BytesIO(data)) as decoded:
+            return data, ssim(reference, np.asarray(decoded.convert('L')))
+
+    best, score = attempt(max_quality)
+    if score < ssim_target:
+        return None
+    low, high = MIN_QUALITY, max_quality - 1
+    while low <= high:
+        quality = (low + high) // 2
+        data, score = attempt(quality)
+        if score >= ssim_target:
+            best, high = data, quality - 1
+        else:
+            low = quality + 1
+    return best
+
+
+def recompress_page(raw, ssim_target=DEFAULT_SSIM, max_quality=DEFAULT_MAX_QUALITY, bilevel=True):
+    """
+    Re-encode one page JPEG. Returns (kind, encoding, data) where encoding is
+    'jpeg' or 'ccitt' and kind is the page class, or 'kept' with the original bytes.
+    """
+    with Image.open(io.BytesIO(raw)) as img:
+        img.load()
+    kind = classify(img)
+    if kind == 'bilevel' and not bilevel:
+        kind = 'gray'
+    gray = np.asarray(img.convert('L'))
+    limit = len(raw) * (1 - MIN_SAVING)
+
+    if kind == 'bilevel':
+        data = encode_ccitt_g4(gray < otsu_threshold(gray))
+        if len(data) <= limit:
+            return kind, 'ccitt', data
+        kind = 'gray'
+
+    source = img.convert('L') if kind == 'gray' else img.convert('RGB')
+    data = encode_to_target(source, gray, ssim_target, max_quality)
+    if data is not None and len(data) <= limit:
+        return kind, 'jpeg', data
+    return 'kept', 'jpeg', raw
+
+
+def settings_marker(ssim_target, max_quality, bilevel):
+    return f"ssim={ssim_target} max-quality={max_quality} bilevel={'on' if bilevel else 'off'}"
+
+
+def page_dpi(page, width, height):
+    """Resolution that reproduces the page's MediaBox, or None to use the JPEG's own."""
+    box = page.get('MediaBox')
+    if not isinstance(box, list) or len(box) != 4:
+        return None
+    page_w, page_h = float(box[2]) - float(box[0]), float(box[3]) - float(box[1])
+    if page_w <= 0 or page_h <= 0:
+        return None
+    return width * 72.0 / page_w, height * 72.0 / page_h
+
+
+def recompress_pdf(pdf_path, ssim_target=DEFAULT_SSIM, max_quality=DEFAULT_MAX_QUALITY, bilevel=True, force=False):
+    """
+    Rewrite `pdf_path` with re-encoded pages.
+    Returns a dict with status ('done', 'unchanged' or 'skipped (...)'),
+    bytes before/after and page counts per kind.
+    """
+    pdf_path = Path(pdf_path)
+    marker = settings_marker(ssim_target, max_quality, bilevel)
+    before = pdf_path.stat().st_size
+    result = {'name': pdf_path.name, 'status': 'done', 'before': before, 'after': before, 'pages': Counter()}
+    out_path = pdf_path.with_name(pdf_path.stem + '.recompressed.pdf')
+    linearized = is_linearized(pdf_path)
+
+    with PDFReader(pdf_path) as reader:
+        info = reader.resolve(reader.trailer.get('Info')) or {}
+        if 'HimmahOCR' in info:
+            result['status'] = 'skipped (has OCR text layer)'
+            return result
+        recorded = info.get(MARKER)
+        if not force and recorded is not None and recorded.decode('ascii', 'replace') == marker:
+            result['status'] = 'unchanged'
+            return result
+
+        try:
+            with StreamingPDFWriter(out_path, info={MARKER: marker}) as writer:
+                for page in reader.iter_pages():
+                    resources = reader.resolve(page.get('Resources')) or {}
+                    if 'Font' in resources:
+                        raise PDFFormatError("page has text; recompress before adding a text layer")
+                    image = reader.main_image(page)
+                    if image is None:
+                        raise PDFFormatError("page without image")
+                    dictionary, raw = image
+                    width = reader.resolve(dictionary.get('Width'))
+                    height = reader.resolve(dictionary.get('Height'))
+                    dpi = page_dpi(page, width, height)
+                    filters = image_filters(dictionary)
+
+                    if filters == ['CCITTFaxDecode']:
+                        # Already bilevel from an earlier run
+                        writer.add_ccitt_page(bytes(raw), width, height, dpi)
+                        result['pages']['bilevel'] += 1
+                        continue
+                    if filters != ['DCTDecode']:
+                        raise PDFFormatError(f"unsupported page image filter {filters}")
+
+                    kind, encoding, data = recompress_page(bytes(raw), ssim_target, max_quality, bilevel)
+                    if encoding == 'ccitt':
+                        writer.add_ccitt_page(data, width, height, dpi)
+                    else:
+                        writer.add_jpeg_page(data, dpi=dpi)
+                    result['pages'][kind] += 1
+        except BaseException:
+            out_path.unlink(missing_ok=True)
+            raise
+
+    if linearized:
+        linearize_pdf(out_path)
+    out_path.replace(pdf_path)
+    result['after'] = pdf_path.stat().st_size
+    return result
+
+
+def recompress_one(pdf_path, options):
+    """Worker: recompress_pdf() that reports errors as a status instead of raising."""
+    try:
+        return recompress_pdf(pdf_path, **options)
+    except Exception as e:
+        size = Path(pdf_path).stat().st_size
+        return {'name': Path(pdf_path).name, 'status': f"failed: {e}", 'before': size, 'after': size, 'pages': Counter()}
+
+
+def recompress_all(pdf_dir=PDF_DIR, workers=None, cache_dir=None, report_path=None, **options):
+    pdf_dir = Path(pdf_dir)
+    pdf_files = sorted(p for p in pdf_dir.glob("*.pdf") if not p.name.endswith('.recompressed.pdf'))
+    print(f"Found {len(pdf_files)} PDF files in {pdf_dir}")
+
+    # Keep the downloader's record of each PDF and the catalog's file sizes current
+    from catalog import Catalog
+    from page_cache import PageCache
+    cache_dir = Path(cache_dir) if cache_dir else pdf_dir / '.page_cache'
+    page_cache = PageCache(cache_dir) if (cache_dir / 'index.sqlite').exists() else None
+    catalog = Catalog(pdf_dir / 'catalog.sqlite') if (pdf_dir / 'catalog.sqlite').exists() else None
+
+    report = []
+    done = unchanged = failed = 0
+    saved = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(recompress_one, pdf_files, [options] * len(pdf_files))
+        for pdf_path, result in zip(pdf_files, results):
+            status = result['status']
+            if status == 'unchanged':
+                unchanged += 1
+                continue
+            if status != 'done':
+                print(f"  [SKIP] {result['name']} ({status})")
+                failed += status.startswith('failed')
+                continue
+            done += 1
+            if page_cache:
+                page_cache.refresh_output(pdf_path)
+            if catalog and catalog.get(pdf_path.stem):
+                catalog.upsert(pdf_path.stem, pdf_size=result['after'])
+            before, after = result['before'], result['after']
+            saved += before - after
+            pages = ', '.join(f"{count} {kind}" for kind, count in sorted(result['pages'].items()))
+            print(f"  [OK] {result['name']}: {before / 1024:.0f} KB -> {after / 1024:.0f} KB "
+                  f"({(after - before) / before:+.0%}; {pages})")
+            report.append({**result, 'saved': before - after, 'pages': dict(result['pages'])})
+
+    print(f"\nDone! Recompressed: {done}, Already done: {unchanged}, Failed: {failed}")
+    if done:
+        print(f"Saved {saved / (1024 * 1024):.2f} MB")
+        if catalog:
+            print("Run `python3 tools/catalog.py --export` to publish the new sizes")
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {report_path}")
+    return failed == 0
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description='Recompress scanned PDFs as gray JPEG / CCITT G4 pages where possible',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Recompress every PDF in ../pdfs
+  python recompress_pdfs.py
+
+  # Smaller files, slightly softer pages, and a per-publication report
+  python recompress_pdfs.py --ssim 0.97 --max-quality 80 --report savings.json
+
+  # Keep black-and-white pages as gray JPEGs
+  python recompress_pdfs.py --no-bilevel
+        """
+    )
+    parser.add_argument('--input', '-i', default=str(PDF_DIR), help=f'PDF directory (default: {PDF_DIR})')
+    parser.add_argument('--workers', '-w', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--ssim', type=float, default=DEFAULT_SSIM,
+                        help=f'Minimum luminance SSIM of re-encoded JPEG pages (default: {DEFAULT_SSIM})')
+    parser.add_argument('--max-quality', type=int, default=DEFAULT_MAX_QUALITY,
+                        help=f'Highest JPEG quality to use (default: {DEFAULT_MAX_QUALITY})')
+    parser.add_argument('--no-bilevel', action='store_true', help='Never convert pages to CCITT G4')
+    parser.add_argument('--force', action='store_true', help='Recompress PDFs already done with the same settings')
+    parser.add_argument('--cache-dir', help='Downloader page cache to keep in sync (default: <input>/.page_cache)')
+    parser.add_argument('--report', metavar='PATH', help='Write per-publication savings as JSON')
+    args = parser.parse_args(argv)
+
+    ok = recompress_all(
+        args.input, workers=args.workers, cache_dir=args.cache_dir, report_path=args.report,
+        ssim_target=args.ssim, max_quality=args.max_quality, bilevel=not args.no_bilevel, force=args.force
+    )
+    if not ok:
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
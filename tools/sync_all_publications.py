@@ -3,74 +3,28 @@
 Sync all downloaded PDFs from download_results.json to publications.json
 """
 
-import json
-import os
-import re
-from pathlib import Path
+import argparse
 
-BASE_DIR = Path(__file__).parent.parent
-DOWNLOAD_RESULTS = BASE_DIR / "pdfs" / "download_results.json"
-PUBLICATIONS_FILE = BASE_DIR / "data" / "publications.json"
+from catalog import Catalog, sync_download_results
+from himmah.config import DOWNLOAD_RESULTS, PUBLICATIONS_JSON as PUBLICATIONS_FILE
 
-def parse_title(title):
-    """Extract category and year from title."""
-    # Determine category
-    if 'MUHIBBAH' in title.upper():
-        category = 'muhibbah'
-    elif 'KOBARKobari' in title or 'KOBAR' in title:
-        category = 'kobarkobari'
-    else:
-        category = 'himmah'
-    
-    # Extract year
-    year_match = re.search(r'(\d{4})', title)
-    year = int(year_match.group(1)) if year_match else 2000
-    
-    return category, year
 
-def main():
-    # Load download results
-    with open(DOWNLOAD_RESULTS, 'r', encoding='utf-8') as f:
-        results = json.load(f)
-    
-    # Build new publications list
-    publications = []
-    for item in results.get('downloaded', []):
-        title = item['title']
-        abs_path = item['path']
-        filename = os.path.basename(abs_path)
-        pub_id = os.path.splitext(filename)[0]
-        
-        category, year = parse_title(title)
-        
-        pub = {
-            'id': pub_id,
-            'title': title,
-            'category': category,
-            'year': year,
-            'pages': 20,
-            'issuu_url': f'https://issuu.com/lpmhimmahuii/docs/{pub_id}',
-            'pdf_file': f'./pdfs/{filename}'
-        }
-        publications.append(pub)
-    
-    # Sort by year descending, then title
-    publications.sort(key=lambda x: (-x['year'], x['title']))
-    
-    # Save
-    with open(PUBLICATIONS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(publications, f, indent=4, ensure_ascii=False)
-    
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description='Apply download results to publications.json')
+    parser.add_argument('--results', default=str(DOWNLOAD_RESULTS),
+                        help=f'download_results.json of the downloader (default: {DOWNLOAD_RESULTS})')
+    args = parser.parse_args(argv)
+
+    catalog = Catalog(json_path=PUBLICATIONS_FILE)
+    changed = sync_download_results(args.results, catalog)
+    written = catalog.export_json()
+
     # Summary
-    muhibbah = sum(1 for p in publications if p['category'] == 'muhibbah')
-    himmah = sum(1 for p in publications if p['category'] == 'himmah')
-    kobarkobari = sum(1 for p in publications if p['category'] == 'kobarkobari')
-    
-    print(f"✅ Generated {len(publications)} publication entries")
-    print(f"   - MUHIBBAH: {muhibbah}")
-    print(f"   - HIMMAH: {himmah}")
-    print(f"   - KOBARKobari: {kobarkobari}")
-    print(f"\nSaved to: {PUBLICATIONS_FILE}")
+    print(f"✅ Updated {changed} publication entries")
+    for row in catalog.stats():
+        print(f"   - {row['category']}: {row['publications']} ({row['pdfs']} PDFs)")
+    print(f"\n{'Saved to' if written else 'Unchanged'}: {PUBLICATIONS_FILE}")
+
 
 if __name__ == "__main__":
     main()
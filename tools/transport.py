@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+HTTP transport for the downloader.
+Wraps a requests.Session with a sized connection pool, a global cap on
+in-flight requests, retries with jittered exponential backoff (honouring
+Retry-After), an AIMD per-host rate controller and a shared bandwidth budget.
+download() streams a response body to disk with constant memory, hashing it
+on the fly and resuming truncated transfers with HTTP Range requests.
+"""
+
+import hashlib
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+THROTTLE_STATUSES = {429, 503}
+CHUNK_SIZE = 64 * 1024
+CONTENT_RANGE = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+
+
+class TransportError(Exception):
+    """Raised when a request still fails after all retries."""
+
+    def __init__(self, message, retries=0, wait_seconds=0.0):
+        super().__init__(message)
+        self.retries = retries
+        self.wait_seconds = wait_seconds
+
+
+class AdaptiveRateLimiter:
+    """
+    Thread-safe per-host rate limiter with AIMD control.
+    Each host starts at `initial_rate` requests/second. Fast successful
+    responses raise the rate additively; errors, throttling or slow responses
+    cut it multiplicatively. The rate stays within [min_rate, max_rate].
+    """
+
+    def __init__(self, initial_rate=4.0, min_rate=0.5, max_rate=16.0,
+                 increase=0.5, decrease=0.5, latency_target=2.0):
+        self.initial_rate = initial_rate
+        self.min_rate = min(min_rate, initial_rate)
+        self.max_rate = max(max_rate, initial_rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self._lock = threading.Lock()
+        self._rates = {}
+        self._next_slot = {}
+
+    def rate(self, host):
+        with self._lock:
+            return self._rates.get(host, self.initial_rate)
+
+    def wait(self, url):
+        """Block until a request to the host of `url` is allowed."""
+        host = urlparse(url).netloc
+        with self._lock:
+            rate = self._rates.get(host, self.initial_rate)
+            if rate <= 0:
+                return
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + 1.0 / rate
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def record(self, url, latency, ok):
+        """Feed back the outcome of a request."""
+        host = urlparse(url).netloc
+        with self._lock:
+            rate = self._rates.get(host, self.initial_rate)
+            if rate <= 0:
+                return
+            if ok and latency <= self.latency_target:
+                rate = min(self.max_rate, rate + self.increase)
+            else:
+                rate = max(self.min_rate, rate * self.decrease)
+            self._rates[host] = rate
+
+    def pause(self, url, seconds):
+        """Hold back all requests to a host for `seconds` (e.g. from Retry-After)."""
+        host = urlparse(url).netloc
+        with self._lock:
+            resume = time.monotonic() + seconds
+            self._next_slot[host] = max(self._next_slot.get(host, 0), resume)
+
+
+class BandwidthLimiter:
+    """
+    Thread-safe token bucket shared by all downloads.
+    Caps the aggregate transfer rate at `bytes_per_second` (0 = unlimited).
+    """
+
+    def __init__(self, bytes_per_second=0):
+        self.rate = bytes_per_second
+        self._lock = threading.Lock()
+        self._available = float(bytes_per_second)
+        self._updated = time.monotonic()
+
+    def consume(self, num_bytes):
+        """Account for `num_bytes` transferred, sleeping if over budget."""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._available = min(self.rate, self._available + (now - self._updated) * self.rate)
+            self._updated = now
+            self._available -= num_bytes
+            deficit = -self._available
+        if deficit > 0:
+            time.sleep(deficit / self.rate)
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class Transport:
+    """Retrying, rate-controlled GET requests over a shared session."""
+
+    def __init__(self, session=None, max_connections=8, rate_limiter=None, bandwidth=0,
+                 retries=4, backoff_base=0.5, backoff_max=30.0, on_log=None):
+        self.session = session or requests.Session()
+        self.max_connections = max(1, max_connections)
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter()
+        self.bandwidth_limiter = BandwidthLimiter(bandwidth)
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.on_log = on_log
+        self.retry_count = 0
+        self._stats_lock = threading.Lock()
+        # Global cap on in-flight requests across all concurrently running publications
+        self.connection_slots = threading.BoundedSemaphore(self.max_connections)
+        # Size the connection pool so every request slot can keep its own connection
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=self.max_connections,
+            pool_maxsize=self.max_connections
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _log(self, message):
+        if self.on_log:
+            self.on_log(message)
+
+    def backoff(self, attempt):
+        """Full-jitter exponential backoff delay for retry number `attempt` (0-based)."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def get(self, url, ok_statuses=(200,), **kwargs):
+        """
+        GET `url`, retrying connection errors and retryable status codes.
+        Responses with a status in `ok_statuses` or a non-retryable status are
+        returned; raises TransportError once retries are exhausted.
+        The response gets `retries` and `wait_seconds` (time spent in rate
+        limiting and backoff) attributes for instrumentation. A stream=True
+        response occupies a connection slot until it is closed.
+        """
+        last_error = None
+        wait_seconds = 0.0
+        for attempt in range(self.retries + 1):
+            wait_start = time.monotonic()
+            self.rate_limiter.wait(url)
+            start = time.monotonic()
+            wait_seconds += start - wait_start
+            try:
+                self.connection_slots.acquire()
+                try:
+                    response = self.session.get(url, **kwargs)
+                except BaseException:
+                    self.connection_slots.release()
+                    raise
+                latency = time.monotonic() - start
+                if kwargs.get('stream'):
+                    # The body is read after we return: the slot is held until the response is closed
+                    self._release_on_close(response)
+                else:
+                    self.connection_slots.release()
+                    self.bandwidth_limiter.consume(len(response.content))
+            except requests.RequestException as e:
+                self.rate_limiter.record(url, time.monotonic() - start, ok=False)
+                last_error = e
+                delay = self.backoff(attempt)
+            else:
+                if response.status_code in ok_statuses or response.status_code not in RETRY_STATUSES:
+                    self.rate_limiter.record(url, latency, ok=True)
+                    response.retries = attempt
+                    response.wait_seconds = wait_seconds
+                    return response
+                self.rate_limiter.record(url, latency, ok=False)
+                last_error = TransportError(f"HTTP {response.status_code}")
+                delay = self.backoff(attempt)
+                if response.status_code in THROTTLE_STATUSES:
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    if retry_after is not None:
+                        delay = min(retry_after, self.backoff_max * 4)
+                        self.rate_limiter.pause(url, delay)
+                response.close()
+
+            if attempt < self.retries:
+                with self._stats_lock:
+                    self.retry_count += 1
+                self._log(f"\n  Retrying in {delay:.1f}s ({last_error}): {url}")
+                time.sleep(delay)
+                wait_seconds += delay
+
+        raise TransportError(f"{url}: {last_error}", retries=self.retries, wait_seconds=wait_seconds)
+
+    def _release_on_close(self, response):
+        """Release the connection slot held by `response` when it is closed (once)."""
+        close = response.close
+        released = False
+
+        def close_and_release():
+            nonlocal released
+            try:
+                close()
+            finally:
+                if not released:
+                    released = True
+                    self.connection_slots.release()
+
+        response.close = close_and_release
+
+    def download(self, url, path, max_resumes=3, chunk_size=CHUNK_SIZE, headers=None, **kwargs):
+        """
+        Stream `url` into `path` chunk by chunk, hashing as it is written.
+        The body must match Content-Length; a transfer that breaks off early is
+        resumed with a Range request (If-Range keeps it from splicing a changed
+        file) up to `max_resumes` times, or fails if the length is unknown. Returns a dict with status, size,
+        sha256, retries, wait_seconds and resumes; raises TransportError if the
+        body cannot be completed. Non-200 responses are returned without a body.
+        """
+        headers = dict(headers or {})
+        # Content-Length must describe the bytes we write, so no transfer encoding
+        headers.setdefault('Accept-Encoding', 'identity')
+        digest = hashlib.sha256()
+        written = 0
+        expected = None
+        validator = None
+        retries = 0
+        wait_seconds = 0.0
+        resumes = 0
+
+        with open(path, 'wb') as f:
+            while True:
+                request_headers = dict(headers)
+                if written:
+                    request_headers['Range'] = f'bytes={written}-'
+                    if validator:
+                        request_headers['If-Range'] = validator
+                response = self.get(url, ok_statuses=(200, 206), headers=request_headers, stream=True, **kwargs)
+                retries += response.retries
+                wait_seconds += response.wait_seconds
+                try:
+                    if response.status_code not in (200, 206):
+                        return {'status': response.status_code, 'size': 0, 'sha256': None,
+                                'retries': retries, 'wait_seconds': wait_seconds, 'resumes': resumes}
+                    content_range = CONTENT_RANGE.match(response.headers.get('Content-Range', ''))
+                    if response.status_code == 206 and content_range and int(content_range[1]) == written:
+                        if content_range[3] != '*':
+                            expected = int(content_range[3])
+                    else:
+                        # Full body (server ignored Range, or the file changed): start over
+                        f.seek(0)
+                        f.truncate()
+                        digest = hashlib.sha256()
+                        written = 0
+                        length = response.headers.get('Content-Length')
+                        expected = int(length) if length and length.isdigit() else None
+                    validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+
+                    try:
+                        for chunk in response.iter_content(chunk_size):
+                            f.write(chunk)
+                            digest.update(chunk)
+                            written += len(chunk)
+                            self.bandwidth_limiter.consume(len(chunk))
+                    except requests.RequestException as e:
+                        if expected is None:
+                            # Without a length there is no telling how much is missing, so no resume
+                            raise TransportError(f"{url}: transfer broke off at {written} bytes ({e})",
+                                                 retries=retries, wait_seconds=wait_seconds) from e
+                        self._log(f"\n  Transfer broke off at {written} bytes ({type(e).__name__}): {url}")
+                finally:
+                    response.close()
+
+                if expected is None or written == expected:
+                    break
+                if written > expected:
+                    raise TransportError(f"{url}: got {written} bytes, Content-Length is {expected}",
+                                         retries=retries, wait_seconds=wait_seconds)
+                if resumes >= max_resumes:
+                    raise TransportError(f"{url}: incomplete after {resumes} resumes ({written}/{expected} bytes)",
+                                         retries=retries, wait_seconds=wait_seconds)
+                resumes += 1
+
+        return {'status': 200, 'size': written, 'sha256': digest.hexdigest(),
+                'retries': retries, 'wait_seconds': wait_seconds, 'resumes': resumes}
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Check that every downloaded PDF is complete, fast enough to gate a deploy.
+
+Each PDF is opened through a memory map: only the cross-reference table,
+the trailer and the page tree are parsed, and every page's image stream is
+checked in place (a JPEG must start with SOI and end with EOI) without
+reading the image data. The page count must match Issuu's reader3 metadata
+from the downloader's metadata cache, less any pages the downloader left out
+(--drop-blank, --drop-duplicates). The cover, the last page and a few evenly
+spaced pages of each PDF are also decoded (--sample, --decode-all).
+PDFs are checked in parallel across processes.
+
+Catalog entries whose PDF is missing count as problems, and PDFs that are
+not in the catalog are checked too. --report writes the results as JSON,
+--refetch the Issuu URLs of the publications to download again, and the
+exit status is non-zero if anything is wrong.
+
+Usage:
+  python verify_pdfs.py
+  python verify_pdfs.py --report verify.json --refetch refetch.txt
+  python verify_pdfs.py --decode-all
+"""
+
+import argparse
+import io
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from catalog import Catalog
+from himmah.config import CATALOG_DB, ISSUU_USER, PDF_DIR, PUBLICATIONS_JSON
+from pdf_reader import PDFReader, image_file_bytes, image_filters
+
+# Decoded pages per PDF besides the first and the last
+DEFAULT_SAMPLE = 3
+# Problems listed per PDF before the rest are only counted
+MAX_PAGE_PROBLEMS = 5
+
+
+def sample_pages(count, sample):
+    """Indexes of the pages to decode: first, last and `sample` evenly spaced ones (all if sample is None)."""
+    if sample is None or count <= sample + 2:
+        return set(range(count))
+    picks = {0, count - 1}
+    picks.update(round(i * (count - 1) / (sample + 1)) for i in range(1, sample + 1))
+    return picks
+
+
+def check_page(reader, page, decode=False):
+    """Return (problem or None, decoded) for the main image of one page."""
+    ref = reader.main_image_ref(page)
+    if ref is None:
+        return "no image", False
+    dictionary, start, end = reader.stream_bounds(ref)
+    data = reader.data
+    if image_filters(dictionary) == ['DCTDecode']:
+        if data[start:start + 2] != b'\xff\xd8':
+            return "JPEG stream has no SOI marker", False
+        if not data[max(start, end - 64):end].rstrip(b'\x00\r\n ').endswith(b'\xff\xd9'):
+            return "JPEG stream is truncated (no EOI marker)", False
+    elif end <= start:
+        return "empty image stream", False
+
+    if not decode:
+        return None, False
+    image_bytes = image_file_bytes(dictionary, data[start:end], reader.resolve)
+    if image_bytes is None:
+        return None, False
+    from PIL import Image
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            # A scaled JPEG decode still runs through all of the entropy-coded data
+            img.draft(img.mode, (max(1, img.width // 8), max(1, img.height // 8)))
+            img.load()
+    except Exception as e:
+        return f"image does not decode ({e})", True
+    return None, True
+
+
+def verify_pdf(pdf_path, expected_pages=None, sample=DEFAULT_SAMPLE):
+    """
+    Worker: check one PDF. Returns a dict with its size, page count, the
+    expected page count, the number of pages decoded and a list of problems.
+    """
+    pdf_path = Path(pdf_path)
+    result = {'file': pdf_path.name, 'size': None, 'pages': None, 'expected_pages': expected_pages,
+              'decoded': 0, 'problems': []}
+    problems = result['problems']
+    if not pdf_path.exists():
+        problems.append("missing")
+        return result
+    result['size'] = pdf_path.stat().st_size
+
+    try:
+        with PDFReader(pdf_path) as reader:
+            declared = reader.page_count()
+            pages = list(reader.iter_pages())
+            result['pages'] = len(pages)
+            if declared != len(pages):
+                problems.append(f"page tree declares {declared} pages but has {len(pages)}")
+            decode = sample_pages(len(pages), sample)
+            broken = []
+            for index, page in enumerate(pages):
+                problem, decoded = check_page(reader, page, decode=index in decode)
+                result['decoded'] += decoded
+                if problem:
+                    broken.append(f"page {index + 1}: {problem}")
+            problems.extend(broken[:MAX_PAGE_PROBLEMS])
+            if len(broken) > MAX_PAGE_PROBLEMS:
+                problems.append(f"... {len(broken) - MAX_PAGE_PROBLEMS} more broken pages")
+    except Exception as e:
+        # Broken files fail in all sorts of places of the parser
+        problems.append(f"unreadable: {e}")
+
+    if expected_pages and result['pages'] is not None and result['pages'] != expected_pages:
+        problems.append(f"{result['pages']} pages, reader3 metadata has {expected_pages}")
+    return result
+
+
+def _username(issuu_url):
+    parts = (issuu_url or '').split('issuu.com/', 1)
+    return parts[1].split('/')[0] if len(parts) == 2 and parts[1] else ISSUU_USER
+
+
+def verify_all(pdf_dir=PDF_DIR, catalog=None, workers=None, sample=DEFAULT_SAMPLE):
+    """
+    Check the PDFs of the catalog and any other PDF in `pdf_dir`.
+    Returns a report dict; its 'refetch' list holds the publications to download again.
+    """
+    start = time.monotonic()
+    catalog = catalog or Catalog()
+    pdf_dir = Path(pdf_dir)
+
+    # doc_slug -> (PDF path, Issuu URL)
+    targets = {}
+    for pub in catalog.all():
+        if pub['pdf_file']:
+            targets[pub['id']] = (pdf_dir / Path(pub['pdf_file']).name, pub['issuu_url'])
+    listed = {path for path, _ in targets.values()}
+    for path in sorted(pdf_dir.glob('*.pdf')):
+        if path not in listed:
+            targets.setdefault(path.stem, (path, None))
+
+    metadata = None
+    if (pdf_dir / '.metadata_cache.sqlite').exists():
+        from metadata_cache import MetadataCache
+        metadata = MetadataCache(pdf_dir / '.metadata_cache.sqlite')
+    # Pages left out by --drop-blank/--drop-duplicates are not missing
+    analysis = None
+    if (pdf_dir / '.page_analysis.sqlite').exists():
+        from page_analysis import PageAnalysis
+        analysis = PageAnalysis(pdf_dir / '.page_analysis.sqlite')
+    slugs = sorted(targets)
+    expected = []
+    for slug in slugs:
+        username = _username(targets[slug][1])
+        count = metadata.page_count(username, slug) if metadata else None
+        if count and analysis:
+            count -= analysis.dropped_count(username, slug)
+        expected.append(count)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(
+            verify_pdf, [targets[slug][0] for slug in slugs], expected, [sample] * len(slugs)
+        ))
+
+    publications = []
+    refetch = []
+    for slug, result in zip(slugs, results):
+        issuu_url = targets[slug][1] or f"https://issuu.com/{ISSUU_USER}/docs/{slug}"
+        publications.append(dict(result, id=slug, issuu_url=issuu_url, ok=not result['problems']))
+        if result['problems']:
+            refetch.append({'id': slug, 'issuu_url': issuu_url, 'problems': result['problems']})
+
+    return {
+        'pdf_dir': str(pdf_dir),
+        'checked': len(publications),
+        'ok': len(publications) - len(refetch),
+        'bytes': sum(pub['size'] or 0 for pub in publications),
+        'decoded_pages': sum(pub['decoded'] for pub in publications),
+        'seconds': round(time.monotonic() - start, 3),
+        'publications': publications,
+        'refetch': refetch,
+    }
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description='Check the downloaded PDFs for missing pages and broken images',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Check everything in ../pdfs (exit status 1 if anything is wrong)
+  python verify_pdfs.py
+
+  # Machine-readable results plus the URLs to download again
+  python verify_pdfs.py --report verify.json --refetch refetch.txt
+  xargs -n1 python issuu_downloader.py --force --url < refetch.txt
+
+  # Decode every page image instead of a sample
+  python verify_pdfs.py --decode-all
+        """
+    )
+    parser.add_argument('--input', '-i', default=str(PDF_DIR), help=f'PDF directory (default: {PDF_DIR})')
+    parser.add_argument('--db', default=str(CATALOG_DB), help=f'Catalog database (default: {CATALOG_DB})')
+    parser.add_argument('--workers', '-w', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--sample', type=int, default=DEFAULT_SAMPLE,
+                        help=f'Pages decoded per PDF besides the first and last (default: {DEFAULT_SAMPLE})')
+    parser.add_argument('--decode-all', action='store_true', help='Decode every page image')
+    parser.add_argument('--report', metavar='PATH', help='Write the results as JSON')
+    parser.add_argument('--refetch', metavar='PATH', help='Write the Issuu URLs of broken publications, one per line')
+    args = parser.parse_args(argv)
+
+    report = verify_all(args.input, Catalog(args.db, PUBLICATIONS_JSON), workers=args.workers,
+                        sample=None if args.decode_all else max(0, args.sample))
+    for item in report['refetch']:
+        print(f"  ✗ {item['id']}")
+        for problem in item['problems']:
+            print(f"      {problem}")
+
+    print(f"\nVerified {report['checked']} PDFs ({report['bytes'] / (1024 * 1024):.1f} MB, "
+          f"{report['decoded_pages']} pages decoded) in {report['seconds']:.1f}s: "
+          f"{report['ok']} ok, {len(report['refetch'])} to re-fetch")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Report written to: {args.report}")
+    if args.refetch:
+        with open(args.refetch, 'w', encoding='utf-8') as f:
+            f.writelines(f"{item['issuu_url']}\n" for item in report['refetch'])
+        print(f"Re-fetch list written to: {args.refetch}")
+    sys.exit(1 if report['refetch'] else 0)
+
+
+if __name__ == "__main__":
+    main()